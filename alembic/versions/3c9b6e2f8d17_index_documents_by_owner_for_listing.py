@@ -0,0 +1,33 @@
+"""Index the documents of an owner by upload timestamp, for unfiltered listings
+
+Revision ID: 3c9b6e2f8d17
+Revises: e4c71a9d0b26
+Create Date: 2026-10-18 20:41:37.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c9b6e2f8d17'
+down_revision: Union[str, Sequence[str], None] = 'e4c71a9d0b26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_owner_id_upload_timestamp_id', 'documents',
+            ['owner_id', 'upload_timestamp', 'id'], unique=False, postgresql_concurrently=True
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_documents_owner_id_upload_timestamp_id', table_name='documents',
+                      postgresql_concurrently=True)
@@ -0,0 +1,38 @@
+"""Add documents.country_code and pipeline stage timestamps
+
+Revision ID: 5f1d7b3a9c64
+Revises: c2a8e5f47b31
+Create Date: 2026-10-18 12:48:51.620394
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f1d7b3a9c64'
+down_revision: Union[str, Sequence[str], None] = 'c2a8e5f47b31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STAGE_TIMESTAMPS = ('enqueued_at', 'started_at', 'preprocessed_at', 'inferred_at', 'validated_at', 'completed_at')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('country_code', sa.String(), nullable=True))
+    op.create_index(op.f('ix_documents_country_code'), 'documents', ['country_code'], unique=False)
+    for column in STAGE_TIMESTAMPS:
+        op.add_column('documents', sa.Column(column, sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_documents_completed_at'), 'documents', ['completed_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_documents_completed_at'), table_name='documents')
+    for column in reversed(STAGE_TIMESTAMPS):
+        op.drop_column('documents', column)
+    op.drop_index(op.f('ix_documents_country_code'), table_name='documents')
+    op.drop_column('documents', 'country_code')
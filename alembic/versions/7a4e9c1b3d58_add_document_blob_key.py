@@ -0,0 +1,28 @@
+"""Add documents.blob_key
+
+Revision ID: 7a4e9c1b3d58
+Revises: 5f1d7b3a9c64
+Create Date: 2026-10-18 14:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4e9c1b3d58'
+down_revision: Union[str, Sequence[str], None] = '5f1d7b3a9c64'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('blob_key', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'blob_key')
@@ -0,0 +1,30 @@
+"""Add documents.batch_id
+
+Revision ID: 9e3f0a6c2d18
+Revises: 4b7d2c9e1a05
+Create Date: 2026-10-18 09:40:03.552871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3f0a6c2d18'
+down_revision: Union[str, Sequence[str], None] = '4b7d2c9e1a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('batch_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_documents_batch_id'), 'documents', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_documents_batch_id'), table_name='documents')
+    op.drop_column('documents', 'batch_id')
@@ -0,0 +1,126 @@
+"""Index documents for listing and search, JSONB extracted_data
+
+Revision ID: b83d1f6e2a94
+Revises: 7a4e9c1b3d58
+Create Date: 2026-10-18 15:32:47.905112
+
+"""
+import re
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b83d1f6e2a94'
+down_revision: Union[str, Sequence[str], None] = '7a4e9c1b3d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Key fields of the raw extraction at this revision, per column (app.models.document.KEY_FIELDS),
+# copied here so that later changes to the application do not change this migration
+KEY_FIELDS = {
+    'plate_number': ('numero_immatriculation',),
+    'vin': ('numero_identification', 'numero_serie'),
+}
+
+# Same normalization as normalize_key_field below, in SQL
+PG_BACKFILL = """
+UPDATE documents SET
+    plate_number = NULLIF(regexp_replace(upper(extracted_data->'raw_extraction'->>'numero_immatriculation'), '[^A-Z0-9]', '', 'g'), ''),
+    vin = NULLIF(regexp_replace(upper(COALESCE(
+        NULLIF(extracted_data->'raw_extraction'->>'numero_identification', ''),
+        extracted_data->'raw_extraction'->>'numero_serie'
+    )), '[^A-Z0-9]', '', 'g'), '')
+WHERE extracted_data ? 'raw_extraction'
+"""
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def normalize_key_field(value: Optional[str]) -> Optional[str]:
+    # Uppercase letters and digits only ("ab-123-cd" -> "AB123CD")
+    normalized = re.sub(r'[^A-Z0-9]', '', str(value).upper()) if value is not None else ''
+    return normalized or None
+
+
+def key_field_values(extracted_data: Optional[dict]) -> dict:
+    raw_extraction = (extracted_data or {}).get('raw_extraction') or {}
+    return {
+        column: normalize_key_field(next((raw_extraction[field] for field in fields if raw_extraction.get(field)), None))
+        for column, fields in KEY_FIELDS.items()
+    }
+
+
+def backfill_key_fields(bind) -> None:
+    documents = sa.table(
+        'documents', sa.column('id', sa.Integer), sa.column('extracted_data', sa.JSON),
+        sa.column('plate_number', sa.String), sa.column('vin', sa.String),
+    )
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(documents.c.id, documents.c.extracted_data)
+            .where(documents.c.id > last_id).order_by(documents.c.id).limit(BACKFILL_CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        updates = [{'_id': row.id, **key_field_values(row.extracted_data)} for row in rows]
+        bind.execute(
+            documents.update().where(documents.c.id == sa.bindparam('_id'))
+            .values(plate_number=sa.bindparam('plate_number'), vin=sa.bindparam('vin')),
+            updates,
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    is_postgresql = bind.dialect.name == 'postgresql'
+
+    op.add_column('documents', sa.Column('plate_number', sa.String(), nullable=True))
+    op.add_column('documents', sa.Column('vin', sa.String(), nullable=True))
+    if is_postgresql:
+        # Rewrites the table: plan a maintenance window on large tables
+        op.alter_column(
+            'documents', 'extracted_data', type_=postgresql.JSONB(), postgresql_using='extracted_data::jsonb'
+        )
+        op.execute(PG_BACKFILL)
+    else:
+        backfill_key_fields(bind)
+    # Redundant with the primary key
+    op.drop_index(op.f('ix_documents_id'), table_name='documents')
+
+    # Built without blocking writes on PostgreSQL (CONCURRENTLY cannot run in a transaction)
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_owner_id_status_upload_timestamp', 'documents',
+            ['owner_id', 'status', 'upload_timestamp'], unique=False, postgresql_concurrently=True
+        )
+        op.create_index(op.f('ix_documents_plate_number'), 'documents', ['plate_number'], unique=False,
+                        postgresql_concurrently=True)
+        op.create_index(op.f('ix_documents_vin'), 'documents', ['vin'], unique=False, postgresql_concurrently=True)
+        if is_postgresql:
+            op.create_index(
+                'ix_documents_extracted_data', 'documents', ['extracted_data'], unique=False,
+                postgresql_using='gin', postgresql_ops={'extracted_data': 'jsonb_path_ops'},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.drop_index('ix_documents_extracted_data', table_name='documents')
+        op.alter_column(
+            'documents', 'extracted_data', type_=sa.JSON(), postgresql_using='extracted_data::json'
+        )
+    op.drop_index(op.f('ix_documents_vin'), table_name='documents')
+    op.drop_index(op.f('ix_documents_plate_number'), table_name='documents')
+    op.drop_index('ix_documents_owner_id_status_upload_timestamp', table_name='documents')
+    op.create_index(op.f('ix_documents_id'), 'documents', ['id'], unique=False)
+    op.drop_column('documents', 'vin')
+    op.drop_column('documents', 'plate_number')
@@ -0,0 +1,28 @@
+"""Add documents.callback_url
+
+Revision ID: c2a8e5f47b31
+Revises: 9e3f0a6c2d18
+Create Date: 2026-10-18 12:10:27.184305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2a8e5f47b31'
+down_revision: Union[str, Sequence[str], None] = '9e3f0a6c2d18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('documents', sa.Column('callback_url', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('documents', 'callback_url')
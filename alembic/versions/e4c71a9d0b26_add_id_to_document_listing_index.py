@@ -0,0 +1,40 @@
+"""Add id to the document listing index, for keyset pagination
+
+Revision ID: e4c71a9d0b26
+Revises: b83d1f6e2a94
+Create Date: 2026-10-18 18:04:12.513870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c71a9d0b26'
+down_revision: Union[str, Sequence[str], None] = 'b83d1f6e2a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The new index is built before the old one is dropped, so listings stay indexed
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_owner_id_status_upload_timestamp_id', 'documents',
+            ['owner_id', 'status', 'upload_timestamp', 'id'], unique=False, postgresql_concurrently=True
+        )
+        op.drop_index('ix_documents_owner_id_status_upload_timestamp', table_name='documents',
+                      postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_documents_owner_id_status_upload_timestamp', 'documents',
+            ['owner_id', 'status', 'upload_timestamp'], unique=False, postgresql_concurrently=True
+        )
+        op.drop_index('ix_documents_owner_id_status_upload_timestamp_id', table_name='documents',
+                      postgresql_concurrently=True)
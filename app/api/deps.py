@@ -0,0 +1,82 @@
+import time
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import verify_token
+from app.core.ttl_cache import TTLCache
+from app.database import get_async_db
+from app.models.user import User
+from app.schemas.common import User as UserSchema
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/token")
+
+# Verified tokens and users are kept for a short time, so that authenticated requests cost
+# neither a JWT decode nor a SELECT (a cached token never outlives its expiry)
+token_cache = TTLCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+user_cache = TTLCache(settings.AUTH_CACHE_TTL_SECONDS, settings.AUTH_CACHE_MAX_ENTRIES)
+
+
+def verify_token_cached(token: str) -> Optional[dict]:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = verify_token(token)
+        if payload is None:
+            return None
+        token_cache.set(token, payload, ttl_seconds=payload.get("exp", 0) - time.time())
+    return payload
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[UserSchema]:
+    user = user_cache.get(email)
+    if user is None:
+        db_user = await db.scalar(select(User).where(User.email == email))
+        if db_user is None:
+            return None
+        user = UserSchema.model_validate(db_user)
+        user_cache.set(email, user)
+    return user
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_async_db)
+) -> UserSchema:
+    """
+    Resolves the user of the bearer token (the token subject is the user's email).
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = verify_token_cached(token)
+    if payload is None or not payload.get("sub"):
+        raise credentials_exception
+
+    user = await get_user_by_email(db, payload["sub"])
+    if user is None:
+        raise credentials_exception
+    if not user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user."
+        )
+    return user
+
+
+async def get_current_admin(user: UserSchema = Depends(get_current_user)) -> UserSchema:
+    """
+    Restricts operator endpoints (aggregates across all users) to the accounts listed in ADMIN_EMAILS.
+    """
+    admin_emails = {email.strip().lower() for email in settings.ADMIN_EMAILS.split(",") if email.strip()}
+    if user.email.lower() not in admin_emails:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Administrator access required."
+        )
+    return user
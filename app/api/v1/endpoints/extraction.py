@@ -1,74 +1,624 @@
-from typing import Optional
-import base64
+from datetime import datetime
+from typing import BinaryIO, List, Optional, Tuple
+import asyncio
+import json
+import os
+import socket
+import uuid
+import zipfile
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models.document import Document
-from app.schemas.common import Document as DocumentSchema
-from app.worker.tasks import process_image_for_extraction
-from app.services.image_processing import is_valid_image
+import redis
+from celery import group
+from fastapi import APIRouter, Depends, UploadFile, File, Form, Header, HTTPException, Query, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.database import get_async_db
+from app.models.document import Document, key_field_values, normalize_key_field
+from app.schemas.common import Document as DocumentSchema, BatchStatus
+from app.worker.tasks import deliver_webhook, extraction_pipeline, schedule_follower_check, split_document
+from app.services.ai.backends import resolve_backend_name
+from app.services.image_processing import ImageTooLargeError, read_image_header
+from app.services.pages import multipage_format
+from app.services.cache import extraction_cache, inflight_extractions
+from app.services.idempotency import idempotency_keys
+from app.services.scheduling import PRIORITY_CLASSES, fair_scheduler
+from app.services.storage import BlobWriter, blob_store
+from app.services.notifications import (
+    FINAL_STATUSES, UnsafeCallbackURLError, check_callback_url, status_broadcaster, status_event
+)
 
-from app.models.user import User
-from app.core.security import get_password_hash
+from app.schemas.common import User as UserSchema
+from app.api.deps import get_current_user
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+PDF_CONTENT_TYPES = {"application/pdf"}
+
+
+def check_upload_chunk(writer: BlobWriter, chunk: bytes, allow_pdf: bool = False) -> None:
+    """
+    Enforces the upload limits on each chunk, before it is written.
+    - The first chunk carries the image header: the format and dimensions are checked before the rest
+      of the upload is copied to the blob store (unsupported files and decompression bombs fail fast)
+    - The request body itself is already spooled by the multipart parser: its size is bounded
+      beforehand by MaxBodySizeMiddleware (UPLOAD_MAX_BYTES plus the multipart overhead for single uploads)
+    - Uploads declared as PDF (`allow_pdf`) may carry a PDF header instead
+    - TIFFs are not checked here: their first directory (dimensions) may follow the pixel data, beyond
+      the first chunk; split_document checks each frame against the pixel and page limits instead
+    - The upload is rejected as soon as it crosses UPLOAD_MAX_BYTES (zip members are not bounded by the middleware)
+    The pixels (and PDF pages) are only decoded, and thus fully verified, by the worker.
+    """
+    if writer.size == 0:
+        document_format = multipage_format(chunk)
+        if not (document_format == "TIFF" or (allow_pdf and document_format == "PDF")):
+            read_image_header(chunk)
+    if writer.size + len(chunk) > settings.UPLOAD_MAX_BYTES:
+        raise ImageTooLargeError(f"Image exceeds the maximum upload size of {settings.UPLOAD_MAX_BYTES} bytes.")
+
+
+async def store_upload(file: UploadFile, created_keys: Optional[List[str]] = None) -> str:
+    """
+    Streams an upload into the blob store and returns its blob key.
+    - Raises ValueError (ImageTooLargeError for the limits) when the upload is rejected
+    - Disk writes run in the threadpool, so large uploads do not block the event loop
+    - The key is added to `created_keys` when the blob did not exist yet (deleted if the request fails)
+    """
+    allow_pdf = file.content_type in PDF_CONTENT_TYPES
+    with blob_store.writer() as writer:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            check_upload_chunk(writer, chunk, allow_pdf)
+            await run_in_threadpool(writer.write, chunk)
+        if writer.size == 0:
+            raise ValueError("Empty file.")
+    if writer.created and created_keys is not None:
+        created_keys.append(writer.key)
+    return writer.key
+
+
+def store_stream(stream: BinaryIO, allow_pdf: bool = False, created_keys: Optional[List[str]] = None) -> str:
+    """
+    Streams a synchronous file object (e.g. a zip member) into the blob store and returns its blob key.
+    """
+    with blob_store.writer() as writer:
+        while chunk := stream.read(UPLOAD_CHUNK_SIZE):
+            check_upload_chunk(writer, chunk, allow_pdf)
+            writer.write(chunk)
+        if writer.size == 0:
+            raise ValueError("Empty file.")
+    if writer.created and created_keys is not None:
+        created_keys.append(writer.key)
+    return writer.key
+
+
+def delete_blobs(blob_keys: List[str]) -> None:
+    for blob_key in blob_keys:
+        blob_store.delete(blob_key)
+
+
+def read_blob_header(blob_key: str) -> bytes:
+    with blob_store.open(blob_key) as blob:
+        return blob.read(8)
+
+
+def find_multipage_keys(blob_keys: List[str]) -> set:
+    """
+    Blob keys of the stored uploads that are PDFs or TIFFs (blocking, run it in the threadpool).
+    """
+    return {blob_key for blob_key in blob_keys if multipage_format(read_blob_header(blob_key)) is not None}
+
+
+def is_document_content_type(content_type: Optional[str]) -> bool:
+    return (content_type or "").startswith("image/") or content_type in PDF_CONTENT_TYPES
+
+
+def extraction_signature(document_id: int, blob_key: str, country_code: str, backend: str, pages_per_document: int,
+                         multipage: bool, priority_class: str, owner_id: int, priority: int):
+    """
+    Work of one stored upload: its staged extraction, or the split of a PDF/multi-frame TIFF into units,
+    sent with the priority given by the fair scheduler.
+    """
+    if multipage:
+        return split_document.s(
+            document_id, blob_key, country_code, backend, pages_per_document, priority_class, priority
+        ).set(priority=priority)
+    return extraction_pipeline(document_id, blob_key, country_code, backend, priority_class=priority_class,
+                               owner_id=owner_id, priority=priority)
+
+
+async def validate_callback_url(callback_url: Optional[str]) -> Optional[str]:
+    if not callback_url:
+        return None
+    try:
+        # Resolves the host (blocking)
+        await run_in_threadpool(check_callback_url, callback_url)
+    except UnsafeCallbackURLError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except socket.gaierror:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid callback URL. Its host could not be resolved."
+        )
+    return callback_url
+
+
+def validate_priority_class(priority: str) -> str:
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown priority: {priority}. Available: {', '.join(PRIORITY_CLASSES)}"
+        )
+    return priority
+
+
+def validate_backend(backend: Optional[str], country_code: str) -> str:
+    """
+    Resolves the extraction backend of an upload (requested, per country or default).
+    Requested backends must be listed in ALLOWED_REQUEST_BACKENDS.
+    """
+    if backend and backend not in settings.ALLOWED_REQUEST_BACKENDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Extraction backend not allowed: {backend}. Allowed: {', '.join(settings.ALLOWED_REQUEST_BACKENDS)}"
+        )
+    try:
+        return resolve_backend_name(backend, country_code)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+
+class BatchTooLargeError(Exception):
+    pass
+
+
+def store_zip_members(file: UploadFile, max_files: int, max_bytes: int,
+                      created_keys: List[str]) -> Tuple[List[Tuple[str, Optional[str], Optional[str]]], int]:
+    """
+    Streams the images of a zip archive into the blob store (blocking, run it in the threadpool).
+    Returns a (filename, blob_key, error) tuple per member, rejected members having no blob key,
+    and the uncompressed size of the members.
+    - The number of members and their uncompressed size are read from the archive's directory and
+      checked against `max_files` and `max_bytes` before anything is extracted (BatchTooLargeError);
+      members cannot be read beyond their recorded size
+    """
+    uploads = []
+    with zipfile.ZipFile(file.file) as archive:
+        members = [
+            member for member in archive.infolist()
+            if not (member.is_dir() or os.path.basename(member.filename).startswith("."))
+        ]
+        if len(members) > max_files:
+            raise BatchTooLargeError(f"A batch may contain at most {settings.BATCH_MAX_FILES} images.")
+        uncompressed_bytes = sum(member.file_size for member in members)
+        if uncompressed_bytes > max_bytes:
+            raise BatchTooLargeError(
+                f"The zip archives of a batch may hold at most {settings.BATCH_MAX_UNCOMPRESSED_BYTES} "
+                "uncompressed bytes."
+            )
+        for member in members:
+            try:
+                with archive.open(member) as stream:
+                    allow_pdf = member.filename.lower().endswith(".pdf")
+                    uploads.append((member.filename, store_stream(stream, allow_pdf, created_keys), None))
+            except ValueError as e:
+                uploads.append((member.filename, None, str(e)))
+    return uploads, uncompressed_bytes
+
+
+async def create_upload_document(filename: str, blob_key: str, country_code: str, callback_url: Optional[str],
+                                 backend: str, pages_per_document: int, priority_class: str, owner_id: int,
+                                 db: AsyncSession) -> Document:
+    """
+    Creates the document of a stored upload and starts its extraction.
+    - Duplicates of a completed extraction are answered from the cache
+    - Duplicates of an extraction in flight follow it: they get its outcome, without a second model call
+    """
+    # PDFs and TIFFs are split into one document per page by a worker; the pages share a batch
+    multipage = bool(await run_in_threadpool(find_multipage_keys, [blob_key]))
+    batch_id = str(uuid.uuid4()) if multipage else None
+
+    # Duplicate uploads are answered from the extraction cache without touching the queue
+    # (blob keys are the SHA-256 of the content, i.e. the cache hash)
+    cached_extraction = None
+    if not multipage:
+        cached_extraction = await run_in_threadpool(extraction_cache.get, blob_key, country_code, backend)
+
+    # Create a new document entry in the database: a single INSERT, RETURNING the server defaults
+    db_document = await db.scalar(
+        insert(Document).values(
+            filename=filename,
+            status="completed" if cached_extraction is not None else "pending",
+            extracted_data=cached_extraction,
+            owner_id=owner_id,
+            country_code=country_code,
+            callback_url=callback_url,
+            blob_key=blob_key,
+            batch_id=batch_id,
+            **key_field_values(cached_extraction)
+        ).returning(Document)
+    )
+    await db.commit()
+
+    if cached_extraction is not None:
+        if callback_url:
+            webhook = deliver_webhook.s(callback_url, status_event(db_document.id, "completed", cached_extraction))
+            await run_in_threadpool(webhook.apply_async)
+        return db_document
+
+    # The same image is already being extracted: the worker persisting it completes this document too,
+    # and a delayed check takes over should that extraction be lost
+    if not multipage:
+        leader_id = await run_in_threadpool(inflight_extractions.join, blob_key, country_code, backend, db_document.id)
+        if leader_id is not None:
+            await run_in_threadpool(schedule_follower_check, db_document.id, blob_key, country_code, backend,
+                                    priority_class, owner_id)
+            return db_document
+
+    # Enqueue the staged extraction; scheduling and publishing are blocking Redis round-trips
+    [document_priority] = await run_in_threadpool(fair_scheduler.schedule, owner_id, priority_class)
+    signature = extraction_signature(db_document.id, blob_key, country_code, backend, pages_per_document, multipage,
+                                     priority_class, owner_id, document_priority)
+    try:
+        await run_in_threadpool(signature.apply_async)
+    except Exception:
+        # Nothing was enqueued: identical uploads must not wait on this document (their checks take over)
+        # and its owner's backlog must not count it
+        if not multipage:
+            await run_in_threadpool(inflight_extractions.finish, blob_key, country_code, backend, db_document.id)
+        await run_in_threadpool(fair_scheduler.release, owner_id)
+        raise
+    return db_document
+
+
+async def replay_upload(record: dict, fingerprint: str, response: Response, db: AsyncSession) -> Document:
+    """
+    Answers a retried upload with the document of the request that first used its Idempotency-Key.
+    """
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(
+            # Literal: older Starlette releases only name it HTTP_422_UNPROCESSABLE_ENTITY, deprecated in newer ones
+            status_code=422,
+            detail="This Idempotency-Key was already used for a different upload."
+        )
+    if record["document_id"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still in progress. Retry it later."
+        )
+    document = await db.get(Document, record["document_id"])
+    if document is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found."
+        )
+    response.headers["Idempotent-Replayed"] = "true"
+    return document
+
+
 @router.post("/upload-and-extract/", response_model=DocumentSchema)
 async def upload_image_for_extraction(
+    response: Response,
     file: UploadFile = File(...),
     country_code: str = Form(..., description="Country code (e.g., 'FR' for France, 'TN' for Tunisia)"),
-    db: Session = Depends(get_db)
+    callback_url: Optional[str] = Form(None, description="Webhook notified (signed POST) when the extraction finishes"),
+    backend: Optional[str] = Form(None, description="Extraction backend ('mistral', 'tesseract', 'cascade'; see ALLOWED_REQUEST_BACKENDS); defaults to the configured one"),
+    pages_per_document: int = Form(1, ge=1, le=4, description="PDF/TIFF pages per certificate, e.g. 2 for recto/verso scans"),
+    priority: str = Form("interactive", description="Scheduling lane: 'interactive' (default) or 'bulk'"),
+    idempotency_key: Optional[str] = Header(None, max_length=255, description="Client-generated key: retries with the same key return the same document"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
 ):
-    if not file.content_type.startswith("image/"):
+    if not is_document_content_type(file.content_type):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Invalid file type. Only image files are allowed."
+            detail="Invalid file type. Only image files and PDF documents are allowed."
         )
+    callback_url = await validate_callback_url(callback_url)
+    backend = validate_backend(backend, country_code)
+    priority_class = validate_priority_class(priority)
 
-    image_data = await file.read()
-
-    if not is_valid_image(image_data):
+    # Stream the upload into the blob store; only the blob key goes through the broker
+    try:
+        blob_key = await store_upload(file)
+    except ImageTooLargeError as e:
+        raise HTTPException(
+            # Literal: older Starlette releases only name it HTTP_413_REQUEST_ENTITY_TOO_LARGE, deprecated in newer ones
+            status_code=413,
+            detail=str(e)
+        )
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Could not process image. File might be corrupted or an unsupported format."
+            detail=f"Could not process image: {e}"
         )
+    if not idempotency_key:
+        return await create_upload_document(file.filename, blob_key, country_code, callback_url, backend,
+                                            pages_per_document, priority_class, current_user.id, db)
 
-    # Encode image to base64
-    image_base64 = base64.b64encode(image_data).decode("utf-8")
-
-    # Ensure a default user exists to prevent foreign key violations.
-    default_user = db.query(User).filter(User.id == 1).first()
-    if not default_user:
-        default_user = User(
-            id=1,
-            email="default@example.com",
-            hashed_password=get_password_hash("defaultpassword"),
-            is_active=True
+    # Retries of a request (same Idempotency-Key) get its document instead of creating another one.
+    # Storing the upload again was a no-op: blobs are content-addressed.
+    fingerprint = f"{blob_key}:{country_code}:{backend}:{pages_per_document}"
+    record = await run_in_threadpool(idempotency_keys.claim, current_user.id, idempotency_key, fingerprint)
+    if record is not None:
+        return await replay_upload(record, fingerprint, response, db)
+    try:
+        db_document = await create_upload_document(file.filename, blob_key, country_code, callback_url, backend,
+                                                   pages_per_document, priority_class, current_user.id, db)
+    except BaseException:
+        await run_in_threadpool(idempotency_keys.release, current_user.id, idempotency_key)
+        raise
+    await run_in_threadpool(idempotency_keys.complete, current_user.id, idempotency_key, fingerprint, db_document.id)
+    return db_document
+
+
+@router.post("/batch-extract/", response_model=BatchStatus)
+async def batch_extract(
+    files: List[UploadFile] = File(..., description="Image files, PDF documents and/or zip archives of them"),
+    country_code: str = Form(..., description="Country code (e.g., 'FR' for France, 'TN' for Tunisia)"),
+    callback_url: Optional[str] = Form(None, description="Webhook notified (signed POST) for each document of the batch"),
+    backend: Optional[str] = Form(None, description="Extraction backend ('mistral', 'tesseract', 'cascade'; see ALLOWED_REQUEST_BACKENDS); defaults to the configured one"),
+    pages_per_document: int = Form(1, ge=1, le=4, description="PDF/TIFF pages per certificate, e.g. 2 for recto/verso scans"),
+    priority: str = Form("bulk", description="Scheduling lane: 'bulk' (default) or 'interactive'"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    callback_url = await validate_callback_url(callback_url)
+    backend = validate_backend(backend, country_code)
+    priority_class = validate_priority_class(priority)
+    zip_files = {
+        id(file) for file in files
+        if file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+    }
+    for file in files:
+        if id(file) not in zip_files and not is_document_content_type(file.content_type):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid file type for {file.filename}. Only image files, PDF documents and zip archives are allowed."
+            )
+
+    # 1. Stream every image (including zip members) into the blob store; the limits are checked
+    # before each file or archive is stored, and a rejected request deletes the blobs it created
+    uploads = []  # (filename, blob_key, error); rejected images are recorded as failed documents
+    created_keys = []
+    zip_bytes = 0
+    try:
+        for file in files:
+            if id(file) in zip_files:
+                members, uncompressed_bytes = await run_in_threadpool(
+                    store_zip_members, file, settings.BATCH_MAX_FILES - len(uploads),
+                    settings.BATCH_MAX_UNCOMPRESSED_BYTES - zip_bytes, created_keys,
+                )
+                uploads.extend(members)
+                zip_bytes += uncompressed_bytes
+            else:
+                if len(uploads) >= settings.BATCH_MAX_FILES:
+                    raise BatchTooLargeError(f"A batch may contain at most {settings.BATCH_MAX_FILES} images.")
+                try:
+                    uploads.append((file.filename, await store_upload(file, created_keys), None))
+                except ValueError as e:
+                    uploads.append((file.filename, None, str(e)))
+    except (BatchTooLargeError, zipfile.BadZipFile) as e:
+        await run_in_threadpool(delete_blobs, created_keys)
+        if isinstance(e, zipfile.BadZipFile):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid zip archive: {file.filename}"
+            )
+        raise HTTPException(
+            status_code=413, # Literal, as for single uploads
+            detail=str(e)
+        )
+
+    if not uploads:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The batch does not contain any image."
         )
-        db.add(default_user)
 
-    # Create a new document entry in the database
-    db_document = Document(
-        filename=file.filename,
-        status="pending",
-        owner_id=default_user.id
+    # 2. Build all rows up front; rejected images and cache hits are final immediately
+    batch_id = str(uuid.uuid4())
+    owner_id = current_user.id
+    valid_keys = [blob_key for _, blob_key, error in uploads if error is None]
+    cached = dict(zip(valid_keys, await run_in_threadpool(extraction_cache.get_many, valid_keys, country_code, backend)))
+    # PDFs and TIFFs are split by a worker, their pages are added to the batch
+    multipage_keys = await run_in_threadpool(find_multipage_keys, valid_keys)
+    rows = []
+    for filename, blob_key, error in uploads:
+        row = {"filename": filename, "owner_id": owner_id, "batch_id": batch_id,
+               "country_code": country_code, "status": "pending", "extracted_data": None,
+               "callback_url": callback_url, "blob_key": blob_key, "plate_number": None, "vin": None}
+        if error is not None:
+            row["status"] = "failed"
+            row["extracted_data"] = {"error": f"Could not process image: {error}"}
+        else:
+            cached_extraction = cached[blob_key]
+            if cached_extraction is not None:
+                row["status"] = "completed"
+                row["extracted_data"] = cached_extraction
+                row.update(key_field_values(cached_extraction))
+        rows.append(row)
+
+    # 3. One bulk INSERT for the whole batch
+    document_ids = (await db.scalars(
+        insert(Document).returning(Document.id, sort_by_parameter_order=True),
+        rows
+    )).all()
+    await db.commit()
+
+    # 4. Fan the pending documents out to the workers (documents already final only need their webhook);
+    # their priorities come from a single update of the owner's backlog
+    pending = sum(row["status"] == "pending" for row in rows)
+    priorities = iter(await run_in_threadpool(fair_scheduler.schedule, owner_id, priority_class, pending))
+    pipelines = [
+        extraction_signature(document_id, blob_key, country_code, backend, pages_per_document,
+                             blob_key in multipage_keys, priority_class, owner_id, next(priorities))
+        if row["status"] == "pending"
+        else deliver_webhook.s(callback_url, status_event(document_id, row["status"], row["extracted_data"]))
+        for document_id, row, (_, blob_key, _) in zip(document_ids, rows, uploads)
+        if row["status"] == "pending" or callback_url
+    ]
+    if pipelines:
+        await run_in_threadpool(group(pipelines).apply_async)
+
+    return await build_batch_status(batch_id, owner_id, db)
+
+
+async def build_batch_status(batch_id: str, owner_id: int, db: AsyncSession) -> Optional[BatchStatus]:
+    """
+    Aggregates the status of every document of an owner's batch from a single query.
+    """
+    documents = (await db.scalars(
+        select(Document).where(Document.batch_id == batch_id, Document.owner_id == owner_id).order_by(Document.id)
+    )).all()
+    if not documents:
+        return None
+
+    status_counts = {}
+    for document in documents:
+        status_counts[document.status] = status_counts.get(document.status, 0) + 1
+    finished = status_counts.get("completed", 0) + status_counts.get("failed", 0)
+
+    return BatchStatus(
+        batch_id=batch_id,
+        total=len(documents),
+        status_counts=status_counts,
+        progress=finished / len(documents),
+        documents=documents
     )
-    db.add(db_document)
-    db.commit()
-    db.refresh(db_document)
 
-    # Enqueue the extraction task
-    process_image_for_extraction.delay(db_document.id, image_base64, country_code)
 
-    return db_document
+@router.get("/batch-status/{batch_id}", response_model=BatchStatus)
+async def get_batch_status(
+    batch_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    # Batches of other users are not found
+    batch_status = await build_batch_status(batch_id, current_user.id, db)
+    if batch_status is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Batch not found."
+        )
+    return batch_status
+
+
+# Every column but extracted_data, for status polling
+STATUS_COLUMNS = [column for column in Document.__table__.columns if column.name != "extracted_data"]
+
 
 @router.get("/task-status/{document_id}", response_model=DocumentSchema)
-async def get_extraction_task_status(document_id: int, db: Session = Depends(get_db)):
-    document = db.query(Document).filter(Document.id == document_id).first()
+async def get_extraction_task_status(
+    document_id: int,
+    include_data: bool = Query(True, description="Set to false to poll the status without loading extracted_data"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    # Documents of other users are not found
+    owned = (Document.id == document_id, Document.owner_id == current_user.id)
+    if include_data:
+        document = await db.scalar(select(Document).where(*owned))
+    else:
+        # Status-only projection: the (large) extracted_data column is neither read nor serialized
+        document = (await db.execute(select(*STATUS_COLUMNS).where(*owned))).mappings().first()
     if not document:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Document not found."
         )
     return document
+
+
+@router.get("/documents/", response_model=List[DocumentSchema])
+async def list_documents(
+    status_filter: Optional[str] = Query(None, alias="status", description="pending, processing, completed or failed"),
+    plate_number: Optional[str] = Query(None, description="Plate number, in any format (e.g. 'AB-123-CD' or 'ab123cd')"),
+    vin: Optional[str] = Query(None, description="Vehicle identification number"),
+    before: Optional[datetime] = Query(None, description="Upload timestamp of the last document of the previous page"),
+    before_id: Optional[int] = Query(None, description="Id of the last document of the previous page"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Lists the documents of the current user, newest first.
+    - Served by the (owner_id, upload_timestamp, id) index, or (owner_id, status, upload_timestamp, id) with a
+      status filter; plate and VIN searches use their own column index
+    - Pages are fetched with `before` and `before_id` set to the upload timestamp and id of the last
+      document received: the documents of a batch share their upload timestamp, the id breaks the tie
+    """
+    query = select(Document).where(Document.owner_id == current_user.id)
+    if status_filter:
+        query = query.where(Document.status == status_filter)
+    if plate_number:
+        query = query.where(Document.plate_number == normalize_key_field(plate_number))
+    if vin:
+        query = query.where(Document.vin == normalize_key_field(vin))
+    if before and before_id is not None:
+        query = query.where(tuple_(Document.upload_timestamp, Document.id) < (before, before_id))
+    elif before:
+        query = query.where(Document.upload_timestamp < before)
+    query = query.order_by(Document.upload_timestamp.desc(), Document.id.desc())
+    return (await db.scalars(query.limit(limit))).all()
+
+
+def format_event(event: dict) -> str:
+    return f"event: status\ndata: {json.dumps(event)}\n\n"
+
+
+@router.get("/task-events/{document_id}")
+async def stream_task_events(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserSchema = Depends(get_current_user)
+):
+    """
+    Streams the status transitions of a document as server-sent events, instead of polling /task-status/.
+    - The first event is the current status; the stream ends after the final one (completed or failed)
+    - Transitions are relayed from the workers' Redis pub/sub, with a keep-alive comment while idle
+    """
+    owned = (Document.id == document_id, Document.owner_id == current_user.id)
+    if await db.scalar(select(Document.id).where(*owned)) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found."
+        )
+    await db.close()
+
+    async def current_event() -> dict:
+        document = await db.get(Document, document_id)
+        # Release the connection, it is not needed while the stream is open
+        await db.close()
+        return status_event(document.id, document.status, document.extracted_data)
+
+    async def events():
+        try:
+            async with status_broadcaster.listen(document_id) as queue:
+                # Read the status once subscribed, so that no transition is missed in between
+                event = await current_event()
+                yield format_event(event)
+                while event["status"] not in FINAL_STATUSES:
+                    try:
+                        event = await asyncio.wait_for(queue.get(), settings.EVENT_STREAM_KEEPALIVE_SECONDS)
+                    except asyncio.TimeoutError:
+                        yield ": keepalive\n\n"
+                        continue
+                    if event is None:
+                        return  # Subscription lost, the client reconnects
+                    yield format_event(event)
+        except (redis.RedisError, OSError):
+            # Without pub/sub, send the current status only; clients fall back to /task-status/
+            yield format_event(await current_event())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
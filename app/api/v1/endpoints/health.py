@@ -1,18 +1,28 @@
-from sqlalchemy import text
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import select, text
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 import redis
 
-from app.database import get_db
+from app.api.deps import get_current_admin
+from app.database import get_async_db
 from app.core.config import settings
+from app.core.redis import get_async_redis
+from app.core.celery_app import get_queue_depths
+from app.models.document import Document
+from app.services.cache import extraction_cache
+from app.services.stage_metrics import STAGE_TIMESTAMPS, latency_report
 
 router = APIRouter()
 
 @router.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     try:
         # Check database connection
-        db.execute(text("SELECT 1"))
+        await db.execute(text("SELECT 1"))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -20,9 +30,8 @@ async def health_check(db: Session = Depends(get_db)):
         )
 
     try:
-        # Check Redis connection
-        r = redis.from_url(settings.REDIS_BROKER_URL)
-        r.ping()
+        # Check Redis connection (pooled client, no new connection per check)
+        await get_async_redis(settings.REDIS_BROKER_URL).ping()
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -34,3 +43,46 @@ async def health_check(db: Session = Depends(get_db)):
     # For a more thorough health check, one might attempt a lightweight call.
 
     return {"status": "ok", "message": "All services are healthy"}
+
+@router.get("/cache-stats", dependencies=[Depends(get_current_admin)])
+async def get_cache_stats():
+    try:
+        return await run_in_threadpool(extraction_cache.stats)
+    except redis.RedisError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Redis connection failed: {type(e).__name__}: {e}"
+        )
+
+@router.get("/queue-depths", dependencies=[Depends(get_current_admin)])
+async def get_pipeline_queue_depths():
+    try:
+        return await run_in_threadpool(get_queue_depths)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Redis connection failed: {type(e).__name__}: {e}"
+        )
+
+@router.get("/stage-latency", dependencies=[Depends(get_current_admin)])
+async def get_stage_latency(
+    window_minutes: int = Query(60, ge=1, le=7 * 24 * 60, description="Documents completed in the last N minutes"),
+    country_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Latency percentiles (milliseconds) of each pipeline stage, overall and per country.
+    At most STAGE_LATENCY_MAX_DOCUMENTS documents are sampled, the most recent first.
+    """
+    since = datetime.now(timezone.utc) - timedelta(minutes=window_minutes)
+    query = (
+        select(Document.country_code, *(getattr(Document, timestamp) for timestamp in STAGE_TIMESTAMPS))
+        .where(Document.completed_at >= since)
+        .order_by(Document.completed_at.desc())
+        .limit(settings.STAGE_LATENCY_MAX_DOCUMENTS)
+    )
+    if country_code:
+        query = query.where(Document.country_code == country_code)
+    documents = (await db.execute(query)).mappings().all()
+
+    return {"window_minutes": window_minutes, **await run_in_threadpool(latency_report, documents)}
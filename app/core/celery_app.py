@@ -1,6 +1,8 @@
 from celery import Celery
+from kombu import Queue
 
 from app.core.config import settings
+from app.core.worker_profiles import get_worker_profile
 
 celery_app = Celery(
     "carte_grise_ocr",
@@ -8,12 +10,74 @@ celery_app = Celery(
     backend=settings.REDIS_BACKEND_URL
 )
 
+worker_profile = get_worker_profile(
+    settings.CELERY_WORKER_PROFILE,
+    concurrency=settings.CELERY_WORKER_CONCURRENCY,
+    prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+    queues=settings.CELERY_WORKER_QUEUES,
+)
+
 celery_app.conf.update(
     task_track_started=True,
     task_time_limit=3600, # 1 hour
     broker_connection_retry_on_startup=True,
-    include=['app.worker.tasks']
+    include=['app.worker.tasks', 'app.worker.reprocess'],
+    # Execution model of the worker (see app/core/worker_profiles.py)
+    worker_pool=worker_profile["pool"],
+    worker_concurrency=worker_profile["concurrency"],
+    worker_prefetch_multiplier=worker_profile["prefetch_multiplier"],
+    task_acks_late=worker_profile["acks_late"],
+    task_reject_on_worker_lost=worker_profile["acks_late"],
 )
 
+# Each extraction stage has its own queue so consumers can be scaled per stage:
+# a few CPU-bound preprocessing workers, many cheap inference workers.
+# Workers started without -Q consume every pipeline queue.
+PIPELINE_QUEUES = ("preprocess", "inference", "persist")
+celery_app.conf.task_queues = [Queue(queue) for queue in PIPELINE_QUEUES]
+celery_app.conf.task_default_queue = "preprocess"
+celery_app.conf.task_routes = {
+    "process_image_for_extraction": {"queue": "preprocess"},
+    "preprocess_document": {"queue": "preprocess"},
+    "split_document": {"queue": "preprocess"},
+    "infer_document": {"queue": "inference"},
+    "persist_document": {"queue": "persist"},
+    "check_follower": {"queue": "persist"},
+    "deliver_webhook": {"queue": "persist"},
+    "reprocess_documents": {"queue": "persist"},
+}
+
+# Message priorities (see app/services/scheduling.py): the Redis broker keeps one list per queue
+# and priority step ("inference", "inference:1", ... "inference:9") and workers drain the lowest
+# step first. Messages already prefetched by a worker are not reordered, which is why the profiles
+# keep the prefetch of long tasks low.
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEPARATOR = ":"
+celery_app.conf.broker_transport_options = {
+    "priority_steps": PRIORITY_STEPS,
+    "sep": PRIORITY_SEPARATOR,
+    "queue_order_strategy": "priority",
+}
+celery_app.conf.task_default_priority = 0
+
+
+def priority_queue_names(queue: str) -> list:
+    # The Redis lists of a queue, most urgent first; priority 0 uses the plain queue name
+    return [queue] + [f"{queue}{PRIORITY_SEPARATOR}{step}" for step in PRIORITY_STEPS[1:]]
+
+
+def get_queue_depths() -> dict:
+    """
+    Returns the number of messages waiting in each pipeline queue, all priorities included.
+    """
+    with celery_app.connection_for_read() as connection:
+        client = connection.default_channel.client
+        with client.pipeline(transaction=False) as pipe:
+            for queue in PIPELINE_QUEUES:
+                for name in priority_queue_names(queue):
+                    pipe.llen(name)
+            lengths = iter(pipe.execute())
+        return {queue: sum(next(lengths) for _ in PRIORITY_STEPS) for queue in PIPELINE_QUEUES}
+
 # Optional: Load task modules
 # celery_app.autodiscover_tasks(['app.worker'])
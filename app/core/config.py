@@ -1,21 +1,149 @@
+from typing import Dict, List, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     # Database settings
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: Optional[str] = None # Defaults to DATABASE_URL with its async driver
+    # Connection pool of each process: the workers' sync engine (DB_*) and the API's async engine
+    # (ASYNC_DB_*); pre-ping discards connections dropped by the server, recycle replaces old ones
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    ASYNC_DB_POOL_SIZE: int = 10
+    ASYNC_DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_RECYCLE_SECONDS: int = 1800 # -1 disables recycling
 
     # Mistral AI settings
     MISTRAL_API_KEY: str
+    MISTRAL_API_URL: str = "https://api.mistral.ai"
+    MISTRAL_MODEL: str = "mistral-large-latest"
+    MISTRAL_TIMEOUT_SECONDS: float = 60.0
+    # In-flight requests per process, and the API quota (0 disables rate limiting). The rate limiter
+    # lives in each worker process: the quota and burst are split evenly between the
+    # MISTRAL_RATE_LIMIT_PROCESSES worker processes calling the model (replicas x prefork children)
+    MISTRAL_MAX_CONCURRENCY: int = 32
+    MISTRAL_REQUESTS_PER_SECOND: float = 5.0
+    MISTRAL_RATE_LIMIT_BURST: int = 10
+    MISTRAL_RATE_LIMIT_PROCESSES: int = 1
+    # Retries of 429/5xx and transport errors with jittered exponential backoff
+    MISTRAL_MAX_RETRIES: int = 4
+    MISTRAL_RETRY_BACKOFF_SECONDS: float = 0.5
+    MISTRAL_RETRY_BACKOFF_MAX_SECONDS: float = 20.0
+
+    # Extraction backend (see app/services/ai/backends.py): "mistral", "tesseract", "cascade" or "stub",
+    # optionally per country, e.g. EXTRACTION_BACKEND_BY_COUNTRY='{"FR": "tesseract"}'
+    EXTRACTION_BACKEND: str = "mistral"
+    EXTRACTION_BACKEND_BY_COUNTRY: Dict[str, str] = {}
+    # Backends clients may request per upload; the stub (canned results) stays server-side unless listed,
+    # e.g. ALLOWED_REQUEST_BACKENDS='["mistral", "stub"]' for tests and benchmarks
+    ALLOWED_REQUEST_BACKENDS: List[str] = ["mistral", "tesseract", "cascade"]
+    TESSERACT_LANG: str = "fra"
+    # Local backend tried first by the "cascade" backend, before the model is asked for the fields it missed
+    CASCADE_LOCAL_BACKEND: str = "tesseract"
+    # Schema encoding of the extraction prompts: "schema" (full JSON schema), "fields" or "skeleton"
+    # (see app/services/ai/prompts.py); compare them with benchmarks/prompts.py before switching
+    PROMPT_ENCODING: str = "schema"
 
     # JWT settings
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    # In-memory cache of verified tokens and users in the API process
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_MAX_ENTRIES: int = 10_000
 
     # Redis settings for Celery
     REDIS_BROKER_URL: str
     REDIS_BACKEND_URL: str
 
+    # Celery worker execution profile (see app/core/worker_profiles.py) and optional overrides
+    CELERY_WORKER_PROFILE: str = "solo"
+    CELERY_WORKER_CONCURRENCY: Optional[int] = None
+    CELERY_WORKER_PREFETCH_MULTIPLIER: Optional[int] = None
+    CELERY_WORKER_QUEUES: Optional[str] = None # Comma-separated, e.g. "inference,persist"
+
+    # Blob storage for uploaded images ("local" is the only backend for now)
+    BLOB_STORE_BACKEND: str = "local"
+    BLOB_STORE_PATH: str = "storage"
+
+    # Maximum number of images accepted by /batch-extract/ (zip members included), and total
+    # uncompressed size of the zip members of a batch (read from the archives before extracting them)
+    BATCH_MAX_FILES: int = 1000
+    BATCH_MAX_UNCOMPRESSED_BYTES: int = 2 * 1024 * 1024 * 1024
+
+    # Upload limits: bytes per image, bytes per request (batches) and pixels per image.
+    # Single uploads are capped at UPLOAD_MAX_BYTES plus the multipart overhead (boundaries, form fields)
+    UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
+    REQUEST_MAX_BYTES: int = 1024 * 1024 * 1024
+    MULTIPART_OVERHEAD_BYTES: int = 64 * 1024
+    IMAGE_MAX_PIXELS: int = 50_000_000
+    # PDF and multi-frame TIFF uploads: rasterization resolution and maximum number of pages
+    DOCUMENT_RASTER_DPI: int = 200
+    DOCUMENT_MAX_PAGES: int = 20
+
+    # Image normalization before the model call
+    IMAGE_TARGET_LONG_EDGE: int = 1600 # Pixels
+    IMAGE_CROP_TO_DOCUMENT: bool = True
+    IMAGE_JPEG_QUALITY: int = 85
+    IMAGE_MIN_JPEG_QUALITY: int = 40
+    IMAGE_MAX_BYTES: int = 300_000
+
+    # Encoding of the stored validation results: "verbose" (value, validity and message per field)
+    # or "compact" ({"invalid": [fields]}, the values being in the raw extraction)
+    VALIDATION_RESULTS_FORMAT: str = "verbose"
+
+    # Extraction result cache (defaults to the Redis result backend when no URL is set)
+    EXTRACTION_CACHE_ENABLED: bool = True
+    EXTRACTION_CACHE_URL: Optional[str] = None
+    EXTRACTION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Identical uploads while their image is being extracted wait for that extraction (same Redis);
+    # an extraction that never finishes stops holding new uploads back after the TTL, and every
+    # waiting upload checks on the extraction it follows at the given interval (see check_follower)
+    COALESCE_EXTRACTIONS: bool = True
+    INFLIGHT_EXTRACTION_TTL_SECONDS: int = 3600
+    INFLIGHT_FOLLOWER_CHECK_SECONDS: int = 300
+    # Idempotency-Key header of /upload-and-extract/: how long a key answers retries, and how long
+    # a request that never finished (e.g. its API process died) keeps its key claimed
+    # (defaults to the result backend)
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_CLAIM_TTL_SECONDS: int = 60
+    IDEMPOTENCY_REDIS_URL: Optional[str] = None
+
+    # Status notifications: Redis pub/sub (defaults to the result backend), event streams and webhooks
+    NOTIFICATIONS_REDIS_URL: Optional[str] = None
+    EVENT_STREAM_KEEPALIVE_SECONDS: float = 15.0
+    WEBHOOK_SECRET: Optional[str] = None # Defaults to SECRET_KEY
+    WEBHOOK_TIMEOUT_SECONDS: float = 10.0
+    WEBHOOK_MAX_RETRIES: int = 5
+    # Callback URLs resolving to loopback, private, link-local or reserved addresses are refused;
+    # allow them only when the receivers run on the same private network (e.g. docker-compose)
+    WEBHOOK_ALLOW_PRIVATE_NETWORKS: bool = False
+
+    # Priority lanes and per-owner fair share (see app/services/scheduling.py): documents an owner
+    # may have queued before its next ones lose a priority step (0 disables fair share), and how long
+    # an unreleased backlog counter is kept; the counters default to the result backend
+    FAIR_SHARE_BACKLOG: int = 100
+    FAIR_SHARE_BACKLOG_TTL_SECONDS: int = 6 * 3600
+    SCHEDULING_REDIS_URL: Optional[str] = None
+
+    # Prometheus metrics port of each worker (0 disables it)
+    WORKER_METRICS_PORT: int = 9808
+
+    # Reprocessing of stored documents (app/worker/reprocess.py): rows per chunk and the cap
+    # on re-extractions enqueued per second (0 disables it)
+    REPROCESS_CHUNK_SIZE: int = 500
+    REPROCESS_EXTRACTIONS_PER_SECOND: float = 1.0
+
+    # Maximum number of documents sampled by /stage-latency
+    STAGE_LATENCY_MAX_DOCUMENTS: int = 10_000
+
+    # Comma-separated emails of the accounts allowed on the operator endpoints
+    # (/queue-depths, /stage-latency, /cache-stats); none by default
+    ADMIN_EMAILS: str = ""
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 settings = Settings()
@@ -0,0 +1,139 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Prometheus metrics of the API, the workers and the model client.
+# Processes forked by a prefork worker pool (or several uvicorn workers) must share their samples:
+# set PROMETHEUS_MULTIPROC_DIR to an empty directory and the exposition aggregates every process.
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 300_000, 1_000_000, 3_000_000, 10_000_000, 30_000_000)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "API request duration by route",
+    ["method", "route", "status_code"], buckets=LATENCY_BUCKETS,
+)
+TASK_DURATION = Histogram(
+    "celery_task_duration_seconds", "Celery task duration",
+    ["task", "country_code"], buckets=LATENCY_BUCKETS,
+)
+TASK_OUTCOMES = Counter(
+    "celery_task_outcomes_total", "Celery task outcomes (ok, failed: handled error, error: exception)",
+    ["task", "country_code", "outcome"],
+)
+MODEL_REQUEST_DURATION = Histogram(
+    "mistral_request_duration_seconds", "Duration of each Mistral API attempt",
+    ["outcome"], buckets=LATENCY_BUCKETS,
+)
+MODEL_RETRIES = Counter("mistral_retries_total", "Mistral API attempts that were retried", ["reason"])
+MODEL_TOKENS = Counter("mistral_tokens_total", "Tokens used by the Mistral API", ["kind"])
+PROMPT_TOKENS = Counter(
+    "extraction_prompt_tokens_total", "Estimated text tokens of the prompts sent, by prompt version",
+    ["country_code", "prompt_version"],
+)
+CASCADE_OUTCOMES = Counter(
+    "extraction_cascade_total", "Cascade extractions answered locally or escalated to the model",
+    ["country_code", "outcome"],
+)
+CASCADE_ESCALATED_FIELDS = Counter(
+    "extraction_cascade_escalated_fields_total", "Fields the cascade asked the model for", ["field"],
+)
+QUEUE_WAIT = Histogram(
+    "extraction_queue_wait_seconds", "Time a document waited in each pipeline queue, by priority class",
+    ["stage", "priority_class"], buckets=LATENCY_BUCKETS,
+)
+IMAGE_BYTES = Histogram(
+    "image_bytes", "Image size before (input) and after (output) preprocessing",
+    ["stage"], buckets=BYTES_BUCKETS,
+)
+
+
+class QueueDepthCollector:
+    """
+    Reports the pipeline queue depths (celery_queue_depth) at scrape time.
+    """
+
+    def collect(self):
+        from app.core.celery_app import get_queue_depths
+
+        gauge = GaugeMetricFamily("celery_queue_depth", "Messages waiting in each pipeline queue", labels=["queue"])
+        try:
+            depths = get_queue_depths()
+        except Exception:
+            return  # Broker unreachable: no sample rather than a failed scrape
+        for queue, depth in depths.items():
+            gauge.add_metric([queue], depth)
+        yield gauge
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Registry to expose: the default one, or an aggregate of all processes in multiprocess mode.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+# Queue depths are only exposed by the API (one sample set for the whole fleet)
+queue_depth_registry = CollectorRegistry(auto_describe=False)
+queue_depth_registry.register(QueueDepthCollector())
+
+
+def metrics_endpoint(request: Request) -> Response:
+    output = generate_latest(get_registry()) + generate_latest(queue_depth_registry)
+    return Response(output, media_type=CONTENT_TYPE_LATEST)
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Template of the route that handled a request, "unmatched" when no route matched.
+    The path of a route included with a prefix may or may not contain the prefix: the prefix is
+    taken from the request path, which ends with as many segments as the route path.
+    """
+    if "route" not in scope:
+        # Plain Starlette routes (e.g. /metrics) have static paths; anything else is a 404
+        return scope["path"] if "endpoint" in scope else "unmatched"
+    route = scope["route"].path
+    prefix = scope["path"].split("/")[:-route.count("/")]
+    return "/".join(prefix) + route
+
+
+class MetricsMiddleware:
+    """
+    Observes the duration of every API request, labelled with its route template
+    (e.g. /api/v1/task-status/{document_id}) to keep the label cardinality bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_REQUEST_DURATION.labels(scope["method"], route_template(scope), str(status_code)).observe(
+                time.perf_counter() - started_at
+            )
@@ -0,0 +1,36 @@
+from typing import Dict
+
+import redis
+import redis.asyncio
+
+# One client per URL and process: clients keep a connection pool, so connections are reused
+# across requests instead of being opened on every call.
+_clients: Dict[str, redis.Redis] = {}
+_async_clients: Dict[str, redis.asyncio.Redis] = {}
+
+
+def get_redis(url: str) -> redis.Redis:
+    """
+    Returns the shared synchronous client of a Redis URL (thread-safe).
+    """
+    if url not in _clients:
+        _clients[url] = redis.Redis.from_url(url)
+    return _clients[url]
+
+
+def get_async_redis(url: str) -> redis.asyncio.Redis:
+    """
+    Returns the shared asyncio client of a Redis URL, for the API event loop.
+    """
+    if url not in _async_clients:
+        _async_clients[url] = redis.asyncio.Redis.from_url(url)
+    return _async_clients[url]
+
+
+async def close_async_redis() -> None:
+    """
+    Closes the asyncio clients and their connections (application shutdown).
+    """
+    while _async_clients:
+        _, client = _async_clients.popitem()
+        await client.aclose()
@@ -0,0 +1,77 @@
+import os
+from typing import Dict, List, Optional
+
+# Celery worker execution profiles, selected with CELERY_WORKER_PROFILE.
+# - solo: one document at a time in the main process, for development and debugging
+# - io: thread pool for the network-bound model stage; threads share the Mistral client pool
+# - gevent: green threads for the same stage with a much higher concurrency (requires gevent)
+# - cpu: one process per core for the CPU-bound preprocessing stage
+# Each profile consumes the pipeline queues matching its execution model.
+# Profiles that ack late only acknowledge a message once its task finished, so a crashed
+# worker's documents are redelivered instead of lost; prefetch stays at 1 for long CPU tasks
+# so that queued documents are not hoarded by a busy process.
+WORKER_PROFILES: Dict[str, dict] = {
+    "solo": {
+        "pool": "solo",
+        "concurrency": 1,
+        "prefetch_multiplier": 1,
+        "acks_late": False,
+        "queues": ["preprocess", "inference", "persist"],
+    },
+    "io": {
+        "pool": "threads",
+        "concurrency": 32,
+        "prefetch_multiplier": 4,
+        "acks_late": True,
+        "queues": ["inference", "persist"],
+    },
+    "gevent": {
+        "pool": "gevent",
+        "concurrency": 200,
+        "prefetch_multiplier": 4,
+        "acks_late": True,
+        "queues": ["inference", "persist"],
+    },
+    "cpu": {
+        "pool": "prefork",
+        "concurrency": os.cpu_count() or 1,
+        "prefetch_multiplier": 1,
+        "acks_late": True,
+        "queues": ["preprocess"],
+    },
+}
+
+
+def get_worker_profile(
+    name: str,
+    concurrency: Optional[int] = None,
+    prefetch_multiplier: Optional[int] = None,
+    queues: Optional[str] = None,
+) -> dict:
+    """
+    Returns the settings of a worker profile, with optional concurrency/prefetch/queues overrides.
+    """
+    try:
+        profile = dict(WORKER_PROFILES[name])
+    except KeyError:
+        raise ValueError(f"Unknown worker profile '{name}'. Available profiles: {', '.join(WORKER_PROFILES)}")
+    if concurrency is not None:
+        profile["concurrency"] = concurrency
+    if prefetch_multiplier is not None:
+        profile["prefetch_multiplier"] = prefetch_multiplier
+    if queues:
+        profile["queues"] = queues.split(",")
+    return profile
+
+
+def worker_command_line(profile: dict) -> List[str]:
+    """
+    Builds the `celery worker` arguments for a profile.
+    The pool must be given on the command line for Celery to apply the gevent monkey patches.
+    """
+    return [
+        "-P", profile["pool"],
+        "-c", str(profile["concurrency"]),
+        "--prefetch-multiplier", str(profile["prefetch_multiplier"]),
+        "-Q", ",".join(profile["queues"]),
+    ]
@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 
@@ -7,19 +9,56 @@ from app.core.config import settings
 # Base class for declarative models
 Base = declarative_base()
 
+def pool_options(database_url: str, pool_size: int, max_overflow: int) -> dict:
+    """
+    Engine arguments of the connection pool. SQLite (tests, local runs) keeps its default pool,
+    which does not take a size.
+    """
+    options = {"pool_pre_ping": settings.DB_POOL_PRE_PING, "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS}
+    if make_url(database_url).get_backend_name() != "sqlite":
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS)
+    return options
+
 # Function to get a configured engine and session for a given database URL
 def get_engine(database_url: str):
-    return create_engine(database_url)
+    return create_engine(database_url, **pool_options(database_url, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW))
 
 def get_session_local(engine):
     return sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers used by the API for each synchronous driver (the workers and Alembic stay synchronous)
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database backend '{backend}'.")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+def get_async_engine(async_database_url: str):
+    return create_async_engine(
+        async_database_url,
+        **pool_options(async_database_url, settings.ASYNC_DB_POOL_SIZE, settings.ASYNC_DB_MAX_OVERFLOW)
+    )
+
+def get_async_session_local(engine):
+    # Objects stay usable after commit: reloading expired attributes would need an await
+    return async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # Global variables for the application's engine and session, to be initialized once
 # in the application startup.
 # In tests, these will be overridden.
 engine = get_engine(settings.DATABASE_URL)
 SessionLocal = get_session_local(engine)
 
+# Async engine and session for the API handlers, so that queries never block the event loop.
+async_engine = get_async_engine(settings.ASYNC_DATABASE_URL or get_async_database_url(settings.DATABASE_URL))
+AsyncSessionLocal = get_async_session_local(async_engine)
+
 
 # Dependency to get the database session
 def get_db():
@@ -28,3 +67,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# Dependency to get an async database session (API handlers)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,7 +1,11 @@
 from fastapi import FastAPI
 from app.core.config import settings
+from app.core.metrics import MetricsMiddleware, metrics_endpoint
+from app.core.middleware import MaxBodySizeMiddleware
+from app.core.redis import close_async_redis
+from app.services.notifications import status_broadcaster
 from app.api.v1.api import router as api_router # Renamed import
-from app.database import Base, engine
+from app.database import Base, async_engine, engine
 from app.models.user import User
 from app.models.document import Document
 
@@ -11,9 +15,26 @@ app = FastAPI(
     description="API for extracting information from car registration documents."
 )
 
+# Oversized bodies are rejected while streaming, before the multipart parser spools them.
+# Single uploads carry one image (and a few form fields): only batches get the large cap
+app.add_middleware(
+    MaxBodySizeMiddleware,
+    max_body_size=settings.REQUEST_MAX_BYTES,
+    path_limits={"/api/v1/upload-and-extract/": settings.UPLOAD_MAX_BYTES + settings.MULTIPART_OVERHEAD_BYTES}
+)
+# Outermost, so that rejected requests are measured too
+app.add_middleware(MetricsMiddleware)
+
 app.include_router(api_router, prefix="/api/v1")
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
 
 # Create database tables (for initial setup, Alembic will handle migrations later)
 @app.on_event("startup")
 async def startup_event():
     Base.metadata.create_all(bind=engine)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await status_broadcaster.stop()
+    await close_async_redis()
+    await async_engine.dispose()
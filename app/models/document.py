@@ -1,17 +1,76 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, JSON
+import re
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, JSON
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 
 from app.database import Base
 
+# Fields of the raw extraction promoted to indexed columns, per column (FR and TN field names)
+KEY_FIELDS = {
+    "plate_number": ("numero_immatriculation",),
+    "vin": ("numero_identification", "numero_serie"),
+}
+
+
+def normalize_key_field(value: Optional[str]) -> Optional[str]:
+    """
+    Search form of a plate number or VIN: uppercase letters and digits only ("ab-123-cd" -> "AB123CD").
+    """
+    normalized = re.sub(r"[^A-Z0-9]", "", str(value).upper()) if value is not None else ""
+    return normalized or None
+
+
+def key_field_values(extracted_data: Optional[dict]) -> dict:
+    """
+    Values of the indexed key field columns for a document's extracted data.
+    """
+    raw_extraction = (extracted_data or {}).get("raw_extraction") or {}
+    return {
+        column: normalize_key_field(next((raw_extraction[field] for field in fields if raw_extraction.get(field)), None))
+        for column, fields in KEY_FIELDS.items()
+    }
+
+
 class Document(Base):
     __tablename__ = "documents"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True) # The primary key index already covers lookups by id
     filename = Column(String, index=True)
     upload_timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    status = Column(String, default="pending") # e.g., pending, processing, completed, failed
-    extracted_data = Column(JSON, nullable=True)
+    status = Column(String, default="pending") # pending, processing, completed or failed
+    country_code = Column(String, index=True, nullable=True)
+    # JSONB on PostgreSQL (binary, GIN-indexable), JSON elsewhere
+    extracted_data = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    batch_id = Column(String, index=True, nullable=True) # Set when uploaded through /batch-extract/
+    callback_url = Column(String, nullable=True) # Webhook notified when the extraction finishes
+    blob_key = Column(String, nullable=True) # Uploaded image in the blob store, for reprocessing
+    # Key fields of the extraction (see KEY_FIELDS), normalized for search
+    plate_number = Column(String, index=True, nullable=True)
+    vin = Column(String, index=True, nullable=True)
+
+    # Pipeline stage timestamps (see app/services/stage_metrics.py)
+    enqueued_at = Column(DateTime(timezone=True), nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    preprocessed_at = Column(DateTime(timezone=True), nullable=True)
+    inferred_at = Column(DateTime(timezone=True), nullable=True) # Model response received
+    validated_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), index=True, nullable=True) # Outcome committed
 
     owner = relationship("User", back_populates="documents")
+
+    __table_args__ = (
+        # A user's documents newest first, all of them or by status (the status sits between owner_id and
+        # the ordering, so unfiltered listings need their own index); the id orders documents uploaded at
+        # the same time, e.g. a batch, for keyset pagination
+        Index("ix_documents_owner_id_upload_timestamp_id", "owner_id", "upload_timestamp", "id"),
+        Index("ix_documents_owner_id_status_upload_timestamp_id", "owner_id", "status", "upload_timestamp", "id"),
+        # Containment queries on the extraction (extracted_data @> '{"raw_extraction": {...}}'), PostgreSQL only
+        Index(
+            "ix_documents_extracted_data", "extracted_data",
+            postgresql_using="gin", postgresql_ops={"extracted_data": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
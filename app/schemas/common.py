@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Optional
+from typing import Dict, List, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
+
+from app.services.validation import expand_extracted_data
 
 class UserBase(BaseModel):
     email: str
@@ -35,6 +37,27 @@ class Document(DocumentBase):
     status: str
     extracted_data: Optional[dict] = None
     owner_id: int
+    batch_id: Optional[str] = None
+    callback_url: Optional[str] = None
+    country_code: Optional[str] = None
+    plate_number: Optional[str] = None
+    vin: Optional[str] = None
+    enqueued_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    preprocessed_at: Optional[datetime] = None
+    inferred_at: Optional[datetime] = None
+    validated_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+
+    # Stored validation results may be compact; responses are always verbose
+    _expand_extracted_data = field_validator("extracted_data")(expand_extracted_data)
 
     class Config:
         from_attributes = True
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    total: int
+    status_counts: Dict[str, int]
+    progress: float # Fraction of documents that reached "completed" or "failed"
+    documents: List[Document]
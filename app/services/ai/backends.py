@@ -0,0 +1,259 @@
+import base64
+import io
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from app.core.config import settings
+from app.core.metrics import CASCADE_ESCALATED_FIELDS, CASCADE_OUTCOMES, PROMPT_TOKENS
+from app.schemas.car_plate_fr import CarPlateFR
+from app.schemas.car_plate_tn import CarPlateTN
+from app.services.ai.mistral_client import MistralAIClient, mistral_client
+from app.services.ai.prompts import COUNTRY_PROMPTS, Prompt, PromptBuilder, prompt_builder
+from app.services.validation import REQUIRED_FIELDS, CarPlateValidator, car_plate_validator
+
+
+class ExtractionBackend(ABC):
+    """
+    Extracts the fields of a carte grise from a preprocessed image (JPEG bytes).
+    The worker picks a backend per upload (`backend` form field), per country
+    (EXTRACTION_BACKEND_BY_COUNTRY) or by default (EXTRACTION_BACKEND).
+    """
+
+    name: str
+    # Country codes the backend can read
+    countries: Tuple[str, ...]
+
+    def extract(self, image: bytes, country_code: str) -> dict:
+        if country_code not in self.countries:
+            raise ValueError(f"The {self.name} backend does not support country code: {country_code}")
+        return self._extract(image, country_code)
+
+    @abstractmethod
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        ...
+
+
+class MistralBackend(ExtractionBackend):
+    """
+    Vision LLM extraction through the Mistral chat completions API (country prompts).
+    """
+
+    name = "mistral"
+    countries = tuple(COUNTRY_PROMPTS)
+
+    def __init__(self, client: MistralAIClient, prompts: PromptBuilder):
+        self.client = client
+        self.prompts = prompts
+
+    def _call(self, image: bytes, country_code: str, prompt: Prompt) -> dict:
+        PROMPT_TOKENS.labels(country_code, prompt.version).inc(prompt.tokens)
+        image_base64 = base64.b64encode(image).decode("utf-8")
+        return self.client.extract_car_plate_data(image_base64, prompt.text)
+
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        return self._call(image, country_code, self.prompts.build(country_code))
+
+    def extract_fields(self, image: bytes, country_code: str, fields: List[str]) -> dict:
+        """
+        Asks only for some fields, with a reduced prompt; other keys of the answer are dropped.
+        """
+        extraction = self._call(image, country_code, self.prompts.build(country_code, fields))
+        return {field: extraction.get(field) for field in fields}
+
+
+STUB_EXTRACTIONS = {
+    "FR": {
+        **dict.fromkeys(CarPlateFR.model_fields),
+        "numero_immatriculation": "AB-123-CD",
+        "date_premiere_immatriculation": "2019-03-14",
+        "marque": "RENAULT",
+        "denomination_commerciale": "CLIO",
+        "numero_identification": "VF1RJA00012345678",
+        "puissance_fiscale": "5",
+        "carburant": "ES",
+    },
+    "TN": {
+        **dict.fromkeys(CarPlateTN.model_fields),
+        "numero_immatriculation": "123 TUN 4567",
+        "date_premiere_mise_en_circulation": "2018-06-02",
+        "marque": "PEUGEOT",
+        "numero_serie": "VF3LCYHZPJS123456",
+        "puissance_fiscale": "6",
+        "carburant": "ESSENCE",
+    },
+}
+
+
+class StubBackend(ExtractionBackend):
+    """
+    Deterministic backend returning a fixed extraction per country, without reading the image:
+    tests and benchmarks of the whole pipeline, offline and free.
+    """
+
+    name = "stub"
+    countries = tuple(STUB_EXTRACTIONS)
+
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        return dict(STUB_EXTRACTIONS[country_code])
+
+
+# Field codes printed on the standardized French certificate (since 2009), and the field they label
+FR_FIELD_CODES = {
+    "A": "numero_immatriculation",
+    "B": "date_premiere_immatriculation",
+    "C.1": "nom_titulaire",
+    "C.3": "adresse_titulaire",
+    "D.1": "marque",
+    "D.2": "type_variante_version",
+    "D.3": "denomination_commerciale",
+    "E": "numero_identification",
+    "F.1": "ptac",
+    "F.2": "ptac_service",
+    "F.3": "masse_max_service",
+    "G": "masse_ordre_marche",
+    "I": "date_certificat",
+    "J.1": "genre_national",
+    "J.2": "carrosserie_ce",
+    "J.3": "carrosserie_nat",
+    "P.1": "cylindree",
+    "P.2": "puissance_nette_max",
+    "P.3": "carburant",
+    "P.6": "puissance_fiscale",
+    "S.1": "nombre_places",
+    "V.7": "co2",
+}
+# A field code starts a zone that ends at the next code of the line, e.g. "D.1 RENAULT D.3 CLIO"
+FR_FIELD_CODE_PATTERN = re.compile(
+    r"(?:^|\s)(" + "|".join(re.escape(code) for code in sorted(FR_FIELD_CODES, key=len, reverse=True)) + r")\.?(?=\s)"
+)
+FR_DATE_PATTERN = re.compile(r"^(\d{2})[/.-](\d{2})[/.-](\d{4})$")
+FR_PLATE_PATTERN = re.compile(r"^([A-Z]{2})\s*-?\s*(\d{3})\s*-?\s*([A-Z]{2})$")
+# Letters never used in a VIN, and the digits the OCR mistakes them for
+VIN_OCR_FIXES = str.maketrans({"O": "0", "Q": "0", "I": "1"})
+
+
+def normalize_fr_field(field: str, value: str) -> str:
+    if "date" in field:
+        match = FR_DATE_PATTERN.match(value)
+        return f"{match.group(3)}-{match.group(2)}-{match.group(1)}" if match else value
+    if field == "numero_immatriculation":
+        match = FR_PLATE_PATTERN.match(value.upper())
+        return "-".join(match.groups()) if match else value
+    if field == "numero_identification":
+        return value.replace(" ", "").upper().translate(VIN_OCR_FIXES)
+    return value
+
+
+def parse_fr_certificate(text: str) -> dict:
+    """
+    Maps the OCR text of a French certificate to the CarPlateFR fields.
+    Every field is introduced by its printed code ("A", "D.1", "P.6"...), so each code anchors
+    the zone holding its value; fields whose code is not read stay null.
+    """
+    extraction = dict.fromkeys(CarPlateFR.model_fields)
+    for line in text.splitlines():
+        parts = FR_FIELD_CODE_PATTERN.split(line)
+        # [text before the first code, code, value, code, value, ...]
+        for code, value in zip(parts[1::2], parts[2::2]):
+            field, value = FR_FIELD_CODES[code], value.strip(" :")
+            if value and extraction[field] is None:
+                extraction[field] = normalize_fr_field(field, value)
+    return extraction
+
+
+class TesseractBackend(ExtractionBackend):
+    """
+    Local CPU backend: Tesseract OCR of the preprocessed image, then the fields are read from the
+    zones anchored by the codes printed on the standardized French layout.
+    Requires the tesseract binary (with the "fra" language) and `poetry install -E tesseract`.
+    """
+
+    name = "tesseract"
+    countries = ("FR",)
+
+    def __init__(self, lang: str = "fra", config: str = "--psm 6"):
+        self.lang = lang
+        self.config = config
+
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        try:
+            import pytesseract
+        except ImportError as e:
+            raise RuntimeError("The tesseract backend requires pytesseract (poetry install -E tesseract)") from e
+
+        with Image.open(io.BytesIO(image)) as img:
+            text = pytesseract.image_to_string(img, lang=self.lang, config=self.config)
+        return parse_fr_certificate(text)
+
+
+class CascadeBackend(ExtractionBackend):
+    """
+    Runs a cheap local backend first and checks every field with the validator.
+    - The model is only called when a required field is missing or invalid, with a reduced
+      prompt asking for those fields (and any other invalid one); the local values are kept otherwise
+    - Countries the local backend cannot read, and local failures, fall back to a full model call
+    """
+
+    name = "cascade"
+    countries = tuple(COUNTRY_PROMPTS)
+
+    def __init__(self, local: ExtractionBackend, model: MistralBackend, validator: CarPlateValidator):
+        self.local = local
+        self.model = model
+        self.validator = validator
+
+    def fields_to_escalate(self, extraction: dict, country_code: str) -> List[str]:
+        required = REQUIRED_FIELDS[country_code]
+        invalid = self.validator.invalid_fields(extraction, country_code)
+        missing = [field for field in required if extraction.get(field) is None]
+        if not missing and not any(field in required for field in invalid):
+            return []
+        return missing + [field for field in invalid if field not in missing]
+
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        try:
+            extraction = self.local.extract(image, country_code)
+        except Exception:
+            # Unsupported country, missing OCR engine or unreadable image: the model reads everything
+            CASCADE_OUTCOMES.labels(country_code, "fallback").inc()
+            return self.model.extract(image, country_code)
+
+        fields = self.fields_to_escalate(extraction, country_code)
+        if not fields:
+            CASCADE_OUTCOMES.labels(country_code, "local").inc()
+            return extraction
+
+        CASCADE_OUTCOMES.labels(country_code, "escalated").inc()
+        for field in fields:
+            CASCADE_ESCALATED_FIELDS.labels(field).inc()
+        extraction.update(self.model.extract_fields(image, country_code, fields))
+        return extraction
+
+
+extraction_backends: Dict[str, ExtractionBackend] = {
+    backend.name: backend
+    for backend in (
+        MistralBackend(mistral_client, prompt_builder), StubBackend(), TesseractBackend(settings.TESSERACT_LANG)
+    )
+}
+extraction_backends["cascade"] = CascadeBackend(
+    extraction_backends[settings.CASCADE_LOCAL_BACKEND], extraction_backends["mistral"], car_plate_validator
+)
+
+
+def resolve_backend_name(name: Optional[str], country_code: str) -> str:
+    """
+    Name of the backend to use: the requested one, else the one configured for the country,
+    else the default. Raises ValueError for unknown backends.
+    """
+    name = name or settings.EXTRACTION_BACKEND_BY_COUNTRY.get(country_code) or settings.EXTRACTION_BACKEND
+    if name not in extraction_backends:
+        raise ValueError(f"Unknown extraction backend: {name}. Available: {', '.join(extraction_backends)}")
+    return name
+
+
+def get_extraction_backend(name: Optional[str], country_code: str) -> ExtractionBackend:
+    return extraction_backends[resolve_backend_name(name, country_code)]
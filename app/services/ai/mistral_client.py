@@ -1,15 +1,81 @@
+import asyncio
 import json
-from mistralai.client import MistralClient
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
 
 from app.core.config import settings
+from app.core.metrics import MODEL_REQUEST_DURATION, MODEL_RETRIES, MODEL_TOKENS
+from app.services.ai.rate_limit import AsyncTokenBucket
 # from app.schemas.car_plate_fr import CarPlateFR
 # from app.schemas.car_plate_tn import CarPlateTN
 
-class MistralAIClient:
-    def __init__(self):
-        self.client = MistralClient(api_key=settings.MISTRAL_API_KEY)
+# Rate limiting, overload and transient server errors are worth retrying; anything else is final
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
 
-    def extract_car_plate_data(self, image_base64: str, country_prompt: str) -> dict:
+
+class MistralAPIError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"Mistral API error {status_code}: {message}")
+        self.status_code = status_code
+
+
+class AsyncMistralAIClient:
+    """
+    Asyncio client for the Mistral chat completions API.
+    - One keep-alive HTTP connection pool shared by every call
+    - At most `max_concurrency` requests in flight, paced by a token bucket matched to this process's
+      share of the API quota (the bucket is not shared between processes)
+    - Timeouts on every request; 429/5xx and transport errors are retried with jittered exponential backoff
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = "https://api.mistral.ai",
+        model: str = "mistral-large-latest",
+        timeout: float = 60.0,
+        max_concurrency: int = 32,
+        requests_per_second: float = 0.0,
+        rate_limit_burst: int = 1,
+        max_retries: int = 4,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 20.0,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.rate_limiter = AsyncTokenBucket(requests_per_second, rate_limit_burst)
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self._transport,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def extract_car_plate_data(self, image_base64: str, country_prompt: str) -> dict:
         messages = [
             {
                 "role": "user",
@@ -21,13 +87,103 @@ class MistralAIClient:
         ]
 
         # Use the JSON mode for the response
-        chat_response = self.client.chat(
-            model="mistral-large-latest", # Or another appropriate model
-            messages=messages,
-            response_format={"type": "json_object"}
-        )
+        chat_response = await self._post_with_retries("/v1/chat/completions", {
+            "model": self.model,
+            "messages": messages,
+            "response_format": {"type": "json_object"},
+        })
+
+        usage = chat_response.get("usage") or {}
+        MODEL_TOKENS.labels("prompt").inc(usage.get("prompt_tokens", 0))
+        MODEL_TOKENS.labels("completion").inc(usage.get("completion_tokens", 0))
 
-        response_content = chat_response.choices[0].message.content
+        response_content = chat_response["choices"][0]["message"]["content"]
         return json.loads(response_content)
 
-mistral_client = MistralAIClient()
+    async def _post_with_retries(self, path: str, payload: dict) -> dict:
+        http = self.http
+        for attempt in range(self.max_retries + 1):
+            await self.rate_limiter.acquire()
+            retry_after = None
+            started_at = time.perf_counter()
+            try:
+                # The semaphore is only held for the request itself, not while backing off
+                async with self._semaphore:
+                    response = await http.post(path, json=payload)
+            except httpx.TransportError as e:  # Connection errors and timeouts
+                error, outcome = e, type(e).__name__
+                # Timeouts are the slowest attempts: leaving them out would hide them from the latency
+                MODEL_REQUEST_DURATION.labels(outcome).observe(time.perf_counter() - started_at)
+            else:
+                outcome = str(response.status_code)
+                MODEL_REQUEST_DURATION.labels(outcome).observe(time.perf_counter() - started_at)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    if response.is_error:
+                        raise MistralAPIError(response.status_code, response.text)
+                    return response.json()
+                error = MistralAPIError(response.status_code, response.text)
+                retry_after = response.headers.get("retry-after")
+
+            if attempt == self.max_retries:
+                raise error
+            MODEL_RETRIES.labels(outcome).inc()
+            await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[str]) -> float:
+        # Full jitter: spreads retries of concurrent requests instead of retrying in lockstep
+        delay = random.uniform(0, min(self.retry_backoff_max, self.retry_backoff * 2 ** attempt))
+        if retry_after is not None:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class MistralAIClient:
+    """
+    Synchronous facade over `AsyncMistralAIClient` for the Celery tasks.
+    Calls run on one background event loop per process, so every worker thread (or greenlet)
+    shares the same connection pool, concurrency limit and rate limiter.
+    """
+
+    def __init__(self, async_client: AsyncMistralAIClient):
+        self.async_client = async_client
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        # Started lazily so that prefork children each get their own loop thread
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="mistral-client-loop", daemon=True).start()
+        return self._loop
+
+    def extract_car_plate_data(self, image_base64: str, country_prompt: str) -> dict:
+        future = asyncio.run_coroutine_threadsafe(
+            self.async_client.extract_car_plate_data(image_base64, country_prompt),
+            self._get_loop(),
+        )
+        return future.result()
+
+
+async_mistral_client = AsyncMistralAIClient(
+    api_key=settings.MISTRAL_API_KEY,
+    base_url=settings.MISTRAL_API_URL,
+    model=settings.MISTRAL_MODEL,
+    timeout=settings.MISTRAL_TIMEOUT_SECONDS,
+    max_concurrency=settings.MISTRAL_MAX_CONCURRENCY,
+    # Share of the API quota of this process
+    requests_per_second=settings.MISTRAL_REQUESTS_PER_SECOND / max(settings.MISTRAL_RATE_LIMIT_PROCESSES, 1),
+    rate_limit_burst=settings.MISTRAL_RATE_LIMIT_BURST // max(settings.MISTRAL_RATE_LIMIT_PROCESSES, 1),
+    max_retries=settings.MISTRAL_MAX_RETRIES,
+    retry_backoff=settings.MISTRAL_RETRY_BACKOFF_SECONDS,
+    retry_backoff_max=settings.MISTRAL_RETRY_BACKOFF_MAX_SECONDS,
+)
+mistral_client = MistralAIClient(async_mistral_client)
@@ -1,32 +1,124 @@
+import json
+import math
+import re
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.core.config import settings
 from app.schemas.car_plate_fr import CarPlateFR
 from app.schemas.car_plate_tn import CarPlateTN
 
-PROMPT_FR = f"""
-You are an expert in French car registration documents (cartes grises).
-Your task is to extract specific fields from the provided image of a French carte grise.
-Return the extracted information as a JSON object, strictly following the Pydantic schema for CarPlateFR.
+# Bump whenever the wording of the prompts changes so cached extractions made with an older prompt
+# are ignored; the full version also names the schema encoding when it is not the default one
+# (e.g. "1-fields"), so that existing "1" extractions stay current
+PROMPT_REVISION = "1"
+
+# How the expected fields are described to the model:
+# - "schema": the full Pydantic JSON schema (types, defaults, titles and descriptions)
+# - "fields": one line per field with its description (the printed field code on FR certificates)
+# - "skeleton": a minimal JSON object with every key set to null
+PROMPT_ENCODINGS = ("schema", "fields", "skeleton")
+
+COUNTRY_SCHEMAS = {
+    "FR": CarPlateFR,
+    "TN": CarPlateTN,
+}
+
+COUNTRY_NAMES = {
+    "FR": "French",
+    "TN": "Tunisian",
+}
+
+# Words and punctuation, as a tokenizer would split them; long words count one token per 4 characters
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Offline estimate of the tokens of a prompt (the API reports the real count, image included).
+    """
+    return sum(math.ceil(len(token) / 4) for token in TOKEN_PATTERN.findall(text))
+
+
+class Prompt(NamedTuple):
+    text: str
+    version: str
+    tokens: int # Estimated, see estimate_tokens
+
+
+def encode_fields(schema: Type[BaseModel], fields: Iterable[str], encoding: str) -> str:
+    if encoding == "skeleton":
+        return json.dumps(dict.fromkeys(fields), ensure_ascii=False)
+    return "\n".join(f"- {field}: {schema.model_fields[field].description}" for field in fields)
+
+
+def full_prompt(country_code: str, encoding: str) -> str:
+    schema, country = COUNTRY_SCHEMAS[country_code], COUNTRY_NAMES[country_code]
+    if encoding == "schema":
+        # Revision 1 text, unchanged
+        return f"""
+You are an expert in {country} car registration documents (cartes grises).
+Your task is to extract specific fields from the provided image of a {country} carte grise.
+Return the extracted information as a JSON object, strictly following the Pydantic schema for {schema.__name__}.
 If a field is not found or is not applicable, set its value to null.
 
 Here is the Pydantic schema you must follow:
-{CarPlateFR.model_json_schema()}
+{schema.model_json_schema()}
 
 Ensure the JSON output is perfectly valid and directly parsable.
+"""
+    return f"""
+Extract the fields of this {country} carte grise as a JSON object with these keys, null when not found:
+{encode_fields(schema, schema.model_fields, encoding)}
+Dates use the YYYY-MM-DD format.
 """
 
-PROMPT_TN = f"""
-You are an expert in Tunisian car registration documents (cartes grises).
-Your task is to extract specific fields from the provided image of a Tunisian carte grise.
-Return the extracted information as a JSON object, strictly following the Pydantic schema for CarPlateTN.
-If a field is not found or is not applicable, set its value to null.
 
-Here is the Pydantic schema you must follow:
-{CarPlateTN.model_json_schema()}
+def fields_prompt(country_code: str, fields: Tuple[str, ...], encoding: str) -> str:
+    schema, country = COUNTRY_SCHEMAS[country_code], COUNTRY_NAMES[country_code]
+    # The schema encoding lists the fields with their description too: a partial JSON schema is no clearer
+    return f"""
+You are an expert in {country} car registration documents (cartes grises).
+Extract only the following fields from the provided image of a {country} carte grise:
+{encode_fields(schema, fields, "skeleton" if encoding == "skeleton" else "fields")}
 
-Ensure the JSON output is perfectly valid and directly parsable.
+Return a JSON object with exactly these keys. If a field is not found, set its value to null.
+Dates use the YYYY-MM-DD format. Ensure the JSON output is perfectly valid and directly parsable.
 """
 
+
+class PromptBuilder:
+    """
+    Builds the extraction prompts of one schema encoding.
+    - Prompts are built once per country (and per field list for partial prompts) and cached
+    - Each prompt carries its version, stored with the results, and its estimated token count
+    """
+
+    def __init__(self, encoding: str = "schema"):
+        if encoding not in PROMPT_ENCODINGS:
+            raise ValueError(f"Unknown prompt encoding: {encoding}. Available: {', '.join(PROMPT_ENCODINGS)}")
+        self.encoding = encoding
+        self.version = PROMPT_REVISION if encoding == "schema" else f"{PROMPT_REVISION}-{encoding}"
+        self._prompts: Dict[Tuple[str, Optional[Tuple[str, ...]]], Prompt] = {}
+
+    def build(self, country_code: str, fields: Optional[Iterable[str]] = None) -> Prompt:
+        """
+        Prompt asking for every field of the country schema, or only for `fields`.
+        """
+        key = (country_code, tuple(fields) if fields is not None else None)
+        prompt = self._prompts.get(key)
+        if prompt is None:
+            if key[1] is None:
+                text = full_prompt(country_code, self.encoding)
+            else:
+                text = fields_prompt(country_code, key[1], self.encoding)
+            prompt = self._prompts[key] = Prompt(text, self.version, estimate_tokens(text))
+        return prompt
+
+
+prompt_builder = PromptBuilder(settings.PROMPT_ENCODING)
+PROMPT_VERSION = prompt_builder.version
+
 # Dictionary to easily access prompts by country code
-COUNTRY_PROMPTS = {
-    "FR": PROMPT_FR,
-    "TN": PROMPT_TN,
-}
+COUNTRY_PROMPTS = {country_code: prompt_builder.build(country_code).text for country_code in COUNTRY_SCHEMAS}
@@ -0,0 +1,194 @@
+import json
+from typing import List, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.ai.prompts import PROMPT_VERSION
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of extraction results.
+    - Keyed by the SHA-256 of the image bytes, the country code, the extraction backend and the prompt version
+    - Entries expire after a TTL; under memory pressure Redis evicts the least recently
+      used entries first (see `maxmemory-policy volatile-lru` in docker-compose.yml)
+    - Redis errors are treated as misses so the cache can never fail an extraction
+    """
+
+    KEY_PREFIX = "extraction_cache"
+
+    def __init__(self, url: str, ttl_seconds: int, enabled: bool = True):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._client = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = get_redis(self.url)
+        return self._client
+
+    def make_key(self, image_hash: str, country_code: str, backend: str) -> str:
+        return f"{self.KEY_PREFIX}:v{PROMPT_VERSION}:{backend}:{country_code}:{image_hash}"
+
+    def get(self, image_hash: str, country_code: str, backend: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        try:
+            cached = self.client.get(self.make_key(image_hash, country_code, backend))
+            self.client.incr(f"{self.KEY_PREFIX}:{'hits' if cached is not None else 'misses'}")
+        except redis.RedisError:
+            return None
+        return json.loads(cached) if cached is not None else None
+
+    def get_many(self, image_hashes: List[str], country_code: str, backend: str) -> List[Optional[dict]]:
+        """
+        Looks up several images in one round-trip (MGET), e.g. for a batch.
+        """
+        if not self.enabled or not image_hashes:
+            return [None] * len(image_hashes)
+        try:
+            cached = self.client.mget([self.make_key(image_hash, country_code, backend) for image_hash in image_hashes])
+            hits = sum(value is not None for value in cached)
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.incrby(f"{self.KEY_PREFIX}:hits", hits)
+                pipe.incrby(f"{self.KEY_PREFIX}:misses", len(cached) - hits)
+                pipe.execute()
+        except redis.RedisError:
+            return [None] * len(image_hashes)
+        return [json.loads(value) if value is not None else None for value in cached]
+
+    def set(self, image_hash: str, country_code: str, backend: str, extracted_data: dict) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.client.set(
+                self.make_key(image_hash, country_code, backend),
+                json.dumps(extracted_data),
+                ex=self.ttl_seconds,
+            )
+        except redis.RedisError:
+            pass
+
+    def stats(self) -> dict:
+        hits, misses = self.client.mget(f"{self.KEY_PREFIX}:hits", f"{self.KEY_PREFIX}:misses")
+        hits, misses = int(hits or 0), int(misses or 0)
+        lookups = hits + misses
+        return {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+class InflightExtractions:
+    """
+    Coalesces identical extractions in flight: while an image is being extracted (per country code,
+    backend and prompt version, as in the cache), identical uploads wait for its outcome instead of
+    queuing their own extraction.
+    - `join` atomically makes a document the leader of its extraction, or a follower of the running one
+    - `finish`, once the leader is persisted, hands over its followers, which get the same outcome
+    - Entries expire after a TTL so that a lost extraction does not hold new uploads back; followers
+      check on their leader meanwhile (see check_follower in app/worker/tasks.py)
+    - Redis errors make every document a leader, i.e. no coalescing
+    """
+
+    KEY_PREFIX = "inflight"
+    # KEYS: leader, followers; ARGV: document id, TTL. Returns the leader's id, or nil for a new leader.
+    JOIN_SCRIPT = """
+    local leader = redis.call('GET', KEYS[1])
+    if leader then
+        redis.call('SADD', KEYS[2], ARGV[1])
+        redis.call('EXPIRE', KEYS[2], ARGV[2])
+        return tonumber(leader)
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return false
+    """
+    # KEYS: leader, followers; ARGV: document id. Only the current leader takes the followers.
+    FINISH_SCRIPT = """
+    if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+        return {}
+    end
+    local followers = redis.call('SMEMBERS', KEYS[2])
+    redis.call('DEL', KEYS[1], KEYS[2])
+    return followers
+    """
+
+    def __init__(self, url: str, ttl_seconds: int, enabled: bool = True):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        self._client = None
+        self._scripts = {}
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = get_redis(self.url)
+        return self._client
+
+    def run_script(self, script: str, keys: List[str], args: list):
+        # Scripts are sent once, then called by their SHA1 (EVALSHA)
+        if script not in self._scripts:
+            self._scripts[script] = self.client.register_script(script)
+        return self._scripts[script](keys=keys, args=args)
+
+    def make_keys(self, image_hash: str, country_code: str, backend: str) -> List[str]:
+        key = f"{self.KEY_PREFIX}:v{PROMPT_VERSION}:{backend}:{country_code}:{image_hash}"
+        return [key, f"{key}:followers"]
+
+    def join(self, image_hash: str, country_code: str, backend: str, document_id: int) -> Optional[int]:
+        """
+        Returns the id of the document already being extracted (this one then follows it),
+        or None when this document leads and must be extracted.
+        """
+        if not self.enabled:
+            return None
+        try:
+            return self.run_script(self.JOIN_SCRIPT, self.make_keys(image_hash, country_code, backend),
+                                   [document_id, self.ttl_seconds])
+        except redis.RedisError:
+            return None
+
+    def leader(self, image_hash: str, country_code: str, backend: str) -> Optional[int]:
+        """
+        Returns the id of the document being extracted, or None when no extraction is in flight.
+        """
+        if not self.enabled:
+            return None
+        try:
+            leader_id = self.client.get(self.make_keys(image_hash, country_code, backend)[0])
+        except redis.RedisError:
+            return None
+        return int(leader_id) if leader_id is not None else None
+
+    def finish(self, image_hash: str, country_code: str, backend: str, document_id: int) -> List[int]:
+        """
+        Ends the extraction led by `document_id` and returns the ids of its followers.
+        """
+        if not self.enabled:
+            return []
+        try:
+            followers = self.run_script(self.FINISH_SCRIPT, self.make_keys(image_hash, country_code, backend),
+                                        [document_id])
+        except redis.RedisError:
+            return []
+        return sorted(int(follower) for follower in followers)
+
+
+extraction_cache = ExtractionCache(
+    url=settings.EXTRACTION_CACHE_URL or settings.REDIS_BACKEND_URL,
+    ttl_seconds=settings.EXTRACTION_CACHE_TTL_SECONDS,
+    enabled=settings.EXTRACTION_CACHE_ENABLED,
+)
+
+inflight_extractions = InflightExtractions(
+    url=settings.EXTRACTION_CACHE_URL or settings.REDIS_BACKEND_URL,
+    ttl_seconds=settings.INFLIGHT_EXTRACTION_TTL_SECONDS,
+    enabled=settings.COALESCE_EXTRACTIONS,
+)
@@ -0,0 +1,73 @@
+import json
+from typing import Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+
+class IdempotencyKeys:
+    """
+    Idempotency-Key records of uploads, per owner: the request fingerprint and the document created.
+    - The first request with a key claims it (SET NX) before creating its document; the claim
+      only lives `claim_ttl_seconds`, and the record gets the full `ttl_seconds` once the document exists
+    - Retries with the key get the recorded document back instead of a new one; a retry arriving
+      while the first request is still running finds the claim without a document
+    - Redis errors are treated as unclaimed keys: uploads never fail because of this record
+    """
+
+    KEY_PREFIX = "idempotency"
+
+    def __init__(self, url: str, ttl_seconds: int, claim_ttl_seconds: int):
+        self.url = url
+        self.ttl_seconds = ttl_seconds
+        self.claim_ttl_seconds = claim_ttl_seconds
+        self._client = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = get_redis(self.url)
+        return self._client
+
+    def make_key(self, owner_id: int, idempotency_key: str) -> str:
+        return f"{self.KEY_PREFIX}:{owner_id}:{idempotency_key}"
+
+    def claim(self, owner_id: int, idempotency_key: str, fingerprint: str) -> Optional[dict]:
+        """
+        Claims a key for a new request (returns None), or returns the record of the request
+        that claimed it first: {"fingerprint": ..., "document_id": None until its document exists}.
+        """
+        key = self.make_key(owner_id, idempotency_key)
+        record = {"fingerprint": fingerprint, "document_id": None}
+        try:
+            # A request that dies before completing does not block its retries (409) for long
+            if self.client.set(key, json.dumps(record), nx=True, ex=self.claim_ttl_seconds):
+                return None
+            existing = self.client.get(key)
+        except redis.RedisError:
+            return None
+        # Released between the two commands: the request can proceed
+        return json.loads(existing) if existing is not None else None
+
+    def complete(self, owner_id: int, idempotency_key: str, fingerprint: str, document_id: int) -> None:
+        record = {"fingerprint": fingerprint, "document_id": document_id}
+        try:
+            self.client.set(self.make_key(owner_id, idempotency_key), json.dumps(record), ex=self.ttl_seconds)
+        except redis.RedisError:
+            pass
+
+    def release(self, owner_id: int, idempotency_key: str) -> None:
+        # A failed request frees its key so that the client can retry it
+        try:
+            self.client.delete(self.make_key(owner_id, idempotency_key))
+        except redis.RedisError:
+            pass
+
+
+idempotency_keys = IdempotencyKeys(
+    url=settings.IDEMPOTENCY_REDIS_URL or settings.REDIS_BACKEND_URL,
+    ttl_seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS,
+    claim_ttl_seconds=settings.IDEMPOTENCY_CLAIM_TTL_SECONDS,
+)
@@ -1,46 +1,229 @@
-import base64
+from dataclasses import dataclass, field
+from typing import Optional
 import io
+import time
+import warnings
+
 from PIL import Image
 import cv2
 import numpy as np
 
-def preprocess_image(image_data: bytes) -> str:
+from app.core.config import settings
+
+
+@dataclass
+class NormalizationOptions:
+    target_long_edge: int = field(default_factory=lambda: settings.IMAGE_TARGET_LONG_EDGE)
+    crop_to_document: bool = field(default_factory=lambda: settings.IMAGE_CROP_TO_DOCUMENT)
+    jpeg_quality: int = field(default_factory=lambda: settings.IMAGE_JPEG_QUALITY)
+    min_jpeg_quality: int = field(default_factory=lambda: settings.IMAGE_MIN_JPEG_QUALITY)
+    max_bytes: int = field(default_factory=lambda: settings.IMAGE_MAX_BYTES)
+
+
+# Formats accepted at upload, matched on the header bytes
+SUPPORTED_FORMATS = ("JPEG", "PNG", "WEBP", "TIFF", "BMP")
+
+
+class ImageTooLargeError(ValueError):
+    """
+    Raised when an image exceeds the upload size or pixel limits.
+    """
+
+
+@dataclass
+class ImageHeader:
+    format: str
+    width: int
+    height: int
+
+
+def read_image_header(header: bytes, max_pixels: Optional[int] = None) -> ImageHeader:
+    """
+    Reads the format and dimensions of an image from its first bytes, without decoding any pixel.
+    - Raises ValueError when the header is not one of the supported formats
+    - Raises ImageTooLargeError above `max_pixels` (decompression bombs)
+    """
+    max_pixels = max_pixels or settings.IMAGE_MAX_PIXELS
+    try:
+        with warnings.catch_warnings():
+            # The pixel limit is enforced below, with our own threshold
+            warnings.simplefilter("ignore", Image.DecompressionBombWarning)
+            with Image.open(io.BytesIO(header), formats=SUPPORTED_FORMATS) as image:
+                image_header = ImageHeader(format=image.format, width=image.size[0], height=image.size[1])
+    except Image.DecompressionBombError:
+        raise ImageTooLargeError("Image dimensions exceed the allowed number of pixels.")
+    except Exception:
+        raise ValueError("Unsupported or unrecognized image format.")
+
+    if image_header.width * image_header.height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image dimensions {image_header.width}x{image_header.height} exceed the allowed number of pixels."
+        )
+    return image_header
+
+
+# Reduced decoding scales the JPEG DCT directly, so large photos are never materialized at full size
+REDUCED_GRAYSCALE_FLAGS = ((8, cv2.IMREAD_REDUCED_GRAYSCALE_8), (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+                           (2, cv2.IMREAD_REDUCED_GRAYSCALE_2))
+
+
+def decode_image(image_data: bytes, min_long_edge: Optional[int] = None) -> np.ndarray:
     """
-    Pre-processes an image for OCR.
-    - Converts to grayscale
-    - Resizes for better processing (optional, can be adjusted)
-    - Returns base64 encoded image
+    Decodes image bytes once, straight to a grayscale array.
+    - The header is checked first, so unsupported formats and decompression bombs are never decoded
+    - OpenCV applies the EXIF orientation while decoding, so phone photos come out upright
+    - With `min_long_edge`, the image is decoded at the smallest 1/2, 1/4 or 1/8 scale whose long
+      edge is still at least `min_long_edge`
+    This is the full verification of uploads, which the API only checks from their header.
     """
-    # Convert bytes to a numpy array
-    nparr = np.frombuffer(image_data, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    header = read_image_header(image_data)
+    long_edge = max(header.width, header.height)
+    flag = cv2.IMREAD_GRAYSCALE
+    if min_long_edge:
+        for factor, reduced_flag in REDUCED_GRAYSCALE_FLAGS:
+            if long_edge // factor >= min_long_edge:
+                flag = reduced_flag
+                break
+
+    # np.frombuffer wraps the bytes without copying them
+    img = cv2.imdecode(np.frombuffer(image_data, np.uint8), flag)
 
     if img is None:
         raise ValueError("Could not decode image data.")
+    return img
 
-    # Convert to grayscale
-    gray_img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
 
-    # Resize (optional, adjust dimensions as needed)
-    # For example, resize to a consistent width while maintaining aspect ratio
-    # target_width = 1000
-    # (h, w) = gray_img.shape[:2]
-    # r = target_width / float(w)
-    # dim = (target_width, int(h * r))
-    # resized_img = cv2.resize(gray_img, dim, interpolation=cv2.INTER_AREA)
+def _order_corners(corners: np.ndarray) -> np.ndarray:
+    # Top-left, top-right, bottom-right, bottom-left
+    sums = corners.sum(axis=1)
+    diffs = np.diff(corners, axis=1).ravel()
+    return np.array([
+        corners[np.argmin(sums)],
+        corners[np.argmin(diffs)],
+        corners[np.argmax(sums)],
+        corners[np.argmax(diffs)],
+    ], dtype=np.float32)
 
-    # Convert back to PIL Image to save to bytes
-    pil_img = Image.fromarray(gray_img)
-    buffered = io.BytesIO()
-    pil_img.save(buffered, format="JPEG") # Save as JPEG for base64 encoding
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
 
-def is_valid_image(image_data: bytes) -> bool:
+def crop_to_document(img: np.ndarray, min_area_ratio: float = 0.2) -> np.ndarray:
     """
-    Checks if the provided bytes represent a valid image.
+    Crops and straightens the document when its outline can be found.
+    - Contours are searched on a downscaled copy (~500 px) for speed
+    - The largest quadrilateral covering at least `min_area_ratio` of the photo is the document
+    - Returns the image unchanged when no such quadrilateral exists
     """
-    try:
-        Image.open(io.BytesIO(image_data)).verify()
-        return True
-    except Exception:
-        return False
+    (h, w) = img.shape[:2]
+    scale = 500 / max(h, w)
+    small = cv2.resize(img, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    if small.ndim == 3:
+        small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    cv2.GaussianBlur(small, (5, 5), 0, dst=small)
+    edges = cv2.Canny(small, 50, 150)
+    cv2.dilate(edges, np.ones((3, 3), np.uint8), dst=edges)
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = min_area_ratio * small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < min_area:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4:
+            continue
+
+        corners = _order_corners(approx.reshape(4, 2).astype(np.float32) / scale)
+        (tl, tr, br, bl) = corners
+        width = int(max(np.linalg.norm(br - bl), np.linalg.norm(tr - tl)))
+        height = int(max(np.linalg.norm(tr - br), np.linalg.norm(tl - bl)))
+        target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], dtype=np.float32)
+        matrix = cv2.getPerspectiveTransform(corners, target)
+        return cv2.warpPerspective(img, matrix, (width, height))
+    return img
+
+
+def resize_long_edge(img: np.ndarray, target_long_edge: int) -> np.ndarray:
+    """
+    Downscales so that the longest side is at most `target_long_edge` pixels (never upscales).
+    """
+    (h, w) = img.shape[:2]
+    if max(h, w) <= target_long_edge:
+        return img
+    r = target_long_edge / float(max(h, w))
+    dim = (max(1, int(w * r)), max(1, int(h * r)))
+    return cv2.resize(img, dim, interpolation=cv2.INTER_AREA)
+
+
+def encode_jpeg(img: np.ndarray, quality: int, min_quality: int, max_bytes: int) -> memoryview:
+    """
+    Encodes to JPEG at the highest quality in [min_quality, quality] that fits in `max_bytes`.
+    - A single encode at `quality` is usually enough once the image is resized
+    - Otherwise binary search on the quality; if even `min_quality` is too large, the image is
+      downscaled by 25% and searched again
+    - Returns a view of OpenCV's output buffer (bytes-like, not copied)
+    """
+    def encode(q: int) -> memoryview:
+        ok, buffer = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, q])
+        if not ok:
+            raise ValueError("Could not encode image data.")
+        return buffer.data
+
+    best = encode(quality)
+    if len(best) <= max_bytes:
+        return best
+
+    low, high = min_quality, quality - 1
+    best = None
+    while low <= high:
+        q = (low + high) // 2
+        candidate = encode(q)
+        if len(candidate) <= max_bytes:
+            best, low = candidate, q + 1
+        else:
+            high = q - 1
+    if best is not None:
+        return best
+
+    (h, w) = img.shape[:2]
+    if max(h, w) < 400:
+        return encode(min_quality)  # Too small to shrink further, accept the overshoot
+    smaller = cv2.resize(img, (int(w * 0.75), int(h * 0.75)), interpolation=cv2.INTER_AREA)
+    return encode_jpeg(smaller, quality, min_quality, max_bytes)
+
+
+def preprocess_image(
+    image_data: bytes,
+    options: Optional[NormalizationOptions] = None,
+    timings: Optional[dict] = None,
+) -> memoryview:
+    """
+    Pre-processes an image for OCR, decoding and encoding it exactly once.
+    - Decodes to grayscale with the EXIF orientation applied, at a reduced scale for large photos
+    - Crops to the document region (contour detection)
+    - Resizes so the long edge is at most the target resolution
+    - Returns the JPEG encoded image (bytes-like), within the size budget
+    When `timings` is given, the duration of each stage (seconds) is recorded in it.
+    """
+    options = options or NormalizationOptions()
+    started_at = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal started_at
+        if timings is not None:
+            now = time.perf_counter()
+            timings[stage] = now - started_at
+            started_at = now
+
+    # The document usually fills most of the photo, so a small margin keeps the crop near the target size
+    margin = 1.25 if options.crop_to_document else 1.0
+    img = decode_image(image_data, min_long_edge=int(options.target_long_edge * margin))
+    lap("decode")
+
+    if options.crop_to_document:
+        img = crop_to_document(img)
+    lap("crop")
+
+    img = resize_long_edge(img, options.target_long_edge)
+    lap("resize")
+
+    encoded = encode_jpeg(img, options.jpeg_quality, options.min_jpeg_quality, options.max_bytes)
+    lap("encode")
+    return encoded
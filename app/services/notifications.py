@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import hmac
+import ipaddress
+import json
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Set
+from urllib.parse import urlparse
+
+import httpx
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_async_redis, get_redis
+from app.services.validation import expand_extracted_data
+
+# Document status transitions are published by the workers on one Redis channel per document;
+# the API relays them to the clients (server-sent events) and webhooks are delivered by a task.
+CHANNEL_PREFIX = "document_status"
+FINAL_STATUSES = ("completed", "failed")
+
+
+def status_channel(document_id: int) -> str:
+    return f"{CHANNEL_PREFIX}:{document_id}"
+
+
+def status_event(document_id: int, status: str, extracted_data: Optional[dict] = None) -> dict:
+    # Events and webhooks carry the same verbose validation results as /task-status/
+    return {"document_id": document_id, "status": status, "extracted_data": expand_extracted_data(extracted_data)}
+
+
+def publish_status(document_id: int, status: str, extracted_data: Optional[dict] = None) -> None:
+    """
+    Publishes a status transition (from the workers).
+    Redis errors are ignored: notifications must never fail an extraction, and clients can
+    always fall back to /task-status/.
+    """
+    event = status_event(document_id, status, extracted_data)
+    try:
+        get_redis(settings.NOTIFICATIONS_REDIS_URL or settings.REDIS_BACKEND_URL).publish(
+            status_channel(document_id), json.dumps(event)
+        )
+    except redis.RedisError:
+        pass
+
+
+class StatusBroadcaster:
+    """
+    Fans the published status events out to the event streams of this API process.
+    - A single pattern subscription per process, whatever the number of connected clients
+    - The subscription starts with the first listener and is restarted after a Redis failure;
+      on failure the open streams are ended so that clients reconnect
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self._listeners: Dict[int, Set[asyncio.Queue]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._subscribed: Optional[asyncio.Future] = None
+
+    async def _run(self) -> None:
+        pubsub = get_async_redis(self.url).pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.psubscribe(f"{CHANNEL_PREFIX}:*")
+            self._subscribed.set_result(True)
+            async for message in pubsub.listen():
+                event = json.loads(message["data"])
+                for queue in self._listeners.get(event["document_id"], ()):
+                    queue.put_nowait(event)
+        except Exception as e:
+            if not self._subscribed.done():
+                self._subscribed.set_exception(e)
+            for queues in self._listeners.values():
+                for queue in queues:
+                    queue.put_nowait(None)
+        finally:
+            await pubsub.aclose()
+
+    async def _ensure_subscribed(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._subscribed = loop.create_future()
+            self._task = loop.create_task(self._run())
+        await asyncio.shield(self._subscribed)
+
+    @asynccontextmanager
+    async def listen(self, document_id: int) -> AsyncIterator[asyncio.Queue]:
+        """
+        Yields a queue receiving the status events of a document (None when the stream must end).
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._listeners.setdefault(document_id, set()).add(queue)
+        try:
+            await self._ensure_subscribed()
+            yield queue
+        finally:
+            listeners = self._listeners.get(document_id, set())
+            listeners.discard(queue)
+            if not listeners:
+                self._listeners.pop(document_id, None)
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+
+
+def sign_webhook(body: bytes, timestamp: str) -> str:
+    """
+    HMAC-SHA256 of "<timestamp>.<body>" with WEBHOOK_SECRET (SECRET_KEY by default).
+    Receivers recompute it from the X-Webhook-Timestamp header and the raw body, and should
+    reject old timestamps to prevent replays.
+    """
+    secret = (settings.WEBHOOK_SECRET or settings.SECRET_KEY).encode("utf-8")
+    return hmac.new(secret, timestamp.encode("utf-8") + b"." + body, hashlib.sha256).hexdigest()
+
+
+class UnsafeCallbackURLError(ValueError):
+    pass
+
+
+def check_callback_url(callback_url: str) -> None:
+    """
+    Rejects the callback URLs webhooks must not call, as they would let clients reach internal services (SSRF).
+    - Only absolute http(s) URLs whose host resolves to public addresses are allowed
+    - Checked at upload and again before every delivery, since DNS answers can change in between
+    - Raises UnsafeCallbackURLError, or socket.gaierror when the host cannot be resolved
+    """
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeCallbackURLError("Invalid callback URL. Only absolute http(s) URLs are allowed.")
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeCallbackURLError("Invalid callback URL port.")
+    if settings.WEBHOOK_ALLOW_PRIVATE_NETWORKS:
+        return
+    for *_, sockaddr in socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM):
+        # Link-local IPv6 addresses carry a scope ("fe80::1%eth0")
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        # Loopback, private, link-local (cloud metadata), shared, reserved and unspecified addresses
+        # are not global; multicast ones can be
+        if not address.is_global or address.is_multicast:
+            raise UnsafeCallbackURLError("Callback URLs must not resolve to private or reserved addresses.")
+
+
+def send_webhook(callback_url: str, event: dict) -> httpx.Response:
+    """
+    POSTs a status event to a callback URL, signed in the X-Webhook-Signature header.
+    The URL is checked again first (see check_callback_url); redirects are not followed.
+    """
+    check_callback_url(callback_url)
+    body = json.dumps(event).encode("utf-8")
+    timestamp = str(int(time.time()))
+    headers = {
+        "Content-Type": "application/json",
+        "X-Webhook-Timestamp": timestamp,
+        "X-Webhook-Signature": f"sha256={sign_webhook(body, timestamp)}",
+    }
+    return webhook_client.post(callback_url, content=body, headers=headers)
+
+
+webhook_client = httpx.Client(timeout=settings.WEBHOOK_TIMEOUT_SECONDS)
+status_broadcaster = StatusBroadcaster(settings.NOTIFICATIONS_REDIS_URL or settings.REDIS_BACKEND_URL)
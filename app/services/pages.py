@@ -0,0 +1,128 @@
+import math
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from PIL import Image, ImageSequence
+import cv2
+import numpy as np
+import pypdfium2 as pdfium
+
+from app.core.config import settings
+from app.services.image_processing import ImageTooLargeError
+
+# Multi-page uploads, recognized from their first bytes
+PDF_MAGIC = b"%PDF-"
+TIFF_MAGICS = (b"II*\x00", b"MM\x00*")
+PDF_POINTS_PER_INCH = 72
+
+
+def multipage_format(header: bytes) -> Optional[str]:
+    """
+    "PDF" or "TIFF" when the upload may hold several pages (split before extraction), else None.
+    """
+    if header.startswith(PDF_MAGIC):
+        return "PDF"
+    if header.startswith(TIFF_MAGICS):
+        return "TIFF"
+    return None
+
+
+def raster_scale(width: float, height: float, scale: float, max_pixels: int) -> float:
+    # Lowers the scale so that the rendered page stays within the pixel limit
+    if width * height * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / (width * height))
+    return scale
+
+
+def iter_pdf_pages(stream: BinaryIO, dpi: int, max_pixels: int) -> Iterator[np.ndarray]:
+    """
+    Renders the pages of a PDF one at a time (grayscale, `dpi` dots per inch).
+    The file is read on demand through `stream`: only the page being rendered is in memory.
+    """
+    pdf = pdfium.PdfDocument(stream)
+    try:
+        for index in range(len(pdf)):
+            page = pdf[index]
+            try:
+                width, height = page.get_size()
+                scale = raster_scale(width, height, dpi / PDF_POINTS_PER_INCH, max_pixels)
+                bitmap = page.render(scale=scale, grayscale=True)
+                yield np.array(bitmap.to_pil())
+            finally:
+                page.close()
+    finally:
+        pdf.close()
+
+
+def iter_tiff_pages(stream: BinaryIO, dpi: int, max_pixels: int) -> Iterator[np.ndarray]:
+    """
+    Decodes the frames of a (multi-frame) TIFF one at a time, in grayscale.
+    Frames scanned above `dpi` are downscaled to it; every frame is checked against the pixel limit
+    before it is decoded.
+    """
+    with Image.open(stream, formats=("TIFF",)) as tiff:
+        for frame in ImageSequence.Iterator(tiff):
+            if frame.size[0] * frame.size[1] > max_pixels:
+                raise ImageTooLargeError(
+                    f"Page dimensions {frame.size[0]}x{frame.size[1]} exceed the allowed number of pixels."
+                )
+            page = np.array(frame.convert("L"))
+            frame_dpi = frame.info.get("dpi", (dpi, dpi))[0] or dpi
+            if frame_dpi > dpi:
+                ratio = dpi / float(frame_dpi)
+                page = cv2.resize(page, (max(1, int(page.shape[1] * ratio)), max(1, int(page.shape[0] * ratio))),
+                                  interpolation=cv2.INTER_AREA)
+            yield page
+
+
+def join_pages(pages: List[np.ndarray]) -> np.ndarray:
+    """
+    Places the pages of one certificate (recto/verso) side by side, on a white background.
+    """
+    if len(pages) == 1:
+        return pages[0]
+    height = max(page.shape[0] for page in pages)
+    return np.hstack([
+        cv2.copyMakeBorder(page, 0, height - page.shape[0], 0, 0, cv2.BORDER_CONSTANT, value=255)
+        for page in pages
+    ])
+
+
+def encode_page(page: np.ndarray) -> bytes:
+    # High quality: the worker normalizes (and recompresses) each unit like any uploaded photo
+    ok, buffer = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 92])
+    if not ok:
+        raise ValueError("Could not encode page.")
+    return buffer.tobytes()
+
+
+def split_pages(
+    stream: BinaryIO,
+    document_format: str,
+    pages_per_document: int = 1,
+    dpi: Optional[int] = None,
+    max_pages: Optional[int] = None,
+    max_pixels: Optional[int] = None,
+) -> Iterator[Tuple[int, int, bytes]]:
+    """
+    Splits a multi-page upload into extraction units, yielded one at a time as
+    (first page number, last page number, JPEG bytes).
+    - Each page is a unit, or each group of `pages_per_document` consecutive pages (recto/verso)
+    - Pages are rasterized lazily, so memory holds one unit at a time whatever the page count
+    - A unit stays within the pixel limit of uploaded images (shared by the pages it joins)
+    - Raises ValueError beyond `max_pages` pages
+    """
+    dpi = dpi or settings.DOCUMENT_RASTER_DPI
+    max_pages = max_pages or settings.DOCUMENT_MAX_PAGES
+    max_pixels = (max_pixels or settings.IMAGE_MAX_PIXELS) // pages_per_document
+    iter_pages = iter_pdf_pages if document_format == "PDF" else iter_tiff_pages
+
+    group = []
+    for number, page in enumerate(iter_pages(stream, dpi, max_pixels), start=1):
+        if number > max_pages:
+            raise ValueError(f"The document has more than {max_pages} pages.")
+        group.append(page)
+        if len(group) == pages_per_document:
+            yield number - len(group) + 1, number, encode_page(join_pages(group))
+            group = []
+    if group:
+        yield number - len(group) + 1, number, encode_page(join_pages(group))
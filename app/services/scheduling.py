@@ -0,0 +1,90 @@
+from typing import List, Optional
+
+import redis
+
+from app.core.config import settings
+from app.core.redis import get_redis
+
+# Priority classes of the upload API, as ranges of broker priorities (see PRIORITY_STEPS in
+# app/core/celery_app.py): 0 is the most urgent, so interactive uploads overtake a queued
+# bulk backlog at every stage of the pipeline.
+PRIORITY_CLASSES = {
+    # Class: (first priority, last priority)
+    "interactive": (0, 2),
+    "bulk": (5, 9),
+}
+
+
+class FairScheduler:
+    """
+    Assigns the broker priority of each extraction from its priority class and its owner's backlog.
+    - Every owner has a counter of extractions enqueued and not yet persisted
+    - Within a class, each FAIR_SHARE_BACKLOG documents an owner already has queued lower the
+      priority of its next ones by one step: a 5,000-document backfill sinks to the bottom of its
+      class while another owner's first documents start at the top
+    - Redis errors fall back to the first priority of the class so scheduling never fails an upload
+    """
+
+    KEY_PREFIX = "scheduling:backlog"
+
+    def __init__(self, url: str, fair_share_backlog: int, ttl_seconds: int):
+        self.url = url
+        self.fair_share_backlog = fair_share_backlog
+        self.ttl_seconds = ttl_seconds
+        self._client = None
+
+    @property
+    def client(self) -> redis.Redis:
+        if self._client is None:
+            self._client = get_redis(self.url)
+        return self._client
+
+    def make_key(self, owner_id: int) -> str:
+        return f"{self.KEY_PREFIX}:{owner_id}"
+
+    def priority(self, priority_class: str, position: int) -> int:
+        """
+        Priority of the document at `position` (0-based) in its owner's backlog.
+        """
+        first, last = PRIORITY_CLASSES[priority_class]
+        if not self.fair_share_backlog:
+            return first
+        return min(first + position // self.fair_share_backlog, last)
+
+    def schedule(self, owner_id: Optional[int], priority_class: str, count: int = 1) -> List[int]:
+        """
+        Adds `count` documents to the owner's backlog (one INCRBY) and returns their priorities.
+        Documents without an owner are not counted.
+        """
+        if owner_id is None or not self.fair_share_backlog or not count:
+            return [self.priority(priority_class, 0)] * count
+        key = self.make_key(owner_id)
+        try:
+            with self.client.pipeline(transaction=False) as pipe:
+                pipe.incrby(key, count)
+                # A backlog that is never released (lost messages) is forgotten after a while
+                pipe.expire(key, self.ttl_seconds)
+                backlog, _ = pipe.execute()
+        except redis.RedisError:
+            return [self.priority(priority_class, 0)] * count
+        start = backlog - count
+        return [self.priority(priority_class, start + index) for index in range(count)]
+
+    def release(self, owner_id: Optional[int], count: int = 1) -> None:
+        """
+        Removes persisted documents from the owner's backlog.
+        """
+        if owner_id is None or not self.fair_share_backlog:
+            return
+        try:
+            if self.client.decrby(self.make_key(owner_id), count) <= 0:
+                self.client.delete(self.make_key(owner_id))
+        except redis.RedisError:
+            pass
+
+
+fair_scheduler = FairScheduler(
+    url=settings.SCHEDULING_REDIS_URL or settings.REDIS_BACKEND_URL,
+    fair_share_backlog=settings.FAIR_SHARE_BACKLOG,
+    ttl_seconds=settings.FAIR_SHARE_BACKLOG_TTL_SECONDS,
+)
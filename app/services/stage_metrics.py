@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+# Timestamps recorded on each document as it goes through the pipeline, in order
+STAGE_TIMESTAMPS = ("enqueued_at", "started_at", "preprocessed_at", "inferred_at", "validated_at", "completed_at")
+
+# Stage durations, from consecutive timestamps. A stage includes the wait in its queue, except for
+# "queue_wait" which is the wait before preprocessing starts.
+STAGES = {
+    "queue_wait": ("enqueued_at", "started_at"),
+    "preprocess": ("started_at", "preprocessed_at"),
+    "inference": ("preprocessed_at", "inferred_at"),
+    "validation": ("inferred_at", "validated_at"),
+    "persist": ("validated_at", "completed_at"),
+    "total": ("enqueued_at", "completed_at"),
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def stage_durations(timestamps: Dict[str, Optional[datetime]]) -> Dict[str, float]:
+    """
+    Returns the duration (milliseconds) of each stage whose two timestamps are known.
+    """
+    durations = {}
+    for stage, (start, end) in STAGES.items():
+        if timestamps.get(start) is not None and timestamps.get(end) is not None:
+            durations[stage] = (timestamps[end] - timestamps[start]).total_seconds() * 1000
+    return durations
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """
+    Nearest-rank percentiles of a list of values.
+    """
+    ordered = sorted(values)
+    return {
+        f"p{point}": round(ordered[max(0, -(-point * len(ordered) // 100) - 1)], 1)
+        for point in PERCENTILES
+    }
+
+
+def latency_report(documents: Iterable[dict]) -> dict:
+    """
+    Aggregates stage latency percentiles, overall and per country, from documents given as
+    dicts of their stage timestamps plus "country_code".
+    """
+    overall: Dict[str, List[float]] = {}
+    by_country: Dict[str, Dict[str, List[float]]] = {}
+    count = 0
+    for document in documents:
+        count += 1
+        country = by_country.setdefault(document.get("country_code") or "unknown", {})
+        for stage, duration in stage_durations(document).items():
+            overall.setdefault(stage, []).append(duration)
+            country.setdefault(stage, []).append(duration)
+
+    def summarize(samples: Dict[str, List[float]]) -> dict:
+        return {
+            stage: {"count": len(samples[stage]), **percentiles(samples[stage])}
+            for stage in STAGES if stage in samples
+        }
+
+    return {
+        "documents": count,
+        "stages": summarize(overall),
+        "countries": {country: summarize(samples) for country, samples in sorted(by_country.items())},
+    }
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+
+from app.core.config import settings
+
+
+class BlobWriter:
+    """
+    Incremental writer returned by `BlobStore.writer()`.
+    Chunks are hashed as they are written; the blob key is known once the writer is closed,
+    and `created` tells whether the blob was new (identical content may already be stored).
+    """
+
+    def __init__(self, store: "BlobStore", tmp_file: BinaryIO):
+        self.store = store
+        self.size = 0
+        self.key: Optional[str] = None
+        self.created = False
+        self._tmp_file = tmp_file
+        self._sha256 = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        self._tmp_file.write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+
+    def __enter__(self) -> "BlobWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._tmp_file.close()
+        if exc_type is not None:
+            self.store._discard(self._tmp_file.name)
+            return
+        self.key = self._sha256.hexdigest()
+        self.created = not self.store.exists(self.key)
+        self.store._commit(self._tmp_file.name, self.key)
+
+
+class BlobStore(ABC):
+    """
+    Content-addressed storage for uploaded images.
+    Blob keys are the SHA-256 hex digest of the content, so identical uploads are stored once
+    and the key doubles as the extraction cache hash.
+    """
+
+    @abstractmethod
+    def writer(self) -> BlobWriter:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def _commit(self, tmp_name: str, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def _discard(self, tmp_name: str) -> None:
+        ...
+
+    def put(self, data: bytes) -> str:
+        with self.writer() as writer:
+            writer.write(data)
+        return writer.key
+
+    def get(self, key: str) -> bytes:
+        with self.open(key) as blob:
+            return blob.read()
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blob store backed by a local (or shared volume) directory.
+    Blobs are sharded as `<root>/ab/cd/abcd...` and written atomically through a temporary file.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._tmp_dir = os.path.join(root, "tmp")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def writer(self) -> BlobWriter:
+        os.makedirs(self._tmp_dir, exist_ok=True)
+        return BlobWriter(self, tempfile.NamedTemporaryFile(dir=self._tmp_dir, delete=False))
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self._path(key), "rb")
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _commit(self, tmp_name: str, key: str) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_name, path)
+
+    def _discard(self, tmp_name: str) -> None:
+        os.remove(tmp_name)
+
+
+def create_blob_store(backend: str, path: str) -> BlobStore:
+    if backend == "local":
+        return LocalBlobStore(path)
+    raise ValueError(f"Unsupported blob store backend: {backend}")
+
+
+blob_store = create_blob_store(settings.BLOB_STORE_BACKEND, settings.BLOB_STORE_PATH)
@@ -1,55 +1,171 @@
 import re
-from typing import Optional, Dict
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.services.ai.prompts import COUNTRY_SCHEMAS
+
+# Common regex patterns for validation, compiled once
+PATTERNS = {
+    "FR_NUM_IMMATRICULATION_NEW": re.compile(r"^[A-Z]{2}-\d{3}-[A-Z]{2}$"), # AB-123-CD
+    "FR_NUM_IMMATRICULATION_OLD": re.compile(r"^\d{1,4}\s[A-Z]{2}\s\d{2}$"), # 1234 AB 56
+    "TN_NUM_IMMATRICULATION": re.compile(r"^\d{1,3}\sTUN\s\d{1,4}$"), # 123 TUN 4567
+    "DATE": re.compile(r"^\d{4}-\d{2}-\d{2}$"), # YYYY-MM-DD
+    "EMAIL": re.compile(r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"),
+    "VIN": re.compile(r"^[A-HJ-NPR-Z0-9]{17}$"), # Standard VIN format
+    "POWER": re.compile(r"^\d+(\.\d+)?$"), # Numeric value for power/fiscal
+}
+
+# Fields an extraction must have, valid, to be trusted (cascade escalation, reprocessing)
+REQUIRED_FIELDS = {
+    "FR": ("numero_immatriculation", "date_premiere_immatriculation", "marque", "numero_identification",
+           "puissance_fiscale"),
+    "TN": ("numero_immatriculation", "date_premiere_mise_en_circulation", "marque", "numero_serie",
+           "puissance_fiscale"),
+}
+
+# Field name fragments of the numeric fields (power, masses, CO2, seats)
+NUMERIC_FIELD_FRAGMENTS = ("puissance", "cylindree", "masse", "ptac", "poids", "charge_utile", "co2", "nombre_places")
+
+
+class FieldRule:
+    """
+    Validation of one field: the value is normalized, then must match one of the patterns
+    (no pattern: any value is valid). Alternative patterns are merged into a single regex.
+    """
+
+    __slots__ = ("pattern", "normalize")
+
+    def __init__(self, patterns: Tuple[Pattern, ...] = (), normalize: Callable[[str], str] = str.strip):
+        self.pattern = re.compile("|".join(f"(?:{p.pattern})" for p in patterns)) if patterns else None
+        self.normalize = normalize
+
+    def is_valid(self, value: str) -> bool:
+        return self.pattern is None or self.pattern.match(self.normalize(value)) is not None
+
+
+def _upper(value: str) -> str:
+    return value.strip().upper()
+
+
+ANY_VALUE = FieldRule()
+
+
+def compile_field_rule(field_name: str, country_code: str) -> FieldRule:
+    """
+    Picks the rule of a field from its name, once per schema instead of on every value.
+    """
+    if field_name == "numero_immatriculation":
+        if country_code == "FR":
+            return FieldRule(
+                (PATTERNS["FR_NUM_IMMATRICULATION_NEW"], PATTERNS["FR_NUM_IMMATRICULATION_OLD"]), _upper
+            )
+        if country_code == "TN":
+            return FieldRule((PATTERNS["TN_NUM_IMMATRICULATION"],), _upper)
+        return ANY_VALUE
+    if "date" in field_name:
+        return FieldRule((PATTERNS["DATE"],))
+    if field_name in ("numero_identification", "numero_serie"): # VIN for FR / TN
+        return FieldRule((PATTERNS["VIN"],), _upper)
+    if any(fragment in field_name for fragment in NUMERIC_FIELD_FRAGMENTS):
+        return FieldRule((PATTERNS["POWER"],))
+    return ANY_VALUE
+
+
+def compile_rules(schema: Type[BaseModel], country_code: str) -> Dict[str, FieldRule]:
+    return {field: compile_field_rule(field, country_code) for field in schema.model_fields}
+
 
 class CarPlateValidator:
+    """
+    Validates extractions against a rule table compiled once per schema (CarPlateFR, CarPlateTN).
+    - Fields outside the schema (e.g. extra keys returned by the model) accept any value: the table
+      never grows with the keys a model may invent
+    - Results come verbose (value, validity and message per field) or compact (the list of
+      invalid fields, the values being in the raw extraction already)
+    """
+
     def __init__(self):
-        # Common regex patterns for validation
-        self.patterns = {
-            "FR_NUM_IMMATRICULATION_NEW": r"^[A-Z]{2}-\d{3}-[A-Z]{2}$", # AB-123-CD
-            "FR_NUM_IMMATRICULATION_OLD": r"^\d{1,4}\s[A-Z]{2}\s\d{2}$", # 1234 AB 56
-            "TN_NUM_IMMATRICULATION": r"^\d{1,3}\sTUN\s\d{1,4}$", # 123 TUN 4567
-            "DATE": r"^\d{4}-\d{2}-\d{2}$", # YYYY-MM-DD
-            "EMAIL": r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$",
-            "VIN": r"^[A-HJ-NPR-Z0-9]{17}$", # Standard VIN format
-            "POWER": r"^\d+(\.\d+)?$", # Numeric value for power/fiscal
+        self.rules: Dict[str, Dict[str, FieldRule]] = {
+            country_code: compile_rules(schema, country_code) for country_code, schema in COUNTRY_SCHEMAS.items()
         }
 
+    def rule(self, field_name: str, country_code: str) -> FieldRule:
+        return self.rules.get(country_code, {}).get(field_name, ANY_VALUE)
+
     def validate_field(self, field_name: str, value: Optional[str], country_code: str = "FR") -> bool:
         if value is None:
             return True # Allow None values, schema handles optionality
+        return self.rule(field_name, country_code).is_valid(value)
 
-        if field_name == "numero_immatriculation":
-            if country_code == "FR":
-                return re.match(self.patterns["FR_NUM_IMMATRICULATION_NEW"], value) is not None or \
-                       re.match(self.patterns["FR_NUM_IMMATRICULATION_OLD"], value) is not None
-            elif country_code == "TN":
-                return re.match(self.patterns["TN_NUM_IMMATRICULATION"], value) is not None
-        elif "date" in field_name:
-            return re.match(self.patterns["DATE"], value) is not None
-        elif field_name == "numero_identification": # VIN for FR
-            return re.match(self.patterns["VIN"], value) is not None
-        elif field_name == "numero_serie": # VIN for TN
-            return re.match(self.patterns["VIN"], value) is not None
-        elif "puissance" in field_name or "cylindree" in field_name or "masse" in field_name or \
-             "ptac" in field_name or "poids" in field_name or "charge_utile" in field_name or \
-             "co2" in field_name or "nombre_places" in field_name:
-            return re.match(self.patterns["POWER"], value) is not None
-
-        return True # If no specific pattern, consider valid
+    def invalid_fields(self, data: Dict, country_code: str = "FR") -> List[str]:
+        rules = self.rules.get(country_code, {})
+        invalid = []
+        for field, value in data.items():
+            if value is None:
+                continue
+            # `is_valid` inlined: this loop runs for every field of every document
+            rule = rules.get(field, ANY_VALUE)
+            if rule.pattern is not None and rule.pattern.match(rule.normalize(str(value))) is None:
+                invalid.append(field)
+        return invalid
+
+    def validate(self, data: Dict, country_code: str = "FR", compact: bool = False) -> Dict:
+        """
+        Validation results of an extraction, verbose or compact ({"invalid": [field, ...]}).
+        """
+        if compact:
+            return {"invalid": self.invalid_fields(data, country_code)}
+        rules = self.rules.get(country_code, {})
+        results = {}
+        for field, value in data.items():
+            rule = rules.get(field, ANY_VALUE)
+            is_valid = value is None or rule.pattern is None or rule.pattern.match(rule.normalize(str(value))) is not None
+            results[field] = {"value": value, "is_valid": is_valid, "message": "Valid" if is_valid else "Invalid format"}
+        return results
 
     def validate_car_plate_data(self, data: Dict, country_code: str = "FR") -> Dict:
         """
         Validates a dictionary of extracted car plate data against known patterns.
         Returns a dictionary with validation results for each field.
         """
-        validation_results = {}
-        for field, value in data.items():
-            is_valid = self.validate_field(field, str(value) if value is not None else None, country_code)
-            validation_results[field] = {
-                "value": value,
-                "is_valid": is_valid,
-                "message": "Valid" if is_valid else "Invalid format"
-            }
+        return self.validate(data, country_code)
+
+    def validate_many(self, extractions: Iterable[Dict], country_code: str = "FR", compact: bool = True) -> List[Dict]:
+        """
+        Validates many extractions of one country at once (e.g. revalidating stored documents).
+        """
+        return [self.validate(data, country_code, compact) for data in extractions]
+
+
+def field_result(value, is_valid: bool) -> Dict:
+    return {"value": value, "is_valid": is_valid, "message": "Valid" if is_valid else "Invalid format"}
+
+
+def expand_validation_results(validation_results: Dict, data: Dict) -> Dict:
+    """
+    Verbose validation results of an extraction, from either encoding.
+    """
+    if not isinstance(validation_results.get("invalid"), list):
         return validation_results
+    invalid = set(validation_results["invalid"])
+    return {field: field_result(value, field not in invalid) for field, value in data.items()}
+
+
+def expand_extracted_data(extracted_data: Optional[Dict]) -> Optional[Dict]:
+    """
+    Extracted data as returned by the API: compact validation results (VALIDATION_RESULTS_FORMAT)
+    are expanded from the raw extraction, so clients always get the verbose encoding.
+    """
+    if not extracted_data or not isinstance(extracted_data.get("validation_results"), dict):
+        return extracted_data
+    validation_results = expand_validation_results(
+        extracted_data["validation_results"], extracted_data.get("raw_extraction") or {}
+    )
+    if validation_results is extracted_data["validation_results"]:
+        return extracted_data
+    # A copy: the stored (ORM) value is left untouched
+    return {**extracted_data, "validation_results": validation_results}
+
 
 car_plate_validator = CarPlateValidator()
@@ -0,0 +1,21 @@
+"""
+Starts a Celery worker with the execution profile selected by CELERY_WORKER_PROFILE.
+
+    python -m app.worker [extra `celery worker` options, e.g. -l info]
+"""
+import sys
+
+from celery.__main__ import main
+
+from app.core.config import settings
+from app.core.worker_profiles import get_worker_profile, worker_command_line
+
+if __name__ == "__main__":
+    profile = get_worker_profile(
+        settings.CELERY_WORKER_PROFILE,
+        concurrency=settings.CELERY_WORKER_CONCURRENCY,
+        prefetch_multiplier=settings.CELERY_WORKER_PREFETCH_MULTIPLIER,
+        queues=settings.CELERY_WORKER_QUEUES,
+    )
+    sys.argv = ["celery", "-A", "app.core.celery_app", "worker", *worker_command_line(profile), *sys.argv[1:]]
+    main()
@@ -0,0 +1,63 @@
+import os
+import time
+
+from celery.signals import task_postrun, task_prerun, worker_init, worker_process_shutdown
+from prometheus_client import multiprocess, start_http_server
+
+from app.core.config import settings
+from app.core.metrics import TASK_DURATION, TASK_OUTCOMES, get_registry
+from app.services.ai.prompts import COUNTRY_PROMPTS
+
+# Task metrics are collected from Celery signals, so tasks stay free of instrumentation code.
+_task_started_at = {}
+
+
+def task_country_code(args: tuple, kwargs: dict) -> str:
+    """
+    Country code of a task, for the metric labels: the `country_code` argument or the one of the
+    stage payload. Unknown codes are grouped to keep the label cardinality bounded.
+    """
+    country_code = kwargs.get("country_code")
+    if country_code is None:
+        payload = next((arg for arg in args if isinstance(arg, dict)), {})
+        country_code = payload.get("country_code")
+    if country_code is None and len(args) >= 3:
+        country_code = args[2]  # preprocess_document(document_id, blob_key, country_code)
+    if country_code is None:
+        return "none"
+    return country_code if country_code in COUNTRY_PROMPTS else "other"
+
+
+def task_outcome(state: str, retval) -> str:
+    if state != "SUCCESS":
+        return "error"
+    if isinstance(retval, dict) and ("error" in retval or retval.get("status") == "failed"):
+        return "failed"
+    return "ok"
+
+
+@task_prerun.connect
+def on_task_prerun(task_id=None, **kwargs):
+    _task_started_at[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def on_task_postrun(task_id=None, task=None, args=None, kwargs=None, retval=None, state=None, **extra):
+    started_at = _task_started_at.pop(task_id, None)
+    country_code = task_country_code(args or (), kwargs or {})
+    if started_at is not None:
+        TASK_DURATION.labels(task.name, country_code).observe(time.perf_counter() - started_at)
+    TASK_OUTCOMES.labels(task.name, country_code, task_outcome(state, retval)).inc()
+
+
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    # Sidecar HTTP port of the worker, served by the main process (WORKER_METRICS_PORT=0 disables it)
+    if settings.WORKER_METRICS_PORT:
+        start_http_server(settings.WORKER_METRICS_PORT, registry=get_registry())
+
+
+@worker_process_shutdown.connect
+def mark_process_dead(pid=None, **kwargs):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,211 @@
+"""
+Brings stored documents up to date after a validation rule or a prompt changed.
+
+- "validate": re-runs the validation on the stored raw extraction
+- "extract": also re-runs the extraction of documents that need it (failed, extracted with an
+  older prompt, or missing/invalid required fields) with the backend they were extracted with,
+  at a capped rate to protect the model quota
+
+Documents are read in keyset-paginated chunks (id > last id, one LIMIT query each) and written
+back with one batched UPDATE per chunk. Each chunk gets its own short session, closed before its
+re-extractions are enqueued: no transaction stays open while the rate limiter waits. The last id
+of each committed chunk is checkpointed in Redis, so an interrupted job resumes where it stopped.
+
+    python -m app.worker.reprocess --job-id rules-2026-10 --mode validate
+    python -m app.worker.reprocess --job-id prompt-v2 --mode extract --country-code FR --rate 2 --enqueue
+"""
+import argparse
+import json
+from typing import Iterator, List, Optional
+
+import redis
+from sqlalchemy import select, update
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.database import SessionLocal
+from app.models.document import Document
+from app.services.ai.prompts import PROMPT_VERSION
+from app.services.ai.rate_limit import TokenBucket
+from app.services.scheduling import fair_scheduler
+from app.services.validation import REQUIRED_FIELDS, car_plate_validator
+from app.worker.tasks import extraction_pipeline
+
+MODES = ("validate", "extract")
+
+
+class ReprocessCheckpoints:
+    """
+    Progress of reprocessing jobs in Redis: last processed id and counters, per job id.
+    """
+
+    KEY_PREFIX = "reprocess"
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+
+    def load(self, job_id: str) -> dict:
+        checkpoint = self.client.get(f"{self.KEY_PREFIX}:{job_id}")
+        if checkpoint is None:
+            return {"last_id": 0, "processed": 0, "revalidated": 0, "reextracted": 0, "skipped": 0}
+        return json.loads(checkpoint)
+
+    def save(self, job_id: str, checkpoint: dict) -> None:
+        self.client.set(f"{self.KEY_PREFIX}:{job_id}", json.dumps(checkpoint))
+
+    def clear(self, job_id: str) -> None:
+        self.client.delete(f"{self.KEY_PREFIX}:{job_id}")
+
+
+def iter_chunks(session_factory, after_id: int, chunk_size: int, country_code: Optional[str] = None) -> Iterator[list]:
+    """
+    Yields the final documents (completed or failed) after `after_id`, by chunks of ids in order.
+    Each chunk is read in its own session, closed before the chunk is yielded.
+    Each chunk is one keyset query fetched whole: memory stays bounded by the chunk size
+    whatever the table size, and no OFFSET scan is needed.
+    """
+    while True:
+        query = (
+            select(Document.id, Document.status, Document.country_code, Document.extracted_data, Document.blob_key,
+                   Document.owner_id)
+            .where(Document.id > after_id, Document.status.in_(("completed", "failed")))
+            .order_by(Document.id)
+            .limit(chunk_size)
+        )
+        if country_code:
+            query = query.where(Document.country_code == country_code)
+        with session_factory() as db:
+            chunk = db.execute(query).all()
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1].id
+
+
+def needs_extraction(document, invalid: List[str]) -> bool:
+    """
+    Whether a document's extraction is worth re-running (and paying for).
+    """
+    extracted_data = document.extracted_data or {}
+    if document.status == "failed" or "raw_extraction" not in extracted_data:
+        return True
+    if extracted_data.get("prompt_version") != PROMPT_VERSION:
+        return True
+    raw_extraction = extracted_data["raw_extraction"]
+    required = REQUIRED_FIELDS.get(document.country_code or "FR", ())
+    return any(field in invalid or raw_extraction.get(field) is None for field in required)
+
+
+def run_reprocess_job(
+    job_id: str,
+    mode: str = "validate",
+    country_code: Optional[str] = None,
+    chunk_size: int = 500,
+    rate: float = 1.0,
+    max_documents: Optional[int] = None,
+    checkpoints: Optional[ReprocessCheckpoints] = None,
+    session_factory=SessionLocal,
+) -> dict:
+    """
+    Runs (or resumes) a reprocessing job and returns its checkpoint.
+    Extractions are re-run through the normal pipeline in the bulk lane, enqueued at most `rate` per second.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown reprocess mode: {mode}. Available: {', '.join(MODES)}")
+    checkpoints = checkpoints or ReprocessCheckpoints(get_redis(settings.REDIS_BACKEND_URL))
+    checkpoint = checkpoints.load(job_id)
+    rate_limiter = TokenBucket(rate, 1)
+    compact = settings.VALIDATION_RESULTS_FORMAT == "compact"
+
+    for chunk in iter_chunks(session_factory, checkpoint["last_id"], chunk_size, country_code):
+        if max_documents is not None and checkpoint["processed"] >= max_documents:
+            break
+        revalidated, reextract = [], []
+        for document in chunk:
+            extracted_data = document.extracted_data or {}
+            raw_extraction = extracted_data.get("raw_extraction")
+            document_country = document.country_code or "FR"
+            invalid = car_plate_validator.invalid_fields(raw_extraction, document_country) if raw_extraction else []
+
+            if mode == "extract" and needs_extraction(document, invalid):
+                if document.blob_key:
+                    reextract.append(document)
+                else:
+                    checkpoint["skipped"] += 1 # Uploaded before blob keys were recorded
+                continue
+            if raw_extraction is None:
+                continue
+            validation_results = car_plate_validator.validate(raw_extraction, document_country, compact=compact)
+            if validation_results != extracted_data.get("validation_results"):
+                revalidated.append({
+                    "id": document.id,
+                    "extracted_data": {**extracted_data, "validation_results": validation_results},
+                })
+
+        # One batched UPDATE for the chunk (executemany by primary key), committed before enqueuing
+        if revalidated:
+            with session_factory() as db:
+                db.execute(update(Document), revalidated)
+                db.commit()
+
+        # Documents keep their current result until the new extraction is persisted; the cache
+        # is bypassed to force it. A chunk interrupted here is enqueued again on resume. The recorded
+        # backend is kept (failed documents without one get the configured backend).
+        for document in reextract:
+            rate_limiter.acquire()
+            [priority] = fair_scheduler.schedule(document.owner_id, "bulk")
+            extraction_pipeline(
+                document.id, document.blob_key, document.country_code or "FR",
+                (document.extracted_data or {}).get("backend"), use_cache=False,
+                priority_class="bulk", owner_id=document.owner_id, priority=priority,
+            ).apply_async()
+
+        checkpoint["last_id"] = chunk[-1].id
+        checkpoint["processed"] += len(chunk)
+        checkpoint["revalidated"] += len(revalidated)
+        checkpoint["reextracted"] += len(reextract)
+        checkpoints.save(job_id, checkpoint)
+
+    return checkpoint
+
+
+@celery_app.task(name="reprocess_documents")
+def reprocess_documents(job_id: str, mode: str = "validate", country_code: Optional[str] = None,
+                        chunk_size: int = settings.REPROCESS_CHUNK_SIZE,
+                        rate: float = settings.REPROCESS_EXTRACTIONS_PER_SECOND,
+                        max_documents: Optional[int] = None) -> dict:
+    # A job cut by the task time limit is resumed from its checkpoint by enqueuing it again
+    checkpoint = run_reprocess_job(job_id, mode, country_code, chunk_size, rate, max_documents)
+    return {"status": "completed", "job_id": job_id, **checkpoint}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--job-id", required=True, help="Checkpoint name; reusing it resumes the job")
+    parser.add_argument("--mode", choices=MODES, default="validate")
+    parser.add_argument("--country-code", help="Only reprocess the documents of this country")
+    parser.add_argument("--chunk-size", type=int, default=settings.REPROCESS_CHUNK_SIZE)
+    parser.add_argument("--rate", type=float, default=settings.REPROCESS_EXTRACTIONS_PER_SECOND,
+                        help="Re-extractions enqueued per second (0: no limit)")
+    parser.add_argument("--max-documents", type=int, help="Stop after this many documents (resumable)")
+    parser.add_argument("--restart", action="store_true", help="Forget the checkpoint of the job first")
+    parser.add_argument("--enqueue", action="store_true", help="Run the job on a worker instead of here")
+    args = parser.parse_args()
+
+    if args.restart:
+        ReprocessCheckpoints(get_redis(settings.REDIS_BACKEND_URL)).clear(args.job_id)
+    if args.enqueue:
+        result = reprocess_documents.delay(
+            args.job_id, args.mode, args.country_code, args.chunk_size, args.rate, args.max_documents
+        )
+        print(f"Enqueued reprocess job {args.job_id} (task {result.id})")
+        return
+    checkpoint = run_reprocess_job(
+        args.job_id, args.mode, args.country_code, args.chunk_size, args.rate, args.max_documents
+    )
+    print(json.dumps(checkpoint))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,441 @@
+import base64
+import re
+import socket
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import httpx
+from celery import chain, group
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
 from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.core.metrics import IMAGE_BYTES, QUEUE_WAIT
 from app.database import SessionLocal
-from app.models.document import Document
-from app.models.user import User
-from app.services.ai.mistral_client import mistral_client
-from app.services.ai.prompts import COUNTRY_PROMPTS
+from app.models.document import Document, key_field_values
+from app.models.user import User  # noqa: F401  Registers the users table (documents.owner_id foreign key)
+from app.services.ai.backends import get_extraction_backend, resolve_backend_name
+from app.services.ai.prompts import PROMPT_VERSION
 from app.services.image_processing import preprocess_image
+from app.services.pages import multipage_format, split_pages
 from app.services.validation import car_plate_validator
+from app.services.cache import extraction_cache, inflight_extractions
+from app.services.scheduling import fair_scheduler
+from app.services.storage import blob_store
+from app.services.notifications import UnsafeCallbackURLError, publish_status, send_webhook, status_event
+from app.worker import metrics  # noqa: F401  Registers the task metrics signal handlers
 
-import base64
+# The extraction runs as a chain of stages, each routed to its own queue (see celery_app.task_routes)
+# so that CPU-bound preprocessing and network-bound inference can be scaled independently.
+# Stages hand a payload dict to the next one; once it carries an "error" or an "extracted_data"
+# the remaining stages pass it through and `persist_document` writes the outcome.
 
-@celery_app.task(name="process_image_for_extraction")
-def process_image_for_extraction(document_id: int, image_base64: str, country_code: str):
+
+def extraction_pipeline(document_id: int, blob_key: str, country_code: str, backend: Optional[str] = None,
+                        use_cache: bool = True, priority_class: str = "interactive", owner_id: Optional[int] = None,
+                        priority: int = 0):
+    """
+    Returns the signature of the staged extraction of one document.
+    `backend` is the extraction backend, resolved from the settings when not given;
+    reprocessing skips the cache lookup (`use_cache=False`) to force a new extraction.
+    Every stage is sent with the broker `priority` given by the fair scheduler; documents scheduled
+    for an `owner_id` are released from its backlog once persisted.
+    """
+    return chain(
+        preprocess_document.s(
+            document_id, blob_key, country_code, enqueued_at=time.time(), backend=backend, use_cache=use_cache,
+            priority_class=priority_class, owner_id=owner_id,
+        ).set(priority=priority),
+        infer_document.s().set(priority=priority),
+        persist_document.s().set(priority=priority),
+    )
+
+
+def _is_done(payload: dict) -> bool:
+    return "error" in payload or "extracted_data" in payload
+
+
+def _record(payload: dict, timestamp: str) -> None:
+    # Stage timestamps travel with the payload and are written with the outcome, in a single UPDATE
+    payload.setdefault("timings", {})[timestamp] = time.time()
+
+
+def _observe_queue_wait(payload: dict, stage: str, queued_at: Optional[float]) -> None:
+    # Wait between the end of the previous stage (or the upload) and the start of this one
+    if queued_at is not None:
+        priority_class = payload.get("priority_class", "interactive")
+        QUEUE_WAIT.labels(stage, priority_class).observe(max(0.0, time.time() - queued_at))
+
+
+def notify_status(document_id: int, status: str, extracted_data: dict = None, callback_url: str = None) -> None:
+    """
+    Publishes a status transition to the event streams and schedules the webhook of the upload.
+    """
+    publish_status(document_id, status, extracted_data)
+    if callback_url and status in ("completed", "failed"):
+        deliver_webhook.delay(callback_url, status_event(document_id, status, extracted_data))
+
+
+def mark_processing(document_id: int) -> None:
+    """
+    Moves a pending document to "processing" (one UPDATE, no SELECT).
+    Best effort: the status is informational and the outcome is written by `persist_document`.
+    """
+    db = SessionLocal()
+    try:
+        db.execute(
+            update(Document)
+            .where(Document.id == document_id, Document.status == "pending")
+            .values(status="processing")
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+    finally:
+        db.close()
+
+
+def _update_document(document_id: int, values: dict):
+    return (
+        update(Document)
+        .where(Document.id == document_id)
+        .values(**values)
+        .returning(Document.callback_url)
+        .execution_options(synchronize_session=False)
+    )
+
+
+@celery_app.task(name="preprocess_document")
+def preprocess_document(document_id: int, blob_key: str, country_code: str, enqueued_at: Optional[float] = None,
+                        backend: Optional[str] = None, use_cache: bool = True, priority_class: str = "interactive",
+                        owner_id: Optional[int] = None) -> dict:
+    payload = {"document_id": document_id, "blob_key": blob_key, "country_code": country_code,
+               "priority_class": priority_class, "owner_id": owner_id, "timings": {"enqueued_at": enqueued_at}}
+    _observe_queue_wait(payload, "preprocess", enqueued_at)
+    try:
+        payload["backend"] = resolve_backend_name(backend, country_code)
+    except ValueError as e:
+        payload["error"] = str(e)
+        return payload
+    _record(payload, "started_at")
+    mark_processing(document_id)
+    publish_status(document_id, "processing")
+
+    # A duplicate of this image may have completed since the upload was enqueued
+    # (blob keys are the SHA-256 of the content, i.e. the cache hash)
+    cached_extraction = extraction_cache.get(blob_key, country_code, payload["backend"]) if use_cache else None
+    if cached_extraction is not None:
+        payload["extracted_data"] = cached_extraction
+        payload["cached"] = True
+        return payload
+
+    # 1. Pre-process image; the result goes back to the blob store, not through the broker
+    try:
+        image_data = blob_store.get(blob_key)
+        processed_image = preprocess_image(image_data)
+        IMAGE_BYTES.labels("input").observe(len(image_data))
+        IMAGE_BYTES.labels("output").observe(len(processed_image))
+        payload["processed_key"] = blob_store.put(processed_image)
+        _record(payload, "preprocessed_at")
+    except Exception as e:
+        payload["error"] = f"Image preprocessing failed: {str(e)}"
+    return payload
+
+
+@celery_app.task(name="infer_document")
+def infer_document(payload: dict) -> dict:
+    if _is_done(payload):
+        return payload
+    _observe_queue_wait(payload, "inference", payload["timings"].get("preprocessed_at"))
+
+    # 2. Extract the fields with the backend of the document (Mistral, local OCR or stub)
+    backend = get_extraction_backend(payload["backend"], payload["country_code"])
+    try:
+        payload["raw_extraction"] = backend.extract(read_processed_image(payload), payload["country_code"])
+        _record(payload, "inferred_at")
+    except Exception as e:
+        payload["error"] = f"Extraction failed ({backend.name}): {str(e)}"
+    finally:
+        # The preprocessed image is only an intermediate: it is not kept in the blob store
+        # (unless it is byte for byte the upload, which reprocessing needs)
+        if payload["processed_key"] != payload["blob_key"]:
+            blob_store.delete(payload["processed_key"])
+    return payload
+
+
+def read_processed_image(payload: dict) -> bytes:
+    # Identical uploads share their preprocessed blob (content-addressed), which the first one
+    # to be inferred deletes: the others preprocess their image again
+    try:
+        return blob_store.get(payload["processed_key"])
+    except FileNotFoundError:
+        return preprocess_image(blob_store.get(payload["blob_key"]))
+
+
+# Columns copied to the followers of an extraction; their stage timestamps stay empty
+FOLLOWER_COLUMNS = ("status", "extracted_data", "plate_number", "vin", "completed_at")
+
+
+def complete_followers(db: Session, payload: dict, values: dict) -> None:
+    """
+    Gives the outcome of an extraction to the identical uploads that waited for it (see InflightExtractions),
+    with one UPDATE for all of them.
+    """
+    if "backend" not in payload:
+        return  # Failed before its backend was known: it cannot have been joined
+    followers = inflight_extractions.finish(
+        payload["blob_key"], payload["country_code"], payload["backend"], payload["document_id"]
+    )
+    if not followers:
+        return
+    outcome = {key: value for key, value in values.items() if key in FOLLOWER_COLUMNS}
+    documents = db.execute(
+        update(Document)
+        .where(Document.id.in_(followers), Document.status.in_(("pending", "processing")))
+        .values(**outcome)
+        .returning(Document.id, Document.callback_url)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+    for document in documents:
+        notify_status(document.id, outcome["status"], outcome["extracted_data"], document.callback_url)
+
+
+def schedule_follower_check(document_id: int, blob_key: str, country_code: str, backend: str,
+                            priority_class: str = "interactive", owner_id: Optional[int] = None) -> None:
+    check_follower.apply_async(
+        (document_id, blob_key, country_code, backend, priority_class, owner_id),
+        countdown=settings.INFLIGHT_FOLLOWER_CHECK_SECONDS,
+    )
+
+
+@celery_app.task(name="check_follower")
+def check_follower(document_id: int, blob_key: str, country_code: str, backend: str,
+                   priority_class: str = "interactive", owner_id: Optional[int] = None) -> dict:
+    """
+    Safety net of an upload waiting for an identical extraction (see InflightExtractions), run
+    INFLIGHT_FOLLOWER_CHECK_SECONDS after it joined and again for as long as it waits:
+    - its leader is final but did not hand it over (e.g. its worker died after persisting):
+      the follower gets the leader's outcome from the database
+    - its leader is gone (entry expired, extraction lost): the follower joins again, leading
+      its own extraction unless an identical one started meanwhile
+    """
     db = SessionLocal()
-    document = None  # Initialize document to None
     try:
-        document = db.query(Document).filter(Document.id == document_id).first()
-        if not document:
+        if db.scalar(select(Document.status).where(Document.id == document_id)) != "pending":
+            return {"status": "done", "document_id": document_id}
+        leader_id = inflight_extractions.leader(blob_key, country_code, backend)
+        if leader_id == document_id:
+            # Took over in an earlier check: its own extraction is queued
+            return {"status": "leading", "document_id": document_id}
+        if leader_id is not None:
+            leader = db.execute(
+                select(*(getattr(Document, column) for column in FOLLOWER_COLUMNS)).where(Document.id == leader_id)
+            ).mappings().first()
+            if leader is not None and leader["status"] in ("pending", "processing"):
+                schedule_follower_check(document_id, blob_key, country_code, backend, priority_class, owner_id)
+                return {"status": "waiting", "document_id": document_id, "leader_id": leader_id}
+            if leader is not None:
+                outcome = dict(leader)
+                document = db.execute(
+                    update(Document)
+                    .where(Document.id == document_id, Document.status == "pending")
+                    .values(**outcome)
+                    .returning(Document.callback_url)
+                    .execution_options(synchronize_session=False)
+                ).first()
+                db.commit()
+                if document is not None:
+                    notify_status(document_id, outcome["status"], outcome["extracted_data"], document.callback_url)
+                return {"status": outcome["status"], "document_id": document_id, "leader_id": leader_id}
+    finally:
+        db.close()
+
+    # The leader is gone (or its row is): join again
+    leader_id = inflight_extractions.join(blob_key, country_code, backend, document_id)
+    if leader_id is not None:
+        schedule_follower_check(document_id, blob_key, country_code, backend, priority_class, owner_id)
+        return {"status": "waiting", "document_id": document_id, "leader_id": leader_id}
+    [priority] = fair_scheduler.schedule(owner_id, priority_class)
+    extraction_pipeline(document_id, blob_key, country_code, backend, priority_class=priority_class,
+                        owner_id=owner_id, priority=priority).apply_async()
+    return {"status": "enqueued", "document_id": document_id}
+
+
+@celery_app.task(name="persist_document")
+def persist_document(payload: dict) -> dict:
+    document_id = payload["document_id"]
+    _observe_queue_wait(payload, "persist", max(filter(None, payload["timings"].values()), default=None))
+
+    # 3. Validate extracted data
+    if not _is_done(payload):
+        payload["extracted_data"] = {
+            "backend": payload["backend"],
+            "prompt_version": PROMPT_VERSION,
+            "raw_extraction": payload["raw_extraction"],
+            "validation_results": car_plate_validator.validate(
+                payload["raw_extraction"], payload["country_code"],
+                compact=settings.VALIDATION_RESULTS_FORMAT == "compact",
+            ),
+        }
+        _record(payload, "validated_at")
+
+    _record(payload, "completed_at")
+    values = {
+        timestamp: datetime.fromtimestamp(value, timezone.utc)
+        for timestamp, value in payload["timings"].items() if value is not None
+    }
+    if "error" in payload:
+        values.update(status="failed", extracted_data={"error": payload["error"]})
+    else:
+        values.update(status="completed", extracted_data=payload["extracted_data"],
+                      **key_field_values(payload["extracted_data"]))
+
+    db = SessionLocal()
+    try:
+        # A single UPDATE ... RETURNING: the row (and its previous extracted_data) is never loaded
+        document = db.execute(_update_document(document_id, values)).first()
+        if document is None:
             # Log error or handle missing document
+            complete_followers(db, payload, values)
             return {"status": "failed", "message": f"Document with ID {document_id} not found."}
+        db.commit()
 
-        # 1. Pre-process image
-        try:
-            # Decode the base64 string to get the raw image bytes
-            image_data = base64.b64decode(image_base64)
-            processed_image_base64 = preprocess_image(image_data)
-        except Exception as e:
-            document.status = "failed"
-            document.extracted_data = {"error": f"Image preprocessing failed: {str(e)}"}
-            db.commit()
-            return {"status": "failed", "message": f"Image preprocessing failed: {str(e)}"}
+        notify_status(document_id, values["status"], values["extracted_data"], document.callback_url)
+        # Cached before the followers are released, so that later duplicates hit the cache
+        if "error" not in payload and not payload.get("cached"):
+            extraction_cache.set(payload["blob_key"], payload["country_code"], payload["backend"], payload["extracted_data"])
+        complete_followers(db, payload, values)
+        if "error" in payload:
+            return {"status": "failed", "message": payload["error"]}
+        return {"status": "completed", "document_id": document_id, "cached": payload.get("cached", False)}
+    except Exception as e:
+        db.rollback()
+        extracted_data = {"error": f"An unexpected error occurred: {str(e)}"}
+        values = {"status": "failed", "extracted_data": extracted_data}
+        document = db.execute(_update_document(document_id, values)).first()
+        db.commit()
+        if document is not None:
+            notify_status(document_id, "failed", extracted_data, document.callback_url)
+        complete_followers(db, payload, values)
+        return {"status": "failed", "message": f"An unexpected error occurred: {str(e)}"}
+    finally:
+        db.close()
+        fair_scheduler.release(payload.get("owner_id"))
 
-        # 2. Get AI prompt based on country
-        prompt = COUNTRY_PROMPTS.get(country_code)
-        if not prompt:
-            document.status = "failed"
-            document.extracted_data = {"error": f"No prompt found for country code: {country_code}"}
-            db.commit()
-            return {"status": "failed", "message": f"No prompt found for country code: {country_code}"}
 
-        # 3. Call Mistral AI for extraction
+def unit_filename(filename: str, first_page: int, last_page: int) -> str:
+    # "scan.pdf#page=3", or "scan.pdf#page=3-4" for a recto/verso unit
+    pages = f"{first_page}-{last_page}" if last_page > first_page else str(first_page)
+    return f"{filename}#page={pages}"
+
+
+@celery_app.task(name="split_document")
+def split_document(document_id: int, blob_key: str, country_code: str, backend: Optional[str] = None,
+                   pages_per_document: int = 1, priority_class: str = "interactive", priority: int = 0) -> dict:
+    """
+    Splits a PDF or multi-frame TIFF upload into one document per page (or per group of
+    `pages_per_document` pages, e.g. recto/verso) and fans their extractions out to the workers.
+    The uploaded document becomes the first unit; the others are added to its batch and
+    to its owner's backlog.
+    """
+    db = SessionLocal()
+    try:
+        document = db.execute(
+            select(Document.filename, Document.owner_id, Document.batch_id, Document.callback_url)
+            .where(Document.id == document_id)
+        ).first()
+        if document is None:
+            return {"status": "failed", "message": f"Document with ID {document_id} not found."}
+
+        # 1. Rasterize the units one at a time into the blob store; only their keys are kept
         try:
-            extracted_data = mistral_client.extract_car_plate_data(processed_image_base64, prompt)
+            with blob_store.open(blob_key) as stream:
+                document_format = multipage_format(stream.read(8))
+                stream.seek(0)
+                units = [
+                    (unit_filename(document.filename, first_page, last_page), blob_store.put(unit))
+                    for first_page, last_page, unit in split_pages(stream, document_format, pages_per_document)
+                ]
+            if not units:
+                raise ValueError("The document has no page.")
         except Exception as e:
-            document.status = "failed"
-            document.extracted_data = {"error": f"AI extraction failed: {str(e)}"}
+            extracted_data = {"error": f"Document splitting failed: {str(e)}"}
+            db.execute(_update_document(document_id, {"status": "failed", "extracted_data": extracted_data}))
             db.commit()
-            return {"status": "failed", "message": f"AI extraction failed: {str(e)}"}
+            notify_status(document_id, "failed", extracted_data, document.callback_url)
+            fair_scheduler.release(document.owner_id)
+            return {"status": "failed", "message": extracted_data["error"]}
 
-        # 4. Validate extracted data
-        validation_results = car_plate_validator.validate_car_plate_data(extracted_data, country_code)
-
-        document.extracted_data = {
-            "raw_extraction": extracted_data,
-            "validation_results": validation_results
-        }
-        document.status = "completed"
+        # 2. One row per unit: the uploaded document is updated, the others inserted at once
+        (filename, unit_key), other_units = units[0], units[1:]
+        db.execute(update(Document).where(Document.id == document_id).values(filename=filename, blob_key=unit_key))
+        rows = [
+            {"filename": filename, "owner_id": document.owner_id, "batch_id": document.batch_id,
+             "callback_url": document.callback_url, "country_code": country_code, "status": "pending",
+             "blob_key": unit_key}
+            for filename, unit_key in other_units
+        ]
+        document_ids = [document_id]
+        if rows:
+            document_ids += db.scalars(insert(Document).returning(Document.id, sort_by_parameter_order=True), rows).all()
         db.commit()
-        return {"status": "completed", "document_id": document.id}
-    except Exception as e:
-        if document:
-            document.status = "failed"
-            document.extracted_data = {"error": f"An unexpected error occurred: {str(e)}"}
-            db.commit()
-        return {"status": "failed", "message": f"An unexpected error occurred: {str(e)}"}
     finally:
         db.close()
+
+    # 3. The units are extracted in parallel, like the images of a batch; the first one keeps the
+    # priority (and backlog slot) of the upload
+    priorities = [priority] + fair_scheduler.schedule(document.owner_id, priority_class, len(other_units))
+    group(
+        extraction_pipeline(unit_id, unit_key, country_code, backend, priority_class=priority_class,
+                            owner_id=document.owner_id, priority=unit_priority)
+        for unit_id, (_, unit_key), unit_priority in zip(document_ids, units, priorities)
+    ).apply_async()
+    return {"status": "split", "document_id": document_id, "documents": document_ids}
+
+
+@celery_app.task(
+    name="deliver_webhook",
+    autoretry_for=(httpx.TransportError, httpx.HTTPStatusError, socket.gaierror),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    max_retries=settings.WEBHOOK_MAX_RETRIES,
+)
+def deliver_webhook(callback_url: str, event: dict) -> dict:
+    try:
+        response = send_webhook(callback_url, event)
+    except UnsafeCallbackURLError:
+        # The host now resolves to an internal address: never called nor retried
+        return {"status": "blocked", "document_id": event["document_id"], "status_code": None}
+    # Server errors and rate limiting are retried with backoff; other client errors are final
+    if response.status_code >= 500 or response.status_code == 429:
+        response.raise_for_status()
+    return {
+        "status": "delivered" if response.is_success else "rejected",
+        "document_id": event["document_id"],
+        "status_code": response.status_code,
+    }
+
+
+BLOB_KEY_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+@celery_app.task(name="process_image_for_extraction")
+def process_image_for_extraction(document_id: int, image: str, country_code: str):
+    """
+    Messages enqueued before the pipeline was split into stages are dispatched to it. Their image
+    is a blob key, or the base64 image itself for messages older than the blob store: it is stored
+    (and recorded on the document, for reprocessing) so that only its key goes back through the broker.
+    """
+    blob_key = image
+    if not (BLOB_KEY_PATTERN.fullmatch(image) and blob_store.exists(image)):
+        blob_key = blob_store.put(base64.b64decode(image))
+        db = SessionLocal()
+        try:
+            db.execute(update(Document).where(Document.id == document_id).values(blob_key=blob_key))
+            db.commit()
+        finally:
+            db.close()
+    extraction_pipeline(document_id, blob_key, country_code).apply_async()
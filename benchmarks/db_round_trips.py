@@ -0,0 +1,139 @@
+"""
+Database round-trips of the two hot paths, before and after the Core rewrite:
+- persisting an outcome in the worker: ORM load of the document then flush, against a single
+  UPDATE ... RETURNING
+- polling /task-status/: the full row against the status-only projection (`include_data=false`),
+  with the size of the JSON response
+
+Runs on a temporary SQLite database by default, or on --database-url (its documents table is used
+as is, rows are added and removed).
+
+    DATABASE_URL=sqlite:///./bench.db MISTRAL_API_KEY=stub SECRET_KEY=stub REDIS_BROKER_URL=redis:// \\
+        REDIS_BACKEND_URL=redis:// python -m benchmarks.db_round_trips --documents 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, event
+
+from app.database import (
+    Base, get_async_database_url, get_async_engine, get_async_session_local, get_engine, get_session_local,
+)
+from app.models import document as _document, user as _user  # noqa: F401  Registers the tables
+from app.models.document import Document, key_field_values
+from app.schemas.common import Document as DocumentSchema, User as UserSchema
+from app.services.ai.backends import STUB_EXTRACTIONS
+from app.services.validation import car_plate_validator
+from app.worker.tasks import _update_document
+from app.api.v1.endpoints.extraction import get_extraction_task_status
+
+EXTRACTED_DATA = {
+    "backend": "mistral",
+    "raw_extraction": STUB_EXTRACTIONS["FR"],
+    "validation_results": car_plate_validator.validate(STUB_EXTRACTIONS["FR"], "FR"),
+}
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def legacy_persist(session_local, document_id: int, values: dict) -> str:
+    # Previous implementation: load the whole row, then flush the changed attributes
+    db = session_local()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        callback_url = document.callback_url
+        for column, value in values.items():
+            setattr(document, column, value)
+        db.commit()
+        return callback_url
+    finally:
+        db.close()
+
+
+def core_persist(session_local, document_id: int, values: dict) -> str:
+    db = session_local()
+    try:
+        document = db.execute(_update_document(document_id, values)).first()
+        db.commit()
+        return document.callback_url
+    finally:
+        db.close()
+
+
+def completed_values() -> dict:
+    now = datetime.now(timezone.utc)
+    return {"status": "completed", "extracted_data": EXTRACTED_DATA, "completed_at": now, "validated_at": now,
+            **key_field_values(EXTRACTED_DATA)}
+
+
+async def poll_status(async_session_local, document_ids, include_data: bool) -> int:
+    response_bytes = 0
+    owner = UserSchema(id=1, email="bench@example.com", is_active=True)
+    for document_id in document_ids:
+        async with async_session_local() as db:
+            document = await get_extraction_task_status(document_id, include_data=include_data, db=db,
+                                                        current_user=owner)
+            response_bytes += len(DocumentSchema.model_validate(document).model_dump_json())
+    return response_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite database")
+    args = parser.parse_args()
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = get_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    session_local = get_session_local(engine)
+    async_engine = get_async_engine(get_async_database_url(database_url))
+    async_session_local = get_async_session_local(async_engine)
+
+    with session_local() as db:
+        documents = [Document(filename=f"scan_{i}.jpg", status="processing", owner_id=1, country_code="FR",
+                              callback_url="https://client.example/hook") for i in range(args.documents)]
+        db.add_all(documents)
+        db.commit()
+        document_ids = [document.id for document in documents]
+
+    try:
+        print(f"{args.documents} documents on {engine.dialect.name}\n")
+        print(f"{'path':<36}{'statements/doc':>15}{'ms/doc':>9}{'bytes/doc':>11}")
+        counter = StatementCounter(engine)
+        persist_paths = (("persist (ORM load + flush)", legacy_persist), ("persist (UPDATE ... RETURNING)", core_persist))
+        for name, persist in persist_paths:
+            counter.count = 0
+            started_at = time.perf_counter()
+            for document_id in document_ids:
+                persist(session_local, document_id, completed_values())
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            print(f"{name:<36}{counter.count / args.documents:>15.1f}{elapsed_ms / args.documents:>9.2f}{'-':>11}")
+
+        async_counter = StatementCounter(async_engine.sync_engine)
+        for name, include_data in (("task-status (full row)", True), ("task-status (include_data=false)", False)):
+            async_counter.count = 0
+            started_at = time.perf_counter()
+            response_bytes = asyncio.run(poll_status(async_session_local, document_ids, include_data))
+            elapsed_ms = (time.perf_counter() - started_at) * 1000
+            print(f"{name:<36}{async_counter.count / args.documents:>15.1f}{elapsed_ms / args.documents:>9.2f}"
+                  f"{response_bytes / args.documents:>11.0f}")
+    finally:
+        with session_local() as db:
+            db.execute(delete(Document).where(Document.id.in_(document_ids)))
+            db.commit()
+
+
+if __name__ == "__main__":
+    main()
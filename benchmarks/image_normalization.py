@@ -0,0 +1,94 @@
+"""
+Compares image normalization settings: payload bytes, preprocessing time and, with --live,
+end-to-end model latency and field-level extraction accuracy.
+
+Fixture set layout (--fixtures DIR): images plus an `expected.json` file such as
+    {"scan_001.jpg": {"country_code": "FR", "fields": {"numero_immatriculation": "AB-123-CD", ...}}, ...}
+Without --fixtures, synthetic 4-12 MP documents are used (bytes and timings only).
+
+    python -m benchmarks.image_normalization --fixtures ./fixtures/cartes-grises --live
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+import time
+
+from benchmarks.images import synthetic_document
+
+# Settings compared by the benchmark; "legacy" matches the preprocessing before normalization
+# (full resolution grayscale, JPEG quality 75, no crop).
+CONFIGURATIONS = {
+    "legacy": dict(target_long_edge=100_000, crop_to_document=False, jpeg_quality=75,
+                   min_jpeg_quality=75, max_bytes=10**9),
+    "default": dict(),
+    "compact": dict(target_long_edge=1200, jpeg_quality=80, max_bytes=150_000),
+}
+
+
+def load_fixtures(directory: str):
+    with open(os.path.join(directory, "expected.json")) as f:
+        expected = json.load(f)
+    for filename, entry in sorted(expected.items()):
+        with open(os.path.join(directory, filename), "rb") as f:
+            yield filename, f.read(), entry["country_code"], entry["fields"]
+
+
+def synthetic_fixtures(count: int):
+    for i in range(count):
+        megapixels = (4, 8, 12)[i % 3]
+        yield f"synthetic_{megapixels}mp_{i}.jpg", synthetic_document(megapixels, seed=i), "FR", None
+
+
+def field_accuracy(extracted: dict, expected: dict) -> float:
+    def normalize(value):
+        return " ".join(str(value).upper().split()) if value is not None else None
+
+    matches = sum(normalize(extracted.get(name)) == normalize(value) for name, value in expected.items())
+    return matches / len(expected) if expected else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Directory with images and expected.json")
+    parser.add_argument("--synthetic", type=int, default=9, help="Number of synthetic images without --fixtures")
+    parser.add_argument("--configurations", default=",".join(CONFIGURATIONS))
+    parser.add_argument("--live", action="store_true", help="Call the model API (MISTRAL_API_URL/MISTRAL_API_KEY)")
+    args = parser.parse_args()
+
+    from app.services.ai.mistral_client import mistral_client
+    from app.services.ai.prompts import COUNTRY_PROMPTS
+    from app.services.image_processing import NormalizationOptions, preprocess_image
+
+    fixtures = list(load_fixtures(args.fixtures) if args.fixtures else synthetic_fixtures(args.synthetic))
+    input_bytes = statistics.mean(len(image) for _, image, _, _ in fixtures)
+    print(f"{len(fixtures)} images, mean input size {input_bytes / 1024:.0f} KiB\n")
+    print(f"{'configuration':<14}{'payload KiB':>12}{'preprocess ms':>15}{'model ms':>10}{'accuracy':>10}")
+
+    for name in args.configurations.split(","):
+        options = NormalizationOptions(**CONFIGURATIONS[name])
+        payload_sizes, preprocess_times, model_times, accuracies = [], [], [], []
+        for filename, image, country_code, expected in fixtures:
+            started_at = time.perf_counter()
+            payload = preprocess_image(image, options)
+            preprocess_times.append((time.perf_counter() - started_at) * 1000)
+            payload_sizes.append(len(payload))
+
+            if args.live:
+                started_at = time.perf_counter()
+                extracted = mistral_client.extract_car_plate_data(
+                    base64.b64encode(payload).decode("utf-8"), COUNTRY_PROMPTS[country_code]
+                )
+                model_times.append((time.perf_counter() - started_at) * 1000)
+                if expected:
+                    accuracies.append(field_accuracy(extracted, expected))
+
+        model_ms = f"{statistics.mean(model_times):.0f}" if model_times else "-"
+        accuracy = f"{statistics.mean(accuracies):.1%}" if accuracies else "-"
+        print(f"{name:<14}{statistics.mean(payload_sizes) / 1024:>12.0f}"
+              f"{statistics.mean(preprocess_times):>15.0f}{model_ms:>10}{accuracy:>10}")
+
+
+if __name__ == "__main__":
+    main()
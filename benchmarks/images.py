@@ -0,0 +1,37 @@
+"""
+Synthetic carte grise-like images for the benchmarks (no real documents in the repository).
+"""
+import cv2
+import numpy as np
+
+FIELD_LINES = [
+    "A AB-123-CD", "B 14/03/2019", "C.1 DUPONT JEAN", "C.3 12 RUE DE LA PAIX 75002 PARIS",
+    "D.1 RENAULT", "D.2 BH0E1A", "D.3 CLIO", "E VF1RJA00012345678", "F.1 1588", "G 1165",
+    "J.1 VP", "P.1 999", "P.2 67", "P.3 ES", "P.6 5", "S.1 5", "V.7 118", "Z 14/03/2019",
+]
+
+
+def synthetic_document(megapixels: float = 12.0, seed: int = 0, quality: int = 92) -> bytes:
+    """
+    Renders a photo-like JPEG of a certificate: a light document with text lines on a darker,
+    noisy background, at roughly the requested resolution (4:3 aspect ratio).
+    """
+    rng = np.random.default_rng(seed)
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+
+    image = rng.integers(40, 90, size=(height, width, 3), dtype=np.uint8)
+    top, left = height // 8, width // 8
+    bottom, right = height - height // 8, width - width // 8
+    cv2.rectangle(image, (left, top), (right, bottom), (228, 232, 226), thickness=-1)
+
+    scale = height / 1000
+    for i, line in enumerate(FIELD_LINES):
+        y = top + int((i + 1) * (bottom - top) / (len(FIELD_LINES) + 1))
+        cv2.putText(image, line, (left + int(40 * scale), y), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.9 * scale, (30, 30, 30), max(1, int(2 * scale)), cv2.LINE_AA)
+
+    noise = rng.normal(0, 6, size=image.shape)
+    image = np.clip(image + noise, 0, 255).astype(np.uint8)
+    ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return encoded.tobytes()
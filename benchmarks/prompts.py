@@ -0,0 +1,90 @@
+"""
+Compares the prompt encodings: prompt size (characters and estimated tokens) against field-level
+extraction accuracy, offline, from model responses recorded once per prompt version.
+
+Fixture set layout (--fixtures DIR): the images and `expected.json` of benchmarks.image_normalization,
+plus the recorded responses in `responses/<prompt version>/<image>.json`. `--record` fills them
+by calling the model (MISTRAL_API_URL/MISTRAL_API_KEY) for the encodings without responses yet.
+Without --fixtures, only the prompt sizes are compared.
+
+    python -m benchmarks.prompts --fixtures ./fixtures/cartes-grises --record
+    python -m benchmarks.prompts --fixtures ./fixtures/cartes-grises
+"""
+import argparse
+import base64
+import json
+import os
+import statistics
+
+from benchmarks.image_normalization import field_accuracy, load_fixtures
+
+
+def response_path(directory: str, version: str, filename: str) -> str:
+    return os.path.join(directory, "responses", version, f"{filename}.json")
+
+
+def record_responses(directory: str, builder) -> int:
+    """
+    Calls the model for every fixture without a recorded response for this prompt version.
+    """
+    from app.services.ai.mistral_client import mistral_client
+    from app.services.image_processing import preprocess_image
+
+    recorded = 0
+    for filename, image, country_code, _ in load_fixtures(directory):
+        path = response_path(directory, builder.version, filename)
+        if os.path.exists(path):
+            continue
+        payload = base64.b64encode(preprocess_image(image)).decode("utf-8")
+        extraction = mistral_client.extract_car_plate_data(payload, builder.build(country_code).text)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(extraction, f, ensure_ascii=False, indent=2)
+        recorded += 1
+    return recorded
+
+
+def recorded_accuracy(directory: str, version: str):
+    """
+    Mean field accuracy of the recorded responses of a prompt version, and how many were found.
+    """
+    with open(os.path.join(directory, "expected.json")) as f:
+        expected = json.load(f)
+    accuracies = []
+    for filename, entry in sorted(expected.items()):
+        path = response_path(directory, version, filename)
+        if os.path.exists(path):
+            with open(path) as f:
+                accuracies.append(field_accuracy(json.load(f), entry["fields"]))
+    return (statistics.mean(accuracies) if accuracies else None), len(accuracies), len(expected)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Directory with images, expected.json and responses/")
+    parser.add_argument("--encodings", default="schema,fields,skeleton")
+    parser.add_argument("--record", action="store_true", help="Call the model for the missing responses")
+    args = parser.parse_args()
+
+    from app.services.ai.prompts import COUNTRY_SCHEMAS, PromptBuilder
+
+    sizes = "".join(f"{cc + ' chars':>10}{cc + ' tokens':>11}" for cc in COUNTRY_SCHEMAS)
+    print(f"{'encoding':<10}{'version':<12}{sizes}{'accuracy':>10}{'responses':>11}")
+    for encoding in args.encodings.split(","):
+        builder = PromptBuilder(encoding)
+        sizes = "".join(
+            f"{len(prompt.text):>10}{prompt.tokens:>11}"
+            for prompt in (builder.build(country_code) for country_code in COUNTRY_SCHEMAS)
+        )
+        accuracy, responses = "-", "-"
+        if args.fixtures:
+            if args.record:
+                record_responses(args.fixtures, builder)
+            mean_accuracy, found, total = recorded_accuracy(args.fixtures, builder.version)
+            accuracy = f"{mean_accuracy:.1%}" if mean_accuracy is not None else "-"
+            responses = f"{found}/{total}"
+        print(f"{encoding:<10}{builder.version:<12}{sizes}{accuracy:>10}{responses:>11}")
+
+
+if __name__ == "__main__":
+    main()
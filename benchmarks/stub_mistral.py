@@ -0,0 +1,136 @@
+"""
+Local stub of the Mistral chat completions API for benchmarks.
+- Answers POST /v1/chat/completions with a recorded extraction after a configurable latency
+- Replays the model responses recorded by benchmarks/prompts.py (`--recorded`) in turn, if given
+- Optionally injects 503 errors to exercise the client retries
+
+    python -m benchmarks.stub_mistral --port 8900 --latency 1.5 --error-rate 0.05
+    python -m benchmarks.stub_mistral --recorded ./fixtures/responses/1
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+RECORDED_EXTRACTION = {
+    "numero_immatriculation": "AB-123-CD",
+    "date_premiere_immatriculation": "2019-03-14",
+    "date_mise_en_circulation": "2019-03-14",
+    "nom_titulaire": "DUPONT",
+    "prenom_titulaire": "JEAN",
+    "marque": "RENAULT",
+    "denomination_commerciale": "CLIO",
+    "numero_identification": "VF1RJA00012345678",
+    "puissance_fiscale": "5",
+    "carburant": "ES",
+}
+
+
+def load_recorded_responses(directory: str) -> List[dict]:
+    """
+    Extractions recorded as JSON files (e.g. `responses/<prompt version>/` of a fixture set).
+    """
+    paths = sorted(glob.glob(os.path.join(directory, "**", "*.json"), recursive=True))
+    if not paths:
+        raise ValueError(f"No recorded response in {directory}")
+    responses = []
+    for path in paths:
+        with open(path) as f:
+            responses.append(json.load(f))
+    return responses
+
+
+class StubMistralServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 1.0,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+        response: Optional[dict] = None,
+        responses: Optional[List[dict]] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.responses = responses or [response or RECORDED_EXTRACTION]
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                time.sleep(max(0.0, random.gauss(stub.latency, stub.jitter)))
+                with stub._lock:
+                    response = stub.responses[stub.requests % len(stub.responses)]
+                    stub.requests += 1
+                    failed = random.random() < stub.error_rate
+                    stub.errors += failed
+                if failed:
+                    self._send(503, {"message": "Injected error"})
+                else:
+                    self._send(200, {
+                        "choices": [{"message": {"role": "assistant", "content": json.dumps(response)}}],
+                        "usage": {"prompt_tokens": 1500, "completion_tokens": 250, "total_tokens": 1750},
+                    })
+
+            def _send(self, status_code: int, body: dict):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status_code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "StubMistralServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=1.0, help="Mean response time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Standard deviation of the response time")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 503")
+    parser.add_argument("--recorded", help="Directory of recorded extractions (JSON) to replay")
+    args = parser.parse_args()
+
+    responses = load_recorded_responses(args.recorded) if args.recorded else None
+    server = StubMistralServer(args.host, args.port, args.latency, args.jitter, args.error_rate, responses=responses)
+    print(f"Stub Mistral API listening on {server.url}")
+    server.serve_forever()
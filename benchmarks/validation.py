@@ -0,0 +1,130 @@
+"""
+Throughput of the validation engine when revalidating stored extractions: the compiled rule
+table (verbose and compact results, one document at a time and in batches) against the previous
+per-field implementation (substring checks on the field name, uncompiled patterns).
+
+Extractions are synthetic by default; --from-db revalidates the completed documents of the
+configured database instead.
+
+    python -m benchmarks.validation --documents 100000
+    DATABASE_URL=... MISTRAL_API_KEY=stub SECRET_KEY=stub REDIS_BROKER_URL=... REDIS_BACKEND_URL=... \\
+        python -m benchmarks.validation --from-db
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.services.ai.backends import STUB_EXTRACTIONS
+
+# Previous implementation, kept as the baseline
+LEGACY_PATTERNS = {
+    "FR_NUM_IMMATRICULATION_NEW": r"^[A-Z]{2}-\d{3}-[A-Z]{2}$",
+    "FR_NUM_IMMATRICULATION_OLD": r"^\d{1,4}\s[A-Z]{2}\s\d{2}$",
+    "TN_NUM_IMMATRICULATION": r"^\d{1,3}\sTUN\s\d{1,4}$",
+    "DATE": r"^\d{4}-\d{2}-\d{2}$",
+    "VIN": r"^[A-HJ-NPR-Z0-9]{17}$",
+    "POWER": r"^\d+(\.\d+)?$",
+}
+
+
+def legacy_validate_field(field_name, value, country_code):
+    if value is None:
+        return True
+    if field_name == "numero_immatriculation":
+        if country_code == "FR":
+            return re.match(LEGACY_PATTERNS["FR_NUM_IMMATRICULATION_NEW"], value) is not None or \
+                   re.match(LEGACY_PATTERNS["FR_NUM_IMMATRICULATION_OLD"], value) is not None
+        elif country_code == "TN":
+            return re.match(LEGACY_PATTERNS["TN_NUM_IMMATRICULATION"], value) is not None
+    elif "date" in field_name:
+        return re.match(LEGACY_PATTERNS["DATE"], value) is not None
+    elif field_name in ("numero_identification", "numero_serie"):
+        return re.match(LEGACY_PATTERNS["VIN"], value) is not None
+    elif "puissance" in field_name or "cylindree" in field_name or "masse" in field_name or \
+         "ptac" in field_name or "poids" in field_name or "charge_utile" in field_name or \
+         "co2" in field_name or "nombre_places" in field_name:
+        return re.match(LEGACY_PATTERNS["POWER"], value) is not None
+    return True
+
+
+def legacy_validate(data, country_code):
+    results = {}
+    for field, value in data.items():
+        is_valid = legacy_validate_field(field, str(value) if value is not None else None, country_code)
+        results[field] = {"value": value, "is_valid": is_valid, "message": "Valid" if is_valid else "Invalid format"}
+    return results
+
+
+def synthetic_extractions(count: int):
+    rng = random.Random(0)
+    extractions = []
+    for _ in range(count):
+        country_code = rng.choice(("FR", "TN"))
+        extraction = dict(STUB_EXTRACTIONS[country_code])
+        for field in rng.sample(sorted(extraction), 3):
+            extraction[field] = rng.choice((None, "1234", "2019-03-14", "n/a"))
+        extractions.append((extraction, country_code))
+    return extractions
+
+
+def stored_extractions(limit: int):
+    from app.database import SessionLocal
+    from app.models.document import Document
+
+    with SessionLocal() as db:
+        rows = db.query(Document.extracted_data, Document.country_code).filter(
+            Document.status == "completed"
+        ).limit(limit).yield_per(1000)
+        return [
+            (data["raw_extraction"], country_code or "FR")
+            for data, country_code in rows if data and data.get("raw_extraction")
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=100_000, help="Number of extractions to revalidate")
+    parser.add_argument("--from-db", action="store_true", help="Revalidate the stored completed documents")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (the fastest is reported)")
+    args = parser.parse_args()
+
+    from app.services.validation import car_plate_validator
+
+    extractions = stored_extractions(args.documents) if args.from_db else synthetic_extractions(args.documents)
+    by_country = {}
+    for extraction, country_code in extractions:
+        by_country.setdefault(country_code, []).append(extraction)
+
+    def one_by_one(validate):
+        return lambda: [validate(extraction, country_code) for extraction, country_code in extractions]
+
+    runs = {
+        "legacy (verbose)": one_by_one(legacy_validate),
+        "rule table (verbose)": one_by_one(car_plate_validator.validate_car_plate_data),
+        "rule table (compact)": one_by_one(lambda data, country_code: car_plate_validator.validate(data, country_code, compact=True)),
+        "batch (compact)": lambda: [
+            car_plate_validator.validate_many(batch, country_code) for country_code, batch in by_country.items()
+        ],
+    }
+
+    print(f"{len(extractions)} extractions\n")
+    print(f"{'implementation':<24}{'docs/s':>12}{'speedup':>9}{'result bytes/doc':>18}")
+    baseline = None
+    for name, run in runs.items():
+        elapsed = float("inf")
+        for _ in range(args.repeat):
+            started_at = time.perf_counter()
+            results = run()
+            elapsed = min(elapsed, time.perf_counter() - started_at)
+        if name.startswith("batch"):
+            results = [result for batch in results for result in batch]
+        size = sum(len(json.dumps(result)) for result in results) / max(1, len(results))
+        throughput = len(extractions) / elapsed
+        baseline = baseline or throughput
+        print(f"{name:<24}{throughput:>12.0f}{throughput / baseline:>8.1f}x{size:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,17 @@ from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 import pytest
-from unittest.mock import patch
-import base64
+from unittest.mock import AsyncMock, patch
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+import asyncio
+import json
+import hashlib
+import io
+import zipfile
+
+import numpy as np
+from PIL import Image
 
 # Override settings *before* importing app.main or app.database
 from app.core.config import settings
@@ -13,24 +22,33 @@ settings.DATABASE_URL = TEST_DATABASE_URL
 
 # Now import necessary components from the application
 from app.api.v1.api import router as api_v1_router # Import the v1 router directly
-from app.database import Base, get_db, get_engine, get_session_local
+from app.database import (
+    Base, get_async_database_url, get_async_db, get_async_engine, get_async_session_local, get_engine,
+    get_session_local
+)
 
 # Import models to ensure they are registered with Base.metadata.
 # These imports must happen BEFORE Base.metadata.create_all() is called.
 from app.models.document import Document
 from app.models.user import User
+from app.services.scheduling import PRIORITY_CLASSES
+from app.services.storage import LocalBlobStore
+from app.core.metrics import MetricsMiddleware, metrics_endpoint
+from app.core.middleware import MaxBodySizeMiddleware
+from app.api.deps import get_current_user, token_cache, user_cache
+from app.schemas.common import User as UserSchema
 
 # --- Test Database Setup ---
 test_engine = get_engine(TEST_DATABASE_URL)
 TestingSessionLocal = get_session_local(test_engine)
+# The API handlers use an async session on the same database
+test_async_engine = get_async_engine(get_async_database_url(TEST_DATABASE_URL))
+TestingAsyncSessionLocal = get_async_session_local(test_async_engine)
 
 # Dependency to get the test database session
-def override_get_db():
-    db = TestingSessionLocal()
-    try:
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 # --- Fixtures ---
 @pytest.fixture(name="db_session")
@@ -45,26 +63,74 @@ def db_session_fixture():
         # Drop tables after each test
         Base.metadata.drop_all(bind=test_engine)
 
+@pytest.fixture(name="blob_store")
+def blob_store_fixture(tmp_path):
+    # Keep uploaded blobs out of the working tree
+    store = LocalBlobStore(str(tmp_path / "storage"))
+    with patch("app.api.v1.endpoints.extraction.blob_store", store):
+        yield store
+
+@pytest.fixture(autouse=True, name="schedule")
+def schedule_fixture():
+    # Every document gets the first priority of its class, without a backlog in Redis
+    with patch("app.api.v1.endpoints.extraction.fair_scheduler.schedule",
+               side_effect=lambda owner_id, priority_class, count=1: [PRIORITY_CLASSES[priority_class][0]] * count
+               ) as mock_schedule:
+        yield mock_schedule
+
+class MemoryRedis:
+    # SET (NX), GET and DELETE, for the idempotency keys
+    def __init__(self):
+        self.values = {}
+        self.expirations = {} # Every TTL set on each key, in order
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        self.expirations.setdefault(key, []).append(ex)
+        return True
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+@pytest.fixture(autouse=True, name="idempotency_redis")
+def idempotency_redis_fixture():
+    client = MemoryRedis()
+    with patch("app.api.v1.endpoints.extraction.idempotency_keys._client", client):
+        yield client
+
+@pytest.fixture(autouse=True, name="join_inflight")
+def join_inflight_fixture():
+    # Every upload leads its own extraction unless a test says otherwise
+    with patch("app.api.v1.endpoints.extraction.inflight_extractions.join", return_value=None) as mock_join:
+        yield mock_join
+
 @pytest.fixture(name="fastapi_app")
 def fastapi_app_fixture():
     # Create a new FastAPI app instance for testing
     test_app = FastAPI()
     test_app.include_router(api_v1_router, prefix="/api/v1")
     
-    # Override get_db dependency for the test app
-    test_app.dependency_overrides[get_db] = override_get_db
+    # Override get_async_db dependency for the test app
+    test_app.dependency_overrides[get_async_db] = override_get_async_db
+    # Authenticate every request as user 1 (see test_authenticated_upload for the token flow)
+    test_app.dependency_overrides[get_current_user] = lambda: UserSchema(id=1, email="test@example.com", is_active=True)
     return test_app
 
 @pytest.fixture(name="client")
-def client_fixture(fastapi_app: FastAPI, db_session): # Explicitly depend on db_session
+def client_fixture(fastapi_app: FastAPI, db_session, blob_store): # Explicitly depend on db_session
     with TestClient(fastapi_app) as test_client:
         yield test_client
 
 # --- Tests ---
-@patch("app.api.v1.endpoints.health.redis.from_url")
-def test_health_check(mock_redis_from_url, client):
+@patch("app.api.v1.endpoints.health.get_async_redis")
+def test_health_check(mock_get_async_redis, client):
     # Mock the Redis ping method
-    mock_redis_from_url.return_value.ping.return_value = True
+    mock_get_async_redis.return_value.ping = AsyncMock(return_value=True)
 
     response = client.get("/api/v1/health")
     if response.status_code != 200:
@@ -72,12 +138,15 @@ def test_health_check(mock_redis_from_url, client):
     assert response.status_code == 200
     assert response.json() == {"status": "ok", "message": "All services are healthy"}
 
-@patch("app.worker.tasks.process_image_for_extraction.delay")
-@patch("app.api.v1.endpoints.extraction.is_valid_image", return_value=True) # Corrected patch target
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header") # Test payloads are not real images
 def test_upload_and_extract(
-    mock_is_valid_image,
-    mock_celery_delay,
+    mock_read_image_header,
+    mock_cache_get,
+    mock_extraction_pipeline,
     client,
+    blob_store,
 ):
     # Create a dummy image file for upload
     dummy_image_content = b"fake_image_data"
@@ -98,13 +167,478 @@ def test_upload_and_extract(
     assert "id" in data
     assert "upload_timestamp" in data
 
-    # Verify that the Celery task was called
-    mock_celery_delay.assert_called_once_with(
-        data["id"],
-        base64.b64encode(dummy_image_content).decode("utf-8"),
-        country_code
+    # Verify that the extraction was enqueued with a blob reference, not the image itself
+    blob_key = hashlib.sha256(dummy_image_content).hexdigest()
+    # Single uploads take the interactive lane
+    mock_extraction_pipeline.assert_called_once_with(data["id"], blob_key, country_code, "mistral",
+                                                     priority_class="interactive", owner_id=1, priority=0)
+    mock_extraction_pipeline.return_value.apply_async.assert_called_once_with()
+    assert blob_store.get(blob_key) == dummy_image_content
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_priority(mock_read_image_header, mock_cache_get, mock_extraction_pipeline, client, schedule):
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("test.jpg", b"fake_image_data", "image/jpeg")},
+        data={"country_code": "FR", "priority": "bulk"}
+    )
+    assert response.status_code == 200
+    schedule.assert_called_once_with(1, "bulk")
+    assert mock_extraction_pipeline.call_args.kwargs == {"priority_class": "bulk", "owner_id": 1, "priority": 5}
+
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("test.jpg", b"fake_image_data", "image/jpeg")},
+        data={"country_code": "FR", "priority": "urgent"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Unknown priority: urgent")
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_idempotency_key(mock_read_image_header, mock_cache_get, mock_extraction_pipeline, client,
+                                idempotency_redis):
+    def upload(content: bytes, key: str = "retry-1"):
+        return client.post(
+            "/api/v1/upload-and-extract/",
+            files={"file": ("test.jpg", content, "image/jpeg")},
+            data={"country_code": "FR"},
+            headers={"Idempotency-Key": key}
+        )
+
+    first = upload(b"fake_image_data")
+    retry = upload(b"fake_image_data")
+    assert first.status_code == retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+    assert retry.headers["Idempotent-Replayed"] == "true" and "Idempotent-Replayed" not in first.headers
+    # A single document and a single extraction
+    mock_extraction_pipeline.return_value.apply_async.assert_called_once_with()
+    # The claim is short-lived, the record of the document is kept for retries
+    assert idempotency_redis.expirations["idempotency:1:retry-1"] == [
+        settings.IDEMPOTENCY_CLAIM_TTL_SECONDS, settings.IDEMPOTENCY_KEY_TTL_SECONDS
+    ]
+
+    # The key belongs to the first upload
+    assert upload(b"other_image_data").status_code == 422
+    # A retry racing the first request is told to come back
+    idempotency_redis.values["idempotency:1:racing"] = json.dumps(
+        {"fingerprint": f"{hashlib.sha256(b'fake_image_data').hexdigest()}:FR:mistral:1", "document_id": None}
+    )
+    assert upload(b"fake_image_data", key="racing").status_code == 409
+
+@patch("app.api.v1.endpoints.extraction.fair_scheduler.release")
+@patch("app.api.v1.endpoints.extraction.inflight_extractions.finish", return_value=[])
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_releases_its_extraction_when_enqueueing_fails(mock_read_image_header, mock_cache_get,
+                                                              mock_extraction_pipeline, mock_finish, mock_release,
+                                                              client, join_inflight):
+    mock_extraction_pipeline.return_value.apply_async.side_effect = ConnectionError("broker unavailable")
+    with pytest.raises(ConnectionError):
+        client.post(
+            "/api/v1/upload-and-extract/",
+            files={"file": ("test.jpg", b"fake_image_data", "image/jpeg")},
+            data={"country_code": "FR"}
+        )
+
+    # The upload led the extraction of its image: identical uploads no longer wait on it
+    blob_key, document_id = join_inflight.call_args.args[0], join_inflight.call_args.args[3]
+    mock_finish.assert_called_once_with(blob_key, "FR", "mistral", document_id)
+    mock_release.assert_called_once_with(1)
+
+@patch("app.api.v1.endpoints.extraction.schedule_follower_check")
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_follows_identical_extraction_in_flight(mock_read_image_header, mock_cache_get,
+                                                       mock_extraction_pipeline, mock_schedule_follower_check,
+                                                       client, join_inflight):
+    join_inflight.return_value = 41 # Document already being extracted
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("test.jpg", b"fake_image_data", "image/jpeg")},
+        data={"country_code": "FR"}
     )
 
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "pending"
+    # The document gets the outcome of the running extraction instead of queuing its own
+    blob_key = hashlib.sha256(b"fake_image_data").hexdigest()
+    join_inflight.assert_called_once_with(blob_key, "FR", "mistral", data["id"])
+    mock_extraction_pipeline.assert_not_called()
+    # Should that extraction be lost, a later check takes over
+    mock_schedule_follower_check.assert_called_once_with(data["id"], blob_key, "FR", "mistral", "interactive", 1)
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get")
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_and_extract_cache_hit(
+    mock_read_image_header,
+    mock_cache_get,
+    mock_extraction_pipeline,
+    client,
+):
+    cached_extraction = {"raw_extraction": {"marque": "RENAULT"}, "validation_results": {}}
+    mock_cache_get.return_value = cached_extraction
+
+    upload = {"files": {"file": ("test.jpg", b"fake_image_data", "image/jpeg")}}
+    # The stub is refused unless it is allowed for requests
+    response = client.post("/api/v1/upload-and-extract/", data={"country_code": "FR", "backend": "stub"}, **upload)
+    assert response.status_code == 400 and response.json()["detail"].startswith("Extraction backend not allowed: stub")
+
+    with patch.object(settings, "ALLOWED_REQUEST_BACKENDS", ["mistral", "stub"]):
+        response = client.post("/api/v1/upload-and-extract/", data={"country_code": "FR", "backend": "stub"}, **upload)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "completed"
+    assert data["extracted_data"] == cached_extraction
+
+    # Cache hits never reach the queue; results are cached per backend
+    mock_extraction_pipeline.assert_not_called()
+    mock_cache_get.assert_called_once_with(hashlib.sha256(b"fake_image_data").hexdigest(), "FR", "stub")
+
+    with patch.object(settings, "ALLOWED_REQUEST_BACKENDS", ["unknown"]):
+        response = client.post("/api/v1/upload-and-extract/", data={"country_code": "FR", "backend": "unknown"}, **upload)
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Unknown extraction backend: unknown")
+
+@patch("app.api.v1.endpoints.extraction.group")
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get_many", side_effect=lambda keys, country_code, backend: [None] * len(keys))
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_batch_extract(
+    mock_read_image_header,
+    mock_cache_get,
+    mock_extraction_pipeline,
+    mock_group,
+    client,
+    schedule,
+):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("scans/zipped.jpg", b"zipped_image_data")
+        zf.writestr("scans/", b"")
+    files = [
+        ("files", ("first.jpg", b"first_image_data", "image/jpeg")),
+        ("files", ("second.jpg", b"second_image_data", "image/jpeg")),
+        ("files", ("scans.zip", archive.getvalue(), "application/zip")),
+    ]
+
+    response = client.post("/api/v1/batch-extract/", files=files, data={"country_code": "FR"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert data["status_counts"] == {"pending": 3}
+    assert data["progress"] == 0.0
+    assert [doc["filename"] for doc in data["documents"]] == ["first.jpg", "second.jpg", "scans/zipped.jpg"]
+    assert all(doc["batch_id"] == data["batch_id"] for doc in data["documents"])
+
+    # All pending documents are fanned out as a single group
+    mock_group.return_value.apply_async.assert_called_once()
+    assert len(mock_group.call_args.args[0]) == 3
+    assert [call.args for call in mock_extraction_pipeline.call_args_list] == [
+        (doc["id"], hashlib.sha256(content).hexdigest(), "FR", "mistral")
+        for doc, content in zip(data["documents"], [b"first_image_data", b"second_image_data", b"zipped_image_data"])
+    ]
+    # Batches take the bulk lane; the owner's backlog is updated once for the whole batch
+    schedule.assert_called_once_with(1, "bulk", 3)
+    assert all(call.kwargs == {"priority_class": "bulk", "owner_id": 1, "priority": 5}
+               for call in mock_extraction_pipeline.call_args_list)
+
+@patch("app.api.v1.endpoints.extraction.group")
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_batch_extract_limits_are_checked_before_extracting_archives(mock_read_image_header, mock_group, client,
+                                                                     blob_store, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_FILES", 3)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for index in range(3):
+            zf.writestr(f"scan_{index}.jpg", f"zipped_image_{index}".encode())
+    files = [
+        ("files", ("first.jpg", b"first_image_data", "image/jpeg")),
+        ("files", ("scans.zip", archive.getvalue(), "application/zip")),
+    ]
+
+    response = client.post("/api/v1/batch-extract/", files=files, data={"country_code": "FR"})
+    assert response.status_code == 413
+    # Too many members: none was extracted, and the image stored before is deleted
+    assert not any(blob_store.exists(hashlib.sha256(content).hexdigest())
+                   for content in [b"first_image_data", b"zipped_image_0"])
+
+    # The uncompressed size is capped too
+    monkeypatch.setattr(settings, "BATCH_MAX_FILES", 10)
+    monkeypatch.setattr(settings, "BATCH_MAX_UNCOMPRESSED_BYTES", 20)
+    response = client.post("/api/v1/batch-extract/", files=files, data={"country_code": "FR"})
+    assert response.status_code == 413 and "uncompressed" in response.json()["detail"]
+    mock_group.assert_not_called()
+
+@patch("app.api.v1.endpoints.extraction.split_document")
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+def test_upload_pdf_is_split_by_a_worker(mock_extraction_pipeline, mock_split_document, client, blob_store):
+    content = b"%PDF-1.7 pages"
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("scans.pdf", content, "application/pdf")},
+        data={"country_code": "FR", "pages_per_document": 2}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    # The pages are added to the batch of the upload
+    assert data["status"] == "pending" and data["batch_id"]
+    mock_extraction_pipeline.assert_not_called()
+    mock_split_document.s.assert_called_once_with(
+        data["id"], hashlib.sha256(content).hexdigest(), "FR", "mistral", 2, "interactive", 0
+    )
+    mock_split_document.s.return_value.set.assert_called_once_with(priority=0)
+    mock_split_document.s.return_value.set.return_value.apply_async.assert_called_once_with()
+
+@patch("app.api.v1.endpoints.extraction.split_document")
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+def test_upload_large_compressed_tiff(mock_extraction_pipeline, mock_split_document, client, blob_store):
+    # LZW frames of noise: the first directory is written after 1 MiB of pixel data
+    rng = np.random.default_rng(0)
+    frames = [Image.fromarray(rng.integers(0, 255, (1100, 1100), dtype=np.uint8)) for _ in range(2)]
+    buffer = io.BytesIO()
+    frames[0].save(buffer, format="TIFF", save_all=True, append_images=frames[1:], compression="tiff_lzw")
+
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("scans.tiff", buffer.getvalue(), "image/tiff")},
+        data={"country_code": "FR"}
+    )
+    assert response.status_code == 200
+    mock_split_document.s.assert_called_once()
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+def test_upload_rejects_non_image_from_header(mock_extraction_pipeline, client, blob_store):
+    response = client.post(
+        "/api/v1/upload-and-extract/",
+        files={"file": ("test.jpg", b"%PDF-1.7 not an image", "image/jpeg")},
+        data={"country_code": "FR"}
+    )
+    assert response.status_code == 400
+    mock_extraction_pipeline.assert_not_called()
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_rejects_oversized_image(mock_read_image_header, mock_extraction_pipeline, client, blob_store):
+    with patch.object(settings, "UPLOAD_MAX_BYTES", 1024):
+        response = client.post(
+            "/api/v1/upload-and-extract/",
+            files={"file": ("test.jpg", b"x" * 2048, "image/jpeg")},
+            data={"country_code": "FR"}
+        )
+    assert response.status_code == 413
+    mock_extraction_pipeline.assert_not_called()
+    assert not blob_store.exists(hashlib.sha256(b"x" * 2048).hexdigest())
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_upload_rejects_internal_callback_urls(mock_read_image_header, mock_extraction_pipeline, client):
+    upload = {"files": {"file": ("test.jpg", b"fake_image_data", "image/jpeg")}}
+    for callback_url in ("ftp://client.example/hook", "http://127.0.0.1:8000/admin", "http://10.0.0.5/hook",
+                         "http://169.254.169.254/latest/meta-data/", "http://[::1]/hook", "http://0.0.0.0/hook"):
+        response = client.post("/api/v1/upload-and-extract/", data={"country_code": "FR", "callback_url": callback_url},
+                               **upload)
+        assert response.status_code == 400, callback_url
+    mock_extraction_pipeline.assert_not_called()
+
+    # Hosts are resolved: names pointing to internal addresses are refused too
+    with patch("socket.getaddrinfo", return_value=[(2, 1, 6, "", ("192.168.1.10", 443))]):
+        response = client.post("/api/v1/upload-and-extract/",
+                               data={"country_code": "FR", "callback_url": "https://intranet.client.example/hook"},
+                               **upload)
+    assert response.status_code == 400
+
+def test_max_body_size_middleware(fastapi_app: FastAPI, db_session, blob_store):
+    fastapi_app.add_middleware(MaxBodySizeMiddleware, max_body_size=8192,
+                               path_limits={"/api/v1/upload-and-extract/": 1024})
+    with TestClient(fastapi_app) as test_client:
+        response = test_client.post(
+            "/api/v1/upload-and-extract/",
+            files={"file": ("test.jpg", b"x" * 2048, "image/jpeg")},
+            data={"country_code": "FR"}
+        )
+        assert response.status_code == 413 and "1024 bytes" in response.json()["detail"]
+
+        # Batches keep the larger cap: the same body reaches the endpoint (its invalid image is reported there)
+        response = test_client.post("/api/v1/batch-extract/", files=[("files", ("test.jpg", b"x" * 2048, "image/jpeg"))],
+                                    data={"country_code": "FR"})
+        assert response.status_code == 200
+        response = test_client.post("/api/v1/batch-extract/", files=[("files", ("test.jpg", b"x" * 9000, "image/jpeg"))],
+                                    data={"country_code": "FR"})
+        assert response.status_code == 413 and "8192 bytes" in response.json()["detail"]
+
+@patch("app.core.celery_app.get_queue_depths", return_value={"preprocess": 0, "inference": 3, "persist": 1})
+def test_metrics_endpoint(mock_get_queue_depths, fastapi_app: FastAPI, db_session):
+    fastapi_app.add_middleware(MetricsMiddleware)
+    fastapi_app.add_route("/metrics", metrics_endpoint)
+    with TestClient(fastapi_app) as test_client:
+        assert test_client.get("/api/v1/task-status/999").status_code == 404
+        test_client.get("/not-a-route")
+        response = test_client.get("/metrics")
+
+    assert response.status_code == 200
+    metrics = response.text
+    # Requests are labelled with their route template, never with the raw path
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/task-status/{document_id}",status_code="404"}' in metrics
+    assert 'route="unmatched"' in metrics and "/not-a-route" not in metrics
+    assert 'celery_queue_depth{queue="inference"} 3.0' in metrics
+
+@patch("app.api.v1.endpoints.extraction.extraction_pipeline")
+@patch("app.api.v1.endpoints.extraction.extraction_cache.get", return_value=None)
+@patch("app.api.v1.endpoints.extraction.read_image_header")
+def test_authenticated_upload(
+    mock_read_image_header,
+    mock_cache_get,
+    mock_extraction_pipeline,
+    fastapi_app: FastAPI,
+    client,
+):
+    del fastapi_app.dependency_overrides[get_current_user]
+    token_cache.clear()
+    user_cache.clear()
+    upload = {"files": {"file": ("test.jpg", b"fake_image_data", "image/jpeg")}, "data": {"country_code": "FR"}}
+
+    assert client.post("/api/v1/upload-and-extract/", **upload).status_code == 401
+
+    response = client.post("/api/v1/users/", json={"email": "owner@example.com", "password": "secret"})
+    assert response.status_code == 201
+    user_id = response.json()["id"]
+    assert client.post("/api/v1/token", data={"username": "owner@example.com", "password": "wrong"}).status_code == 401
+    token = client.post("/api/v1/token", data={"username": "owner@example.com", "password": "secret"}).json()
+
+    headers = {"Authorization": f"Bearer {token['access_token']}"}
+    for _ in range(2):
+        response = client.post("/api/v1/upload-and-extract/", headers=headers, **upload)
+        assert response.status_code == 200
+        assert response.json()["owner_id"] == user_id
+    # The second upload was authenticated from the caches
+    assert token_cache.get(token["access_token"])["sub"] == "owner@example.com"
+    assert user_cache.get("owner@example.com").id == user_id
+
+def test_get_batch_status(client, db_session: Session):
+    db_session.add_all([
+        Document(filename="a.jpg", status="completed", owner_id=1, batch_id="batch-1", extracted_data={"field": "value"}),
+        Document(filename="b.jpg", status="pending", owner_id=1, batch_id="batch-1"),
+        Document(filename="c.jpg", status="completed", owner_id=1, batch_id="other-batch"),
+        Document(filename="d.jpg", status="completed", owner_id=2, batch_id="someone-elses-batch"),
+    ])
+    db_session.commit()
+
+    response = client.get("/api/v1/batch-status/batch-1")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    assert data["status_counts"] == {"completed": 1, "pending": 1}
+    assert data["progress"] == 0.5
+    assert data["documents"][0]["extracted_data"] == {"field": "value"}
+
+    assert client.get("/api/v1/batch-status/unknown").status_code == 404
+    assert client.get("/api/v1/batch-status/someone-elses-batch").status_code == 404
+
+def test_stream_task_events(client, db_session: Session):
+    document = Document(filename="scan.jpg", status="pending", owner_id=1)
+    someone_elses = Document(filename="scan.jpg", status="pending", owner_id=2)
+    db_session.add_all([document, someone_elses])
+    db_session.commit()
+    published = [
+        {"document_id": document.id, "status": "processing", "extracted_data": None},
+        {"document_id": document.id, "status": "completed", "extracted_data": {"field": "value"}},
+    ]
+
+    @asynccontextmanager
+    async def listen(document_id):
+        queue = asyncio.Queue()
+        for event in published:
+            queue.put_nowait(event)
+        yield queue
+
+    with patch("app.api.v1.endpoints.extraction.status_broadcaster.listen", listen):
+        response = client.get(f"/api/v1/task-events/{document.id}")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+    assert [event["status"] for event in events] == ["pending", "processing", "completed"]
+    assert events[-1]["extracted_data"] == {"field": "value"}
+
+    assert client.get("/api/v1/task-events/999").status_code == 404
+    assert client.get(f"/api/v1/task-events/{someone_elses.id}").status_code == 404
+
+def test_get_stage_latency(client, db_session: Session):
+    now = datetime.now(timezone.utc)
+    def timestamps(queue_wait_ms: int, inference_ms: int) -> dict:
+        started_at = now - timedelta(seconds=10)
+        preprocessed_at = started_at + timedelta(milliseconds=200)
+        inferred_at = preprocessed_at + timedelta(milliseconds=inference_ms)
+        return dict(
+            enqueued_at=started_at - timedelta(milliseconds=queue_wait_ms), started_at=started_at,
+            preprocessed_at=preprocessed_at, inferred_at=inferred_at,
+            validated_at=inferred_at + timedelta(milliseconds=5), completed_at=inferred_at + timedelta(milliseconds=20),
+        )
+    db_session.add_all([
+        Document(filename="a.jpg", status="completed", owner_id=1, country_code="FR", **timestamps(100, 1000)),
+        Document(filename="b.jpg", status="completed", owner_id=1, country_code="FR", **timestamps(300, 3000)),
+        Document(filename="c.jpg", status="failed", owner_id=1, country_code="TN", **timestamps(500, 2000)),
+        Document(filename="d.jpg", status="pending", owner_id=1, country_code="TN"),
+    ])
+    db_session.commit()
+
+    # Operator endpoints: aggregates across all users, for ADMIN_EMAILS only
+    assert client.get("/api/v1/stage-latency").status_code == 403
+    assert client.get("/api/v1/cache-stats").status_code == 403
+
+    with patch.object(settings, "ADMIN_EMAILS", "ops@example.com, Test@example.com"):
+        response = client.get("/api/v1/stage-latency", params={"window_minutes": 5})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["documents"] == 3
+        assert data["stages"]["queue_wait"] == {"count": 3, "p50": 300.0, "p90": 500.0, "p99": 500.0}
+        assert data["stages"]["inference"]["p50"] == 2000.0
+        assert data["countries"]["FR"]["inference"] == {"count": 2, "p50": 1000.0, "p90": 3000.0, "p99": 3000.0}
+
+        response = client.get("/api/v1/stage-latency", params={"country_code": "TN"})
+        assert response.json()["documents"] == 1
+
+def test_list_documents(client, db_session: Session):
+    now = datetime.now(timezone.utc)
+    db_session.add_all([
+        Document(filename="old.jpg", status="completed", owner_id=1, plate_number="AB123CD",
+                 upload_timestamp=now - timedelta(days=2)),
+        Document(filename="new.jpg", status="completed", owner_id=1, upload_timestamp=now - timedelta(days=1)),
+        Document(filename="pending.jpg", status="pending", owner_id=1, upload_timestamp=now),
+        Document(filename="other.jpg", status="completed", owner_id=2, plate_number="AB123CD", upload_timestamp=now),
+    ])
+    db_session.commit()
+
+    response = client.get("/api/v1/documents/", params={"status": "completed"})
+    assert [document["filename"] for document in response.json()] == ["new.jpg", "old.jpg"]
+    response = client.get("/api/v1/documents/", params={"plate_number": "ab-123-cd"})
+    assert [document["filename"] for document in response.json()] == ["old.jpg"]
+    # Next page
+    first_page = client.get("/api/v1/documents/", params={"limit": 2}).json()
+    response = client.get("/api/v1/documents/", params={"before": first_page[-1]["upload_timestamp"]})
+    assert [document["filename"] for document in first_page + response.json()] == ["pending.jpg", "new.jpg", "old.jpg"]
+
+def test_list_documents_pages_through_a_batch(client, db_session: Session):
+    # A batch is inserted in one transaction: its documents share their upload timestamp
+    now = datetime.now(timezone.utc)
+    db_session.add_all([Document(filename=f"{i}.jpg", status="pending", owner_id=1, upload_timestamp=now)
+                        for i in range(5)])
+    db_session.commit()
+
+    filenames, params = [], {"limit": 2}
+    while page := client.get("/api/v1/documents/", params=params).json():
+        filenames += [document["filename"] for document in page]
+        params = {"limit": 2, "before": page[-1]["upload_timestamp"], "before_id": page[-1]["id"]}
+    assert filenames == ["4.jpg", "3.jpg", "2.jpg", "1.jpg", "0.jpg"]
+
 def test_get_extraction_task_status(client, db_session: Session):
     # First, create a dummy document in the database
     new_doc = Document(filename="test_doc.jpg", status="completed", owner_id=1, extracted_data={"field": "value"})
@@ -117,3 +651,32 @@ def test_get_extraction_task_status(client, db_session: Session):
     assert response.json()["filename"] == "test_doc.jpg"
     assert response.json()["status"] == "completed"
     assert response.json()["extracted_data"] == {"field": "value"}
+
+    response = client.get(f"/api/v1/task-status/{new_doc.id}", params={"include_data": False})
+    assert response.status_code == 200
+    assert response.json()["status"] == "completed"
+    assert response.json()["extracted_data"] is None
+    assert client.get("/api/v1/task-status/0", params={"include_data": False}).status_code == 404
+
+    # Compact validation results are stored as is and returned verbose
+    compact = Document(filename="compact.jpg", status="completed", owner_id=1, extracted_data={
+        "raw_extraction": {"numero_immatriculation": "AB-123-CD", "co2": "x"},
+        "validation_results": {"invalid": ["co2"]},
+    })
+    db_session.add(compact)
+    db_session.commit()
+    validation_results = client.get(f"/api/v1/task-status/{compact.id}").json()["extracted_data"]["validation_results"]
+    assert validation_results == {
+        "numero_immatriculation": {"value": "AB-123-CD", "is_valid": True, "message": "Valid"},
+        "co2": {"value": "x", "is_valid": False, "message": "Invalid format"},
+    }
+    db_session.refresh(compact)
+    assert compact.extracted_data["validation_results"] == {"invalid": ["co2"]}
+
+    # Documents of other users are not found
+    someone_elses = Document(filename="test_doc.jpg", status="completed", owner_id=2)
+    db_session.add(someone_elses)
+    db_session.commit()
+    for include_data in (True, False):
+        response = client.get(f"/api/v1/task-status/{someone_elses.id}", params={"include_data": include_data})
+        assert response.status_code == 404
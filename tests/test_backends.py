@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core.config import settings
+from app.services.ai.backends import (
+    STUB_EXTRACTIONS, CascadeBackend, MistralBackend, StubBackend, TesseractBackend, get_extraction_backend,
+    parse_fr_certificate, resolve_backend_name
+)
+from app.services.ai.prompts import prompt_builder
+from app.services.validation import car_plate_validator
+
+# OCR output of a French certificate, with the usual noise (several fields per line, OCR'd VIN)
+FR_CERTIFICATE_TEXT = """
+CERTIFICAT D'IMMATRICULATION
+A AB 123 CD B 14/03/2019
+C.1 DUPONT JEAN
+C.3 12 RUE DE LA PAIX 75002 PARIS
+D.1 RENAULT D.2 RJA1A2 D.3 CLIO
+E VF1RJAOOO12345678
+F.1 1634 G 1155
+J.1 VP P.1 999 P.3 ES
+P.6 5 S.1 5
+"""
+
+
+def test_parse_fr_certificate():
+    extraction = parse_fr_certificate(FR_CERTIFICATE_TEXT)
+
+    assert extraction["numero_immatriculation"] == "AB-123-CD"
+    assert extraction["date_premiere_immatriculation"] == "2019-03-14"
+    assert extraction["nom_titulaire"] == "DUPONT JEAN"
+    assert extraction["marque"] == "RENAULT"
+    assert extraction["type_variante_version"] == "RJA1A2"
+    assert extraction["denomination_commerciale"] == "CLIO"
+    assert extraction["numero_identification"] == "VF1RJA00012345678"
+    assert extraction["ptac"] == "1634"
+    assert extraction["masse_ordre_marche"] == "1155"
+    assert extraction["cylindree"] == "999"
+    assert extraction["puissance_fiscale"] == "5"
+    # Fields that were not read are null
+    assert extraction["co2"] is None
+
+
+def test_tesseract_backend_reads_french_certificates_only():
+    backend = TesseractBackend()
+    with pytest.raises(ValueError):
+        backend.extract(b"image", "TN")
+
+
+def test_backend_selection():
+    assert resolve_backend_name("stub", "FR") == "stub"
+    assert resolve_backend_name(None, "FR") == settings.EXTRACTION_BACKEND
+    with patch.object(settings, "EXTRACTION_BACKEND_BY_COUNTRY", {"FR": "tesseract"}):
+        assert resolve_backend_name(None, "FR") == "tesseract"
+        assert resolve_backend_name(None, "TN") == settings.EXTRACTION_BACKEND
+    with pytest.raises(ValueError):
+        resolve_backend_name("unknown", "FR")
+
+    assert isinstance(get_extraction_backend("stub", "TN"), StubBackend)
+    # The stub is deterministic and never shares its result object
+    first, second = StubBackend().extract(b"", "TN"), StubBackend().extract(b"", "TN")
+    assert first == second and first is not second
+
+
+class LocalBackend(StubBackend):
+    def __init__(self, **overrides):
+        self.overrides = overrides
+
+    def _extract(self, image: bytes, country_code: str) -> dict:
+        return {**STUB_EXTRACTIONS[country_code], **self.overrides}
+
+
+def make_cascade(local, model_answer: dict):
+    client = MagicMock()
+    client.extract_car_plate_data.return_value = model_answer
+    return CascadeBackend(local, MistralBackend(client, prompt_builder), car_plate_validator), client
+
+
+def test_cascade_skips_the_model_when_required_fields_are_valid():
+    cascade, client = make_cascade(LocalBackend(co2=None), {})
+
+    assert cascade.extract(b"image", "FR") == STUB_EXTRACTIONS["FR"]
+    client.extract_car_plate_data.assert_not_called()
+
+
+def test_cascade_asks_the_model_only_for_missing_or_invalid_fields():
+    local = LocalBackend(numero_identification=None, puissance_fiscale="5 CV", cylindree="l000")
+    answer = {"numero_identification": "VF1RJA00012345678", "puissance_fiscale": "5", "cylindree": "1000",
+              "marque": "IGNORED"}
+    cascade, client = make_cascade(local, answer)
+
+    extraction = cascade.extract(b"image", "FR")
+
+    prompt = client.extract_car_plate_data.call_args.args[1]
+    assert "- numero_identification:" in prompt and "- puissance_fiscale:" in prompt and "- cylindree:" in prompt
+    assert "- marque:" not in prompt
+    assert extraction == {**STUB_EXTRACTIONS["FR"], "cylindree": "1000"}
+
+
+def test_cascade_falls_back_to_the_model_for_unsupported_countries():
+    cascade, client = make_cascade(TesseractBackend(), {"numero_immatriculation": "123 TUN 4567"})
+
+    assert cascade.extract(b"image", "TN") == {"numero_immatriculation": "123 TUN 4567"}
+    client.extract_car_plate_data.assert_called_once()
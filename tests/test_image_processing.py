@@ -0,0 +1,74 @@
+import io
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import pytest
+
+from app.services.image_processing import (
+    ImageTooLargeError, NormalizationOptions, crop_to_document, decode_image, preprocess_image, read_image_header
+)
+
+
+def make_photo(width: int = 2000, height: int = 1500) -> np.ndarray:
+    # A light document on a dark, noisy background, like a phone photo of a certificate
+    rng = np.random.default_rng(0)
+    photo = rng.integers(30, 80, size=(height, width, 3), dtype=np.uint8)
+    cv2.rectangle(photo, (width // 5, height // 5), (width * 4 // 5, height * 4 // 5), (230, 230, 230), -1)
+    cv2.putText(photo, "AB-123-CD", (width // 4, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 3, (20, 20, 20), 6)
+    return photo
+
+
+def encode(img: np.ndarray, quality: int = 95) -> bytes:
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes()
+
+
+def test_read_image_header_from_first_bytes():
+    image = encode(make_photo(4000, 3000))
+
+    header = read_image_header(image[:4096])  # Truncated: no pixel data needed
+    assert (header.format, header.width, header.height) == ("JPEG", 4000, 3000)
+    with pytest.raises(ImageTooLargeError):
+        read_image_header(image[:4096], max_pixels=10_000_000)
+    with pytest.raises(ValueError):
+        read_image_header(b"%PDF-1.7")
+
+
+def test_decode_applies_exif_orientation():
+    buffer = io.BytesIO()
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotated 90° clockwise
+    Image.new("RGB", (400, 200)).save(buffer, format="JPEG", exif=exif.tobytes())
+
+    assert decode_image(buffer.getvalue()).shape[:2] == (400, 200)
+
+
+def test_decode_reduces_large_images():
+    image = encode(make_photo(4000, 3000))
+
+    assert decode_image(image).shape == (3000, 4000)
+    assert decode_image(image, min_long_edge=1000).shape == (750, 1000)  # Decoded at 1/4 scale
+
+
+def test_crop_to_document():
+    cropped = crop_to_document(make_photo())
+    (h, w) = cropped.shape[:2]
+    assert abs(w - 1200) < 40 and abs(h - 900) < 40
+
+
+def test_crop_keeps_image_without_document_outline():
+    plain = np.full((600, 800, 3), 200, dtype=np.uint8)
+    assert crop_to_document(plain) is plain
+
+
+def test_preprocess_image_downscales_and_fits_budget():
+    options = NormalizationOptions(
+        target_long_edge=1000, crop_to_document=False, jpeg_quality=90, min_jpeg_quality=40, max_bytes=60_000
+    )
+    output = preprocess_image(encode(make_photo(4000, 3000)), options)
+
+    assert len(output) <= 60_000
+    normalized = cv2.imdecode(np.frombuffer(output, np.uint8), cv2.IMREAD_UNCHANGED)
+    assert normalized.ndim == 2  # Grayscale
+    assert max(normalized.shape) <= 1000
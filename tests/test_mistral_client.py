@@ -0,0 +1,139 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services.ai.mistral_client import AsyncMistralAIClient, MistralAIClient, MistralAPIError
+from app.services.ai.rate_limit import AsyncTokenBucket
+
+EXTRACTION = {"numero_immatriculation": "AB-123-CD", "marque": "RENAULT"}
+
+
+def chat_completion(content: dict) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": json.dumps(content)}}]})
+
+
+def make_client(handler, **kwargs) -> AsyncMistralAIClient:
+    # The mock transport plays the part of a local stub Mistral server
+    kwargs.setdefault("retry_backoff", 0.001)
+    return AsyncMistralAIClient(api_key="test-key", transport=httpx.MockTransport(handler), **kwargs)
+
+
+def test_extract_car_plate_data():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return chat_completion(EXTRACTION)
+
+    client = make_client(handler)
+    assert asyncio.run(client.extract_car_plate_data("aW1hZ2U=", "prompt")) == EXTRACTION
+
+    request = requests[0]
+    assert request.url.path == "/v1/chat/completions"
+    assert request.headers["Authorization"] == "Bearer test-key"
+    payload = json.loads(request.content)
+    assert payload["response_format"] == {"type": "json_object"}
+    assert payload["messages"][0]["content"][1]["image_url"]["url"] == "data:image/jpeg;base64,aW1hZ2U="
+
+
+def test_retries_rate_limited_and_server_errors():
+    responses = [httpx.Response(429), httpx.Response(503), chat_completion(EXTRACTION)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return responses.pop(0)
+
+    client = make_client(handler, max_retries=2)
+    assert asyncio.run(client.extract_car_plate_data("aW1hZ2U=", "prompt")) == EXTRACTION
+    assert responses == []
+
+
+def test_gives_up_after_max_retries():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(500, text="boom")
+
+    client = make_client(handler, max_retries=2)
+    with pytest.raises(MistralAPIError) as exc_info:
+        asyncio.run(client.extract_car_plate_data("aW1hZ2U=", "prompt"))
+    assert exc_info.value.status_code == 500
+    assert len(calls) == 3
+
+
+def test_transport_errors_are_retried_and_timed():
+    from prometheus_client import REGISTRY
+
+    def attempts(outcome: str) -> float:
+        return REGISTRY.get_sample_value("mistral_request_duration_seconds_count", {"outcome": outcome}) or 0
+
+    responses = [httpx.ReadTimeout("timed out"), chat_completion(EXTRACTION)]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    timeouts = attempts("ReadTimeout")
+    client = make_client(handler, max_retries=1)
+    assert asyncio.run(client.extract_car_plate_data("aW1hZ2U=", "prompt")) == EXTRACTION
+    assert attempts("ReadTimeout") == timeouts + 1
+
+
+def test_client_errors_are_not_retried():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(401, text="unauthorized")
+
+    client = make_client(handler)
+    with pytest.raises(MistralAPIError):
+        asyncio.run(client.extract_car_plate_data("aW1hZ2U=", "prompt"))
+    assert len(calls) == 1
+
+
+def test_concurrency_limit():
+    in_flight = 0
+    max_in_flight = 0
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return chat_completion(EXTRACTION)
+
+    client = make_client(handler, max_concurrency=4)
+
+    async def run_many():
+        return await asyncio.gather(*(client.extract_car_plate_data("aW1hZ2U=", "prompt") for _ in range(20)))
+
+    assert asyncio.run(run_many()) == [EXTRACTION] * 20
+    assert max_in_flight == 4
+
+
+def test_sync_facade_shares_background_loop():
+    client = MistralAIClient(make_client(lambda request: chat_completion(EXTRACTION)))
+    assert client.extract_car_plate_data("aW1hZ2U=", "prompt") == EXTRACTION
+    loop = client._loop
+    assert client.extract_car_plate_data("aW1hZ2U=", "prompt") == EXTRACTION
+    assert client._loop is loop
+
+
+def test_token_bucket_paces_requests():
+    bucket = AsyncTokenBucket(rate=100, capacity=1)
+
+    async def acquire_many():
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        for _ in range(5):
+            await bucket.acquire()
+        return loop.time() - started_at
+
+    # The first token is available immediately, the next four are spaced 10ms apart
+    assert asyncio.run(acquire_many()) >= 0.035
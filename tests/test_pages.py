@@ -0,0 +1,63 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+import pytest
+
+from app.services.image_processing import read_image_header
+from app.services.pages import multipage_format, split_pages
+
+
+def make_pages(count: int, size=(850, 1100)) -> list:
+    # Letter-size pages at 100 DPI, each with a different shade to tell them apart
+    return [Image.new("L", size, color=40 * (index + 1)) for index in range(count)]
+
+
+def save_multipage(pages: list, image_format: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    pages[0].save(buffer, format=image_format, save_all=True, append_images=pages[1:], **params)
+    return buffer.getvalue()
+
+
+def test_multipage_format():
+    assert multipage_format(save_multipage(make_pages(1), "TIFF")) == "TIFF"
+    assert multipage_format(save_multipage(make_pages(1), "PDF", resolution=100)) == "PDF"
+    assert multipage_format(b"\xff\xd8\xff\xe0") is None
+
+
+def test_split_tiff_frames_at_the_target_dpi():
+    tiff = save_multipage(make_pages(3), "TIFF", dpi=(400, 400))
+
+    units = list(split_pages(io.BytesIO(tiff), "TIFF", dpi=200))
+
+    assert [(first, last) for first, last, _ in units] == [(1, 1), (2, 2), (3, 3)]
+    header = read_image_header(units[0][2])
+    assert (header.format, header.width, header.height) == ("JPEG", 425, 550)
+    shades = [int(np.asarray(Image.open(io.BytesIO(unit))).mean()) for _, _, unit in units]
+    assert shades == sorted(shades)
+
+
+def test_split_groups_recto_verso_pages():
+    tiff = save_multipage(make_pages(3), "TIFF")
+
+    units = list(split_pages(io.BytesIO(tiff), "TIFF", pages_per_document=2))
+
+    # Pages 1-2 side by side, then page 3 alone
+    assert [(first, last, read_image_header(unit).width) for first, last, unit in units] == [(1, 2, 1700), (3, 3, 850)]
+
+
+def test_split_rejects_too_many_pages():
+    tiff = save_multipage(make_pages(3), "TIFF")
+    with pytest.raises(ValueError):
+        list(split_pages(io.BytesIO(tiff), "TIFF", max_pages=2))
+
+
+def test_split_pdf_pages():
+    pdf = save_multipage(make_pages(2), "PDF", resolution=100)
+
+    units = list(split_pages(io.BytesIO(pdf), "PDF", dpi=200))
+
+    assert len(units) == 2
+    header = read_image_header(units[1][2])
+    assert (header.width, header.height) == (1700, 2200)
@@ -0,0 +1,39 @@
+import json
+
+import pytest
+
+from app.services.ai.prompts import COUNTRY_SCHEMAS, PROMPT_ENCODINGS, PromptBuilder, estimate_tokens
+
+
+@pytest.mark.parametrize("country_code", list(COUNTRY_SCHEMAS))
+def test_compact_encodings_list_every_field_with_fewer_tokens(country_code):
+    full = PromptBuilder("schema").build(country_code)
+    for encoding in ("fields", "skeleton"):
+        prompt = PromptBuilder(encoding).build(country_code)
+        assert all(field in prompt.text for field in COUNTRY_SCHEMAS[country_code].model_fields)
+        assert prompt.tokens < full.tokens / 2
+
+
+def test_skeleton_is_a_json_object_of_the_requested_fields():
+    prompt = PromptBuilder("skeleton").build("FR", ["marque", "puissance_fiscale"])
+    skeleton = next(line for line in prompt.text.splitlines() if line.startswith("{"))
+    assert json.loads(skeleton) == {"marque": None, "puissance_fiscale": None}
+
+
+def test_prompts_are_cached_and_versioned():
+    builder = PromptBuilder("fields")
+    assert builder.build("TN") is builder.build("TN")
+    assert builder.build("FR", ["marque"]) is builder.build("FR", ("marque",))
+    assert builder.build("TN").version == builder.version
+    assert len({PromptBuilder(encoding).version for encoding in PROMPT_ENCODINGS}) == len(PROMPT_ENCODINGS)
+    # The default encoding keeps the version of the extractions stored before encodings existed
+    assert PromptBuilder("schema").version == "1"
+
+    with pytest.raises(ValueError):
+        PromptBuilder("yaml")
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens('{"marque": null}') == 8 # { " marq ue " : null }
+    assert estimate_tokens("numero_immatriculation") == 6
@@ -0,0 +1,113 @@
+from unittest import mock
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, get_session_local
+from app.models.document import Document
+from app.services.ai.prompts import PROMPT_VERSION
+from app.worker.reprocess import run_reprocess_job
+
+VALID = {"numero_immatriculation": "AB-123-CD", "date_premiere_immatriculation": "2019-03-14", "marque": "RENAULT",
+         "numero_identification": "VF1RJA00012345678", "puissance_fiscale": "5"}
+
+
+class MemoryCheckpoints:
+    def __init__(self):
+        self.checkpoints = {}
+
+    def load(self, job_id: str) -> dict:
+        return dict(self.checkpoints.get(job_id) or
+                    {"last_id": 0, "processed": 0, "revalidated": 0, "reextracted": 0, "skipped": 0})
+
+    def save(self, job_id: str, checkpoint: dict) -> None:
+        self.checkpoints[job_id] = dict(checkpoint)
+
+
+@pytest.fixture(name="session_local")
+def session_local_fixture():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return get_session_local(engine)
+
+
+def add_documents(session_local, count: int, **fields) -> list:
+    with session_local() as db:
+        documents = [Document(filename=f"{i}.jpg", owner_id=1, country_code="FR", **fields) for i in range(count)]
+        db.add_all(documents)
+        db.commit()
+        return [document.id for document in documents]
+
+
+def test_revalidation_is_chunked_and_resumable(session_local):
+    # Stored with an outdated validation result
+    stale = {"raw_extraction": VALID, "validation_results": {}, "prompt_version": PROMPT_VERSION}
+    ids = add_documents(session_local, 5, status="completed", extracted_data=stale)
+    add_documents(session_local, 1, status="pending")
+    checkpoints = MemoryCheckpoints()
+
+    # Stops after the first chunk, then resumes from the checkpoint
+    checkpoint = run_reprocess_job("job", chunk_size=2, max_documents=1, checkpoints=checkpoints,
+                                   session_factory=session_local)
+    assert checkpoint["last_id"] == ids[1] and checkpoint["revalidated"] == 2
+    checkpoint = run_reprocess_job("job", chunk_size=2, checkpoints=checkpoints, session_factory=session_local)
+    assert checkpoint == {"last_id": ids[-1], "processed": 5, "revalidated": 5, "reextracted": 0, "skipped": 0}
+
+    with session_local() as db:
+        for document in db.query(Document).filter(Document.status == "completed"):
+            assert document.extracted_data["validation_results"]["numero_immatriculation"]["is_valid"]
+
+    # Nothing left to update
+    checkpoint = run_reprocess_job("again", chunk_size=2, checkpoints=checkpoints, session_factory=session_local)
+    assert checkpoint["revalidated"] == 0
+
+
+@patch("app.worker.reprocess.fair_scheduler.schedule", return_value=[5])
+@patch("app.worker.reprocess.extraction_pipeline")
+def test_reextraction_only_when_needed(mock_extraction_pipeline, mock_schedule, session_local):
+    current = {"raw_extraction": VALID, "prompt_version": PROMPT_VERSION}
+    up_to_date = add_documents(session_local, 1, status="completed", extracted_data=current, blob_key="a")
+    old_prompt = add_documents(session_local, 1, status="completed", extracted_data={"raw_extraction": VALID}, blob_key="b")
+    invalid_vin = {"raw_extraction": {**VALID, "numero_identification": "?"}, "prompt_version": PROMPT_VERSION,
+                   "backend": "cascade"}
+    invalid = add_documents(session_local, 1, status="completed", extracted_data=invalid_vin, blob_key="c")
+    add_documents(session_local, 1, status="failed", extracted_data={"error": "timeout"}) # No blob key
+
+    checkpoint = run_reprocess_job("job", mode="extract", rate=0, checkpoints=MemoryCheckpoints(),
+                                   session_factory=session_local)
+
+    assert checkpoint["reextracted"] == 2 and checkpoint["skipped"] == 1
+    assert [call.args for call in mock_extraction_pipeline.call_args_list] == [
+        (old_prompt[0], "b", "FR", None), (invalid[0], "c", "FR", "cascade")
+    ]
+    # Re-extractions go through the bulk lane of their owner
+    assert all(call.kwargs == {"use_cache": False, "priority_class": "bulk", "owner_id": 1, "priority": 5}
+               for call in mock_extraction_pipeline.call_args_list)
+    assert up_to_date[0] not in [call.args[0] for call in mock_extraction_pipeline.call_args_list]
+
+
+def test_no_transaction_is_open_while_enqueuing(session_local):
+    stale = {"raw_extraction": VALID, "validation_results": {}, "prompt_version": PROMPT_VERSION}
+    [revalidated] = add_documents(session_local, 1, status="completed", extracted_data=stale, blob_key="a")
+    add_documents(session_local, 2, status="completed", extracted_data={"raw_extraction": VALID}, blob_key="b")
+    sessions = []
+
+    def session_factory():
+        sessions.append(session_local())
+        return sessions[-1]
+
+    def enqueue(*args, **kwargs):
+        # The chunk's sessions are closed, its revalidation committed, before anything is enqueued
+        assert not any(session.in_transaction() for session in sessions)
+        with session_local() as db:
+            assert db.get(Document, revalidated).extracted_data["validation_results"]
+        return mock.DEFAULT
+
+    with patch("app.worker.reprocess.extraction_pipeline", side_effect=enqueue) as mock_extraction_pipeline, \
+            patch("app.worker.reprocess.fair_scheduler.schedule", return_value=[5]):
+        checkpoint = run_reprocess_job("job", mode="extract", rate=0, checkpoints=MemoryCheckpoints(),
+                                       session_factory=session_factory)
+    assert checkpoint["revalidated"] == 1 and checkpoint["reextracted"] == 2
+    assert mock_extraction_pipeline.call_count == 2
@@ -0,0 +1,86 @@
+from unittest.mock import patch
+
+import redis
+
+from app.services.scheduling import FairScheduler
+
+
+class MemoryRedis:
+    """
+    The few Redis commands used by the scheduler, in memory.
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def pipeline(self, transaction=True):
+        return MemoryPipeline(self)
+
+    def incrby(self, key, amount):
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    def decrby(self, key, amount):
+        return self.incrby(key, -amount)
+
+    def expire(self, key, seconds):
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+class MemoryPipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args: self.commands.append((name, args))
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def make_scheduler(fair_share_backlog: int = 2) -> FairScheduler:
+    scheduler = FairScheduler("redis://unused", fair_share_backlog=fair_share_backlog, ttl_seconds=60)
+    scheduler._client = MemoryRedis()
+    return scheduler
+
+
+def test_burst_sinks_within_its_class():
+    scheduler = make_scheduler()
+
+    # A large backfill steps down every 2 queued documents, down to the last priority of the class
+    assert scheduler.schedule(1, "bulk", 12) == [5, 5, 6, 6, 7, 7, 8, 8, 9, 9, 9, 9]
+    # Another owner's documents start at the top of the class, ahead of the backfill's tail
+    assert scheduler.schedule(2, "bulk", 3) == [5, 5, 6]
+    # Interactive uploads always stay ahead of bulk ones
+    assert scheduler.schedule(1, "interactive") == [2]
+    assert scheduler.schedule(2, "interactive") == [1]
+
+
+def test_release_restores_priority():
+    scheduler = make_scheduler()
+    scheduler.schedule(1, "bulk", 4)
+
+    scheduler.release(1, 4)
+    assert scheduler.client.values == {}
+    assert scheduler.schedule(1, "bulk") == [5]
+
+
+def test_fair_share_disabled_or_unavailable():
+    assert make_scheduler(fair_share_backlog=0).schedule(1, "bulk", 3) == [5, 5, 5]
+
+    # Scheduling never fails an upload: without Redis every document gets the first priority of its class
+    scheduler = make_scheduler()
+    with patch.object(scheduler.client, "pipeline", side_effect=redis.ConnectionError):
+        assert scheduler.schedule(1, "interactive", 2) == [0, 0]
+    # Documents without an owner are not counted
+    assert make_scheduler().schedule(None, "bulk", 3) == [5, 5, 5]
@@ -0,0 +1,49 @@
+from app.schemas.car_plate_fr import CarPlateFR
+from app.services.validation import ANY_VALUE, CarPlateValidator, expand_validation_results
+
+EXTRACTION = {
+    "numero_immatriculation": "ab-123-cd ",
+    "date_premiere_immatriculation": "14/03/2019",
+    "numero_identification": "VF1RJA00012345678",
+    "puissance_fiscale": "5",
+    "marque": "RENAULT",
+    "co2": None,
+}
+
+
+def test_rules_are_compiled_per_schema():
+    validator = CarPlateValidator()
+
+    assert set(validator.rules["FR"]) == set(CarPlateFR.model_fields)
+    assert validator.rules["FR"]["marque"] is ANY_VALUE
+    # The plate rule depends on the country
+    assert validator.validate_field("numero_immatriculation", "123 TUN 4567", "TN")
+    assert not validator.validate_field("numero_immatriculation", "123 TUN 4567", "FR")
+    # Fields outside the schema accept any value, and are not added to the table
+    assert validator.validate_field("date_extra", "tomorrow", "FR")
+    assert validator.validate({"date_extra": "tomorrow"}, "FR", compact=True) == {"invalid": []}
+    assert "date_extra" not in validator.rules["FR"]
+    assert validator.rule("numero_immatriculation", "DE") is ANY_VALUE and "DE" not in validator.rules
+
+
+def test_verbose_and_compact_results():
+    validator = CarPlateValidator()
+
+    compact = validator.validate(EXTRACTION, "FR", compact=True)
+    verbose = validator.validate_car_plate_data(EXTRACTION, "FR")
+
+    # Values are normalized (trimmed, upper-cased plates and VINs) before matching
+    assert compact == {"invalid": ["date_premiere_immatriculation"]}
+    assert verbose["numero_immatriculation"] == {"value": "ab-123-cd ", "is_valid": True, "message": "Valid"}
+    assert verbose["date_premiere_immatriculation"]["message"] == "Invalid format"
+    assert verbose["co2"]["is_valid"]
+    assert expand_validation_results(compact, EXTRACTION) == verbose
+    assert expand_validation_results(verbose, EXTRACTION) == verbose
+
+
+def test_validate_many():
+    validator = CarPlateValidator()
+
+    results = validator.validate_many([EXTRACTION, {"puissance_fiscale": "5 CV"}], "FR")
+
+    assert results == [{"invalid": ["date_premiere_immatriculation"]}, {"invalid": ["puissance_fiscale"]}]
@@ -0,0 +1,391 @@
+from unittest.mock import patch
+import base64
+import hashlib
+import hmac
+import io
+import json
+import time
+
+import cv2
+import httpx
+import numpy as np
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import StaticPool
+
+from prometheus_client import REGISTRY
+
+from app.core.config import settings
+from app.database import Base, get_session_local
+from app.models.document import Document
+from app.services.storage import LocalBlobStore
+from app.worker.tasks import (
+    check_follower, deliver_webhook, extraction_pipeline, preprocess_document, infer_document, persist_document,
+    process_image_for_extraction, split_document
+)
+
+EXTRACTION = {"numero_immatriculation": "AB-123-CD", "numero_identification": "VF1RJA00012345678"}
+
+
+def make_image(width: int = 320, height: int = 240) -> bytes:
+    image = np.full((height, width, 3), 220, dtype=np.uint8)
+    cv2.putText(image, "AB-123-CD", (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX, 1, (20, 20, 20), 2)
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+
+# --- Fixtures ---
+@pytest.fixture(name="session_local")
+def session_local_fixture():
+    # In-memory database shared by every session of the test
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session_local = get_session_local(engine)
+    with patch("app.worker.tasks.SessionLocal", session_local):
+        yield session_local
+
+
+@pytest.fixture(name="blob_store")
+def blob_store_fixture(tmp_path):
+    store = LocalBlobStore(str(tmp_path / "storage"))
+    with patch("app.worker.tasks.blob_store", store):
+        yield store
+
+
+@pytest.fixture(name="document_id")
+def document_id_fixture(session_local):
+    with session_local() as db:
+        document = Document(filename="scan.jpg", status="pending", owner_id=1, callback_url="https://client.example/hook")
+        db.add(document)
+        db.commit()
+        return document.id
+
+
+@pytest.fixture(autouse=True)
+def no_extraction_cache():
+    with patch("app.worker.tasks.extraction_cache.get", return_value=None), \
+            patch("app.worker.tasks.extraction_cache.set") as mock_cache_set:
+        yield mock_cache_set
+
+
+@pytest.fixture(autouse=True, name="finish_inflight")
+def finish_inflight_fixture():
+    # No identical upload waits for the extraction unless a test says so
+    with patch("app.worker.tasks.inflight_extractions.finish", return_value=[]) as mock_finish:
+        yield mock_finish
+
+
+@pytest.fixture(autouse=True, name="notifications")
+def notifications_fixture():
+    with patch("app.worker.tasks.publish_status") as mock_publish_status, \
+            patch("app.worker.tasks.deliver_webhook.delay") as mock_deliver_webhook:
+        yield mock_publish_status, mock_deliver_webhook
+
+
+# --- Tests ---
+def test_pipeline_routes_each_stage_to_its_queue():
+    from app.core.celery_app import celery_app
+
+    stages = extraction_pipeline(1, "blob-key", "FR").tasks
+    assert [stage.task for stage in stages] == ["preprocess_document", "infer_document", "persist_document"]
+    assert [celery_app.amqp.router.route({}, stage.task)["queue"].name for stage in stages] == \
+        ["preprocess", "inference", "persist"]
+
+    # Every stage is sent with the priority of the document
+    stages = extraction_pipeline(1, "blob-key", "FR", priority_class="bulk", owner_id=7, priority=6).tasks
+    assert [stage.options["priority"] for stage in stages] == [6, 6, 6]
+    assert stages[0].kwargs["priority_class"] == "bulk" and stages[0].kwargs["owner_id"] == 7
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data", return_value=EXTRACTION)
+def test_stages_complete_document(mock_extract, session_local, blob_store, document_id, no_extraction_cache,
+                                  notifications):
+    blob_key = blob_store.put(make_image())
+
+    payload = preprocess_document(document_id, blob_key, "FR", enqueued_at=time.time())
+    assert blob_store.exists(payload["processed_key"])
+    with session_local() as db:
+        assert db.get(Document, document_id).status == "processing"
+    payload = infer_document(payload)
+    assert payload["raw_extraction"] == EXTRACTION
+    # The preprocessed image is deleted once inferred
+    assert not blob_store.exists(payload["processed_key"])
+    statements = []
+    engine = session_local.kw["bind"]
+    listener = lambda conn, cursor, statement, *args: statements.append(statement.split()[0])
+    event.listen(engine, "before_cursor_execute", listener)
+    result = persist_document(payload)
+    event.remove(engine, "before_cursor_execute", listener)
+    # The outcome is written by a single UPDATE, without loading the row first
+    assert statements == ["UPDATE"]
+
+    assert result == {"status": "completed", "document_id": document_id, "cached": False}
+    with session_local() as db:
+        document = db.get(Document, document_id)
+        assert document.status == "completed"
+        assert document.extracted_data["raw_extraction"] == EXTRACTION
+        assert document.extracted_data["validation_results"]["numero_immatriculation"]["is_valid"]
+        stage_timestamps = [document.enqueued_at, document.started_at, document.preprocessed_at,
+                            document.inferred_at, document.validated_at, document.completed_at]
+        assert None not in stage_timestamps and stage_timestamps == sorted(stage_timestamps)
+    no_extraction_cache.assert_called_once_with(blob_key, "FR", "mistral", document.extracted_data)
+
+    # Status transitions are published and the upload's webhook is scheduled
+    mock_publish_status, mock_deliver_webhook = notifications
+    assert [call.args[:2] for call in mock_publish_status.call_args_list] == \
+        [(document_id, "processing"), (document_id, "completed")]
+    mock_deliver_webhook.assert_called_once_with(
+        "https://client.example/hook",
+        {"document_id": document_id, "status": "completed", "extracted_data": document.extracted_data}
+    )
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data")
+def test_stub_backend_runs_offline(mock_extract, session_local, blob_store, document_id, no_extraction_cache):
+    blob_key = blob_store.put(make_image())
+
+    payload = preprocess_document(document_id, blob_key, "FR", backend="stub")
+    result = persist_document(infer_document(payload))
+
+    assert result["status"] == "completed"
+    mock_extract.assert_not_called()
+    with session_local() as db:
+        document = db.get(Document, document_id)
+    assert document.extracted_data["backend"] == "stub"
+    assert document.extracted_data["raw_extraction"]["numero_immatriculation"] == "AB-123-CD"
+    # Key fields are promoted to their indexed columns
+    assert (document.plate_number, document.vin) == ("AB123CD", "VF1RJA00012345678")
+    assert no_extraction_cache.call_args.args[:3] == (blob_key, "FR", "stub")
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data", return_value=EXTRACTION)
+def test_identical_uploads_share_their_preprocessed_image(mock_extract, session_local, blob_store, document_id):
+    blob_key = blob_store.put(make_image())
+    first, second = (preprocess_document(document_id, blob_key, "FR") for _ in range(2))
+    assert first["processed_key"] == second["processed_key"]
+
+    # The first inference deletes the shared blob, the second one preprocesses the image again
+    assert infer_document(first)["raw_extraction"] == EXTRACTION
+    assert infer_document(second)["raw_extraction"] == EXTRACTION
+    assert blob_store.exists(blob_key)
+
+
+def test_identical_uploads_get_the_outcome_of_one_extraction(session_local, blob_store, document_id, finish_inflight,
+                                                            notifications):
+    with session_local() as db:
+        followers = [Document(filename="retry.jpg", status="pending", owner_id=1, callback_url=url)
+                     for url in ("https://client.example/retry", None)]
+        db.add_all(followers)
+        db.commit()
+        follower_ids = [follower.id for follower in followers]
+    finish_inflight.return_value = follower_ids
+    blob_key = blob_store.put(make_image())
+
+    result = persist_document(infer_document(preprocess_document(document_id, blob_key, "FR", backend="stub")))
+
+    assert result["status"] == "completed"
+    finish_inflight.assert_called_once_with(blob_key, "FR", "stub", document_id)
+    with session_local() as db:
+        leader = db.get(Document, document_id)
+        for follower_id in follower_ids:
+            follower = db.get(Document, follower_id)
+            assert follower.status == "completed" and follower.extracted_data == leader.extracted_data
+            assert follower.plate_number == "AB123CD" and follower.started_at is None
+    # Each follower publishes its status and calls its own webhook
+    mock_publish_status, mock_deliver_webhook = notifications
+    assert [call.args[0] for call in mock_publish_status.call_args_list[-2:]] == follower_ids
+    assert [call.args[0] for call in mock_deliver_webhook.call_args_list] == \
+        ["https://client.example/hook", "https://client.example/retry"]
+
+
+@patch("app.worker.tasks.extraction_pipeline")
+def test_messages_from_before_the_staged_pipeline_are_dispatched_to_it(mock_extraction_pipeline, session_local,
+                                                                      blob_store, document_id):
+    image = make_image()
+    blob_key = hashlib.sha256(image).hexdigest()
+
+    # Base64 image (before the blob store): stored, and only its key is sent on
+    process_image_for_extraction(document_id, base64.b64encode(image).decode(), "FR")
+    mock_extraction_pipeline.assert_called_once_with(document_id, blob_key, "FR")
+    assert blob_store.get(blob_key) == image
+    with session_local() as db:
+        assert db.get(Document, document_id).blob_key == blob_key
+
+    # Blob key (before the stages)
+    process_image_for_extraction(document_id, blob_key, "FR")
+    assert mock_extraction_pipeline.call_args.args == (document_id, blob_key, "FR")
+
+
+@pytest.fixture(name="follower_id")
+def follower_id_fixture(session_local):
+    with session_local() as db:
+        follower = Document(filename="retry.jpg", status="pending", owner_id=1, callback_url="https://client.example/retry")
+        db.add(follower)
+        db.commit()
+        return follower.id
+
+
+@patch("app.worker.tasks.schedule_follower_check")
+def test_follower_keeps_waiting_for_a_running_leader(mock_schedule_follower_check, session_local, document_id,
+                                                      follower_id):
+    with patch("app.worker.tasks.inflight_extractions.leader", return_value=document_id):
+        result = check_follower(follower_id, "blob-key", "FR", "stub", "interactive", 1)
+
+    assert result == {"status": "waiting", "document_id": follower_id, "leader_id": document_id}
+    mock_schedule_follower_check.assert_called_once_with(follower_id, "blob-key", "FR", "stub", "interactive", 1)
+
+
+def test_follower_gets_the_outcome_of_a_leader_that_did_not_hand_it_over(session_local, document_id, follower_id,
+                                                                         notifications):
+    with session_local() as db:
+        leader = db.get(Document, document_id)
+        leader.status, leader.extracted_data, leader.plate_number = "completed", {"raw_extraction": EXTRACTION}, "AB123CD"
+        db.commit()
+
+    with patch("app.worker.tasks.inflight_extractions.leader", return_value=document_id):
+        result = check_follower(follower_id, "blob-key", "FR", "stub", "interactive", 1)
+
+    assert result["status"] == "completed"
+    with session_local() as db:
+        follower = db.get(Document, follower_id)
+    assert follower.extracted_data == {"raw_extraction": EXTRACTION} and follower.plate_number == "AB123CD"
+    mock_publish_status, mock_deliver_webhook = notifications
+    mock_deliver_webhook.assert_called_once()
+    assert mock_deliver_webhook.call_args.args[0] == "https://client.example/retry"
+
+
+@patch("app.worker.tasks.fair_scheduler.schedule", return_value=[1])
+@patch("app.worker.tasks.extraction_pipeline")
+def test_follower_of_a_lost_extraction_extracts_itself(mock_extraction_pipeline, mock_schedule, session_local,
+                                                        follower_id):
+    # The leader's entry expired: the follower joins again and leads
+    with patch("app.worker.tasks.inflight_extractions.leader", return_value=None), \
+            patch("app.worker.tasks.inflight_extractions.join", return_value=None) as mock_join:
+        result = check_follower(follower_id, "blob-key", "FR", "stub", "bulk", 1)
+
+    assert result == {"status": "enqueued", "document_id": follower_id}
+    mock_join.assert_called_once_with("blob-key", "FR", "stub", follower_id)
+    mock_extraction_pipeline.assert_called_once_with(follower_id, "blob-key", "FR", "stub", priority_class="bulk",
+                                                     owner_id=1, priority=1)
+    mock_extraction_pipeline.return_value.apply_async.assert_called_once_with()
+
+    # Once its extraction runs, later checks stop
+    with session_local() as db:
+        db.get(Document, follower_id).status = "processing"
+        db.commit()
+    assert check_follower(follower_id, "blob-key", "FR", "stub", "bulk", 1)["status"] == "done"
+
+
+@patch("app.worker.tasks.fair_scheduler.schedule", return_value=[6])
+@patch("app.worker.tasks.group")
+def test_split_document_creates_one_document_per_unit(mock_group, mock_schedule, session_local, blob_store):
+    with session_local() as db:
+        document = Document(filename="scans.tiff", status="pending", owner_id=1, batch_id="batch-1")
+        db.add(document)
+        db.commit()
+        document_id = document.id
+    pages = [Image.new("L", (850, 1100), color=40 * (index + 1)) for index in range(3)]
+    tiff = io.BytesIO()
+    pages[0].save(tiff, format="TIFF", save_all=True, append_images=pages[1:])
+
+    result = split_document(document_id, blob_store.put(tiff.getvalue()), "FR", "stub", pages_per_document=2,
+                            priority_class="bulk", priority=5)
+
+    assert result["status"] == "split" and result["documents"][0] == document_id
+    with session_local() as db:
+        documents = db.query(Document).filter(Document.batch_id == "batch-1").order_by(Document.id).all()
+    assert [document.filename for document in documents] == ["scans.tiff#page=1-2", "scans.tiff#page=3"]
+    assert all(blob_store.exists(document.blob_key) for document in documents)
+    # Every unit goes through its own extraction pipeline
+    pipelines = list(mock_group.call_args.args[0])
+    assert [pipeline.tasks[0].args for pipeline in pipelines] == [
+        (document.id, document.blob_key, "FR") for document in documents
+    ]
+    # The first unit keeps the priority of the upload, the others join the owner's backlog
+    mock_schedule.assert_called_once_with(1, "bulk", 1)
+    assert [pipeline.tasks[0].options["priority"] for pipeline in pipelines] == [5, 6]
+    mock_group.return_value.apply_async.assert_called_once_with()
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data")
+def test_preprocessing_failure_skips_inference(mock_extract, session_local, blob_store, document_id):
+    blob_key = blob_store.put(b"not an image")
+
+    result = persist_document(infer_document(preprocess_document(document_id, blob_key, "FR")))
+
+    assert result["status"] == "failed"
+    mock_extract.assert_not_called()
+    with session_local() as db:
+        document = db.get(Document, document_id)
+        assert document.status == "failed"
+        assert document.extracted_data["error"].startswith("Image preprocessing failed")
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data")
+def test_cache_hit_skips_preprocessing_and_inference(mock_extract, session_local, blob_store, document_id):
+    cached_extraction = {"raw_extraction": EXTRACTION, "validation_results": {}}
+    with patch("app.worker.tasks.extraction_cache.get", return_value=cached_extraction):
+        payload = preprocess_document(document_id, "missing-blob", "FR")
+
+    result = persist_document(infer_document(payload))
+
+    assert result == {"status": "completed", "document_id": document_id, "cached": True}
+    mock_extract.assert_not_called()
+    with session_local() as db:
+        assert db.get(Document, document_id).extracted_data == cached_extraction
+
+
+@patch("app.services.ai.mistral_client.mistral_client.extract_car_plate_data")
+def test_task_metrics(mock_extract, session_local, blob_store, document_id):
+    def sample(name: str, **labels) -> float:
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    labels = {"task": "preprocess_document", "country_code": "FR"}
+    duration_count = sample("celery_task_duration_seconds_count", **labels)
+    ok_count = sample("celery_task_outcomes_total", **labels, outcome="ok")
+    failed_count = sample("celery_task_outcomes_total", **labels, outcome="failed")
+    input_count = sample("image_bytes_count", stage="input")
+
+    # Tasks are measured through the Celery signals, which eager execution sends too
+    preprocess_document.apply(args=(document_id, blob_store.put(make_image()), "FR"))
+    preprocess_document.apply(args=(document_id, blob_store.put(b"not an image"), "FR"))
+
+    assert sample("celery_task_duration_seconds_count", **labels) == duration_count + 2
+    assert sample("celery_task_outcomes_total", **labels, outcome="ok") == ok_count + 1
+    assert sample("celery_task_outcomes_total", **labels, outcome="failed") == failed_count + 1
+    assert sample("image_bytes_count", stage="input") == input_count + 1
+
+
+def test_deliver_webhook_is_signed():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(204 if len(requests) == 1 else 410)
+
+    event = {"document_id": 1, "status": "completed", "extracted_data": EXTRACTION}
+    with patch("app.services.notifications.webhook_client", httpx.Client(transport=httpx.MockTransport(handler))), \
+            patch("socket.getaddrinfo", return_value=[(2, 1, 6, "", ("93.184.215.14", 443))]):
+        assert deliver_webhook("https://client.example/hook", event)["status"] == "delivered"
+        # Client errors other than 429 are not retried
+        assert deliver_webhook("https://client.example/hook", event)["status"] == "rejected"
+
+    request = requests[0]
+    assert json.loads(request.content) == event
+    expected = hmac.new(
+        settings.SECRET_KEY.encode(), request.headers["X-Webhook-Timestamp"].encode() + b"." + request.content,
+        hashlib.sha256
+    ).hexdigest()
+    assert request.headers["X-Webhook-Signature"] == f"sha256={expected}"
+
+
+def test_deliver_webhook_checks_the_callback_url_again():
+    requests = []
+    transport = httpx.MockTransport(lambda request: requests.append(request) or httpx.Response(204))
+
+    event = {"document_id": 1, "status": "completed", "extracted_data": EXTRACTION}
+    # The host resolved to a public address at upload, now to the cloud metadata service
+    with patch("app.services.notifications.webhook_client", httpx.Client(transport=transport)), \
+            patch("socket.getaddrinfo", return_value=[(2, 1, 6, "", ("169.254.169.254", 443))]):
+        assert deliver_webhook("https://client.example/hook", event)["status"] == "blocked"
+    assert requests == []